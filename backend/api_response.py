@@ -0,0 +1,248 @@
+"""
+API Response
+Быстрая сериализация JSON, сжатие больших ответов и компактный формат выдачи поиска
+"""
+
+import os
+import gzip
+import json
+import logging
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - без orjson работает стандартный json
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Ответы меньше порога не сжимаются: заголовки и CPU дороже выигрыша
+COMPRESSION_MIN_SIZE = int(os.environ.get('RESPONSE_COMPRESSION_MIN_SIZE', 1024))
+GZIP_LEVEL = int(os.environ.get('RESPONSE_GZIP_LEVEL', 5))
+BROTLI_QUALITY = int(os.environ.get('RESPONSE_BROTLI_QUALITY', 4))
+
+# Уже сжатые и потоковые ответы middleware не трогает
+_SKIP_CONTENT_TYPES = ('application/x-ndjson', 'text/event-stream', 'image/', 'application/zip', 'application/gzip')
+
+# Компактный формат: запрос к /api/search/* с ?format=compact или заголовком X-Response-Format: compact
+COMPACT_PATH_PREFIX = '/api/search/'
+COMPACT_FORMAT = 'compact'
+
+_compact_format: ContextVar[bool] = ContextVar('compact_format', default=False)
+
+
+def dumps(content: Any) -> bytes:
+    """JSON в UTF-8 без пробелов (orjson, если установлен)"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def compact_encode(content: Any) -> Any:
+    """
+    Компактный формат ответа поиска: списки предложений - колонки полей со словарем строк
+
+    Каждый список объектов верхнего уровня (results и т.п.) заменяется на
+    {"fields": [...], "encoded": [...], "strings": [...], "rows": [[...], ...]}:
+    - fields - поля в порядке значений в строке rows; null - поле отсутствует или пустое
+    - encoded - поля, где все значения строки: в rows вместо строки ее индекс в strings
+    Повторяющиеся названия складов, брендов и тексты наличия передаются один раз
+    """
+    if not isinstance(content, dict):
+        return content
+
+    encoded = {}
+    for key, value in content.items():
+        if isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+            encoded[key] = _encode_records(value)
+        else:
+            encoded[key] = value
+    encoded['format'] = COMPACT_FORMAT
+    return encoded
+
+
+def _encode_records(records: List[Dict]) -> Dict:
+    fields = list(dict.fromkeys(key for record in records for key in record))
+
+    string_fields = [
+        field for field in fields
+        if all(isinstance(record.get(field), str) or record.get(field) is None for record in records)
+    ]
+    string_set = set(string_fields)
+
+    strings: Dict[str, int] = {}
+    rows = []
+    for record in records:
+        row = []
+        for field in fields:
+            value = record.get(field)
+            if field in string_set and value is not None:
+                value = strings.setdefault(value, len(strings))
+            row.append(value)
+        rows.append(row)
+
+    return {'fields': fields, 'encoded': string_fields, 'strings': list(strings), 'rows': rows}
+
+
+def compact_decode(content: Any) -> Any:
+    """Обратное преобразование compact_encode (поля со значением null в объекты не попадают)"""
+    if not isinstance(content, dict) or content.get('format') != COMPACT_FORMAT:
+        return content
+
+    decoded = {}
+    for key, value in content.items():
+        if key == 'format':
+            continue
+        if isinstance(value, dict) and value.keys() == {'fields', 'encoded', 'strings', 'rows'}:
+            decoded[key] = _decode_records(value)
+        else:
+            decoded[key] = value
+    return decoded
+
+
+def _decode_records(table: Dict) -> List[Dict]:
+    fields, strings = table['fields'], table['strings']
+    encoded = set(table['encoded'])
+    records = []
+    for row in table['rows']:
+        record = {}
+        for field, value in zip(fields, row):
+            if value is None:
+                continue
+            record[field] = strings[value] if field in encoded else value
+        records.append(record)
+    return records
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse с orjson; для запросов компактного формата выдача кодируется compact_encode"""
+
+    def render(self, content: Any) -> bytes:
+        if _compact_format.get():
+            content = compact_encode(content)
+        return dumps(content)
+
+
+def _accepts(accept_encoding: str, coding: str) -> bool:
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        if name.strip().lower() == coding:
+            return params.replace(' ', '') not in ('q=0', 'q=0.0')
+    return False
+
+
+class ResponseMiddleware:
+    """
+    ASGI middleware ответов API
+
+    - Включает компактный формат для /api/search/* (?format=compact или X-Response-Format: compact);
+      ответы /api/search/* получают Vary: X-Response-Format, чтобы кэши не путали форматы
+    - Сжимает ответы от minimum_size байт: brotli (если установлен и поддерживается клиентом), иначе gzip
+    - Потоковые ответы (NDJSON) и уже сжатые ответы передаются как есть, без буферизации
+    """
+
+    def __init__(self, app, minimum_size: Optional[int] = None):
+        self.app = app
+        self.minimum_size = COMPRESSION_MIN_SIZE if minimum_size is None else minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        token = _compact_format.set(self._is_compact(scope, headers))
+        if scope.get('path', '').startswith(COMPACT_PATH_PREFIX):
+            send = _vary_send(send, 'X-Response-Format')
+        try:
+            coding = self._pick_coding(headers.get('accept-encoding', ''))
+            if coding is None:
+                await self.app(scope, receive, send)
+            else:
+                await self.app(scope, receive, _CompressingSend(send, coding, self.minimum_size))
+        finally:
+            _compact_format.reset(token)
+
+    @staticmethod
+    def _is_compact(scope, headers: Headers) -> bool:
+        if not scope.get('path', '').startswith(COMPACT_PATH_PREFIX):
+            return False
+        if headers.get('x-response-format', '').lower() == COMPACT_FORMAT:
+            return True
+        query = scope.get('query_string', b'').decode('latin-1')
+        return f'format={COMPACT_FORMAT}' in query.split('&')
+
+    @staticmethod
+    def _pick_coding(accept_encoding: str) -> Optional[str]:
+        if not accept_encoding:
+            return None
+        if brotli is not None and _accepts(accept_encoding, 'br'):
+            return 'br'
+        if _accepts(accept_encoding, 'gzip'):
+            return 'gzip'
+        return None
+
+
+def _vary_send(send, header: str):
+    """send, добавляющий header в Vary ответа"""
+    async def wrapped(message):
+        if message['type'] == 'http.response.start':
+            MutableHeaders(scope=message).add_vary_header(header)
+        await send(message)
+
+    return wrapped
+
+
+class _CompressingSend:
+    """send для одного ответа: сжимает тело, если оно пришло целиком и не меньше порога"""
+
+    def __init__(self, send, coding: str, minimum_size: int):
+        self.send = send
+        self.coding = coding
+        self.minimum_size = minimum_size
+        self.start_message = None
+        self.passthrough = False
+
+    async def __call__(self, message):
+        if message['type'] == 'http.response.start':
+            # Заголовки отправим вместе с телом, когда станет ясно, сжимается ли ответ
+            self.start_message = message
+            headers = Headers(raw=message['headers'])
+            content_type = headers.get('content-type', '')
+            self.passthrough = 'content-encoding' in headers or content_type.startswith(_SKIP_CONTENT_TYPES)
+            return
+
+        if message['type'] != 'http.response.body' or self.start_message is None:
+            await self.send(message)
+            return
+
+        start, self.start_message = self.start_message, None
+        body = message.get('body', b'')
+        if self.passthrough or message.get('more_body', False) or len(body) < self.minimum_size:
+            # Потоковое тело, маленький или уже сжатый ответ
+            await self.send(start)
+            await self.send(message)
+            return
+
+        compressed = self._compress(body)
+        headers = MutableHeaders(raw=start['headers'])
+        headers['content-encoding'] = self.coding
+        headers['content-length'] = str(len(compressed))
+        headers.add_vary_header('Accept-Encoding')
+
+        await self.send(start)
+        await self.send({'type': 'http.response.body', 'body': compressed})
+
+    def _compress(self, body: bytes) -> bytes:
+        if self.coding == 'br':
+            return brotli.compress(body, quality=BROTLI_QUALITY)
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
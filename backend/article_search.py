@@ -0,0 +1,521 @@
+"""
+Article Search
+Параллельный поиск по артикулу у всех поставщиков (Rossko, Autotrade, Berg, Autostels)
+"""
+
+import asyncio
+import logging
+import os
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from article_utils import normalize_article
+from circuit_breaker import CircuitOpenError
+from concurrency_limiter import LimiterRejectedError
+from cross_graph import CrossReferenceGraph
+from offer import Offer, offers_to_dicts
+from offer_cache import OfferCache
+from single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+SUPPLIERS = ('rossko', 'autotrade', 'berg', 'autostels')
+
+# Бюджет времени на поиск по артикулу: по истечении отдаем то, что успели ответить поставщики
+SEARCH_BUDGET_SECONDS = float(os.environ.get('SEARCH_BUDGET_SECONDS', 2.5))
+# Потоковый поиск показывает результаты сразу, поэтому может ждать поставщиков дольше
+SEARCH_STREAM_BUDGET_SECONDS = float(os.environ.get('SEARCH_STREAM_BUDGET_SECONDS', 30))
+
+# Сколько запросов в Autotrade по OEM номерам (кроссам) делается за один поиск
+OEM_MAX_LOOKUPS = 3
+# Сколько секунд от начала поиска ждать новых OEM номеров из ответов других поставщиков
+OEM_CANDIDATE_WAIT_SECONDS = float(os.environ.get('OEM_CANDIDATE_WAIT_SECONDS', SEARCH_BUDGET_SECONDS / 2))
+
+# Сколько артикулов пакетного поиска (цены для кандидатов AI поиска) ищутся одновременно
+BATCH_SEARCH_CONCURRENCY = int(os.environ.get('BATCH_SEARCH_CONCURRENCY', 5))
+
+
+def _apply_markup(parts: List[Offer], markup_percent: float) -> List[Dict]:
+    """
+    Копии предложений с наценкой в виде dict (формат ответа API)
+
+    Исходные предложения общие для всех запросов (кэш, объединенные поиски) и не изменяются
+    """
+    parts = offers_to_dicts(parts)
+    if markup_percent > 0:
+        factor = 1 + markup_percent / 100
+        for part in parts:
+            part['price'] = round(part['price'] * factor, 2)
+    return parts
+
+
+class SearchFlight:
+    """
+    Общий поиск по одному артикулу: задачи поставщиков, выполняющиеся параллельно
+
+    К одному SearchFlight присоединяются все одновременные запросы этого артикула.
+    Каждый из них ждет столько, сколько позволяет его бюджет, и забирает готовые результаты
+    """
+
+    def __init__(self, article: str, tasks: Dict[str, asyncio.Task]):
+        self.article = article
+        self.tasks = tasks
+        self.done = asyncio.gather(*tasks.values(), return_exceptions=True)
+
+    async def wait(self, budget: Optional[float] = None):
+        """Ждет завершения всех поставщиков, но не дольше budget секунд (задачи не отменяются)"""
+        if budget is None:
+            await asyncio.shield(self.done)
+        else:
+            await asyncio.wait(set(self.tasks.values()), timeout=budget)
+
+    def snapshot(self) -> Tuple[Dict[str, List[Dict]], List[str]]:
+        """
+        Returns:
+            (предложения ответивших поставщиков, список поставщиков, которые еще не ответили)
+        """
+        offers = {}
+        pending = []
+        for supplier, task in self.tasks.items():
+            if task.done():
+                offers[supplier] = task.result()
+            else:
+                offers[supplier] = []
+                pending.append(supplier)
+        return offers, pending
+
+
+class ArticleSearchService:
+    """
+    Поиск по артикулу у всех поставщиков
+
+    Одновременные поиски одного и того же артикула (по normalize_article) объединяются
+    в один SearchFlight: запросы к поставщикам и OEM fallback выполняются один раз,
+    а наценка, фильтры и сортировка применяются к общим сырым результатам отдельно
+    для каждого запроса
+
+    Ответ каждого поставщика кэшируется (OfferCache); устаревшая запись отдается сразу,
+    а обновляется в фоне. Поставщики, не успевшие ответить в бюджет запроса, продолжают
+    работу в фоне и заполняют кэш для следующих поисков
+
+    Недоступный поставщик пропускается сразу (circuit breaker клиента), но его записи
+    из кэша, в том числе устаревшие, продолжают отдаваться. Число одновременных запросов
+    к каждому поставщику ограничивает адаптивный лимитер клиента
+    """
+
+    def __init__(
+        self,
+        rossko_client,
+        autotrade_client,
+        berg_client,
+        autostels_client,
+        cache: Optional[OfferCache] = None,
+        cross_graph: Optional[CrossReferenceGraph] = None
+    ):
+        self.rossko_client = rossko_client
+        self.autotrade_client = autotrade_client
+        self.berg_client = berg_client
+        self.autostels_client = autostels_client
+        self.cache = cache or OfferCache()
+        # Кроссы из ответов поставщиков - источник OEM номеров для Autotrade
+        self.cross_graph = cross_graph or CrossReferenceGraph()
+        self._flights: Dict[str, SearchFlight] = {}
+        # Одинаковые запросы к поставщику (промах кэша, фоновое обновление) выполняются один раз
+        self._calls = SingleFlight()
+
+    async def fetch_offers(
+        self,
+        article: str,
+        budget: Optional[float] = None
+    ) -> Tuple[Dict[str, List[Dict]], List[str]]:
+        """
+        Сырые предложения всех поставщиков по артикулу (до наценки)
+
+        Args:
+            article: Артикул
+            budget: Сколько секунд ждать поставщиков (None - ждать всех)
+
+        Returns:
+            (словарь {поставщик: список предложений}, поставщики без ответа в пределах бюджета).
+            Списки общие для всех участников объединенного запроса - изменять их нельзя
+        """
+        return await self._collect_flight(self._join_flight(article), article, budget)
+
+    async def _collect_flight(
+        self,
+        flight: SearchFlight,
+        article: str,
+        budget: Optional[float]
+    ) -> Tuple[Dict[str, List[Dict]], List[str]]:
+        await flight.wait(budget)
+
+        offers, pending = flight.snapshot()
+        if pending:
+            logger.warning(f"Search budget {budget}s exceeded for '{article}', pending suppliers: {pending}")
+        return offers, pending
+
+    async def fetch_offers_many(
+        self,
+        articles: List[str],
+        budget: Optional[float] = None,
+        concurrency: Optional[int] = None
+    ) -> Dict[str, Tuple[Dict[str, List[Dict]], List[str]]]:
+        """
+        Сырые предложения всех поставщиков сразу по нескольким артикулам
+
+        Одновременно ищется не больше concurrency артикулов (остальные ждут очереди),
+        каждый - с тем же бюджетом и объединением запросов, что и в fetch_offers.
+        Слот освобождается, когда поиск артикула завершился у всех поставщиков, а не по бюджету:
+        запросы, продолжающиеся в фоне, тоже занимают слот и не вытесняют интерактивные поиски
+        из очередей лимитеров поставщиков
+
+        Args:
+            articles: Артикулы (повторы ищутся один раз)
+            budget: Сколько секунд ждать поставщиков по каждому артикулу
+            concurrency: Максимум одновременно ищущихся артикулов (по умолчанию BATCH_SEARCH_CONCURRENCY)
+
+        Returns:
+            {артикул: результат fetch_offers} в порядке articles
+        """
+        articles = list(dict.fromkeys(articles))
+        semaphore = asyncio.Semaphore(concurrency or BATCH_SEARCH_CONCURRENCY)
+
+        async def fetch(article: str):
+            await semaphore.acquire()
+            try:
+                flight = self._join_flight(article)
+            except BaseException:
+                semaphore.release()
+                raise
+            flight.done.add_done_callback(lambda _: semaphore.release())
+            return await self._collect_flight(flight, article, budget)
+
+        results = await asyncio.gather(*(fetch(article) for article in articles))
+        return dict(zip(articles, results))
+
+    async def stream_offers(
+        self,
+        article: str,
+        budget: Optional[float] = None
+    ) -> AsyncIterator[Tuple[str, List[Dict]]]:
+        """
+        Сырые предложения по мере ответа поставщиков
+
+        Args:
+            article: Артикул
+            budget: Сколько секунд ждать поставщиков (None - ждать всех)
+
+        Yields:
+            (поставщик, его предложения) в порядке готовности. Поставщики, не ответившие
+            в пределах бюджета, не выдаются (их задачи продолжают работу и заполняют кэш)
+        """
+        flight = self._join_flight(article)
+        suppliers_by_task = {task: supplier for supplier, task in flight.tasks.items()}
+        pending = set(suppliers_by_task)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + budget if budget is not None else None
+
+        while pending:
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                logger.warning(
+                    f"Stream budget {budget}s exceeded for '{article}', "
+                    f"pending suppliers: {sorted(suppliers_by_task[task] for task in pending)}"
+                )
+                return
+
+            for task in done:
+                yield suppliers_by_task[task], task.result()
+
+    def build_offers(
+        self,
+        offers: Dict[str, List[Dict]],
+        article: str,
+        markup_percent: float = 0,
+        availability_filter: Optional[str] = None,
+        sort_by: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Применяет к сырым предложениям наценку и правила отдельного запроса
+
+        Returns:
+            Объединенный список копий предложений всех поставщиков (dict, формат ответа API)
+        """
+        rossko_parts = self.rossko_client.finalize_offers(
+            offers.get('rossko', []),
+            article,
+            availability_filter=availability_filter,
+            sort_by=sort_by,
+            markup_percent=markup_percent
+        )
+        autotrade_parts = _apply_markup(offers.get('autotrade', []), markup_percent)
+        berg_parts = _apply_markup(offers.get('berg', []), markup_percent)
+        autostels_parts = _apply_markup(offers.get('autostels', []), markup_percent)
+
+        # Логируем результаты от каждого поставщика
+        logger.info(
+            f"Raw results before filtering: Rossko={len(rossko_parts)}, Autotrade={len(autotrade_parts)}, "
+            f"Berg={len(berg_parts)}, Autostels={len(autostels_parts)}"
+        )
+
+        return rossko_parts + autotrade_parts + berg_parts + autostels_parts
+
+    def health(self) -> Dict:
+        """Состояние поставщиков (circuit breaker, лимит запросов, хеджирование) и кэша предложений"""
+        clients = {
+            'rossko': self.rossko_client,
+            'autotrade': self.autotrade_client,
+            'berg': self.berg_client,
+            'autostels': self.autostels_client,
+        }
+        suppliers = {
+            supplier: {'circuit': client.breaker.stats(), 'concurrency': client.limiter.stats()}
+            for supplier, client in clients.items()
+        }
+
+        suppliers['rossko']['hedging'] = {'search': self.rossko_client.search_hedger.stats()}
+        suppliers['autostels']['hedging'] = {
+            method: hedger.stats() for method, hedger in self.autostels_client.hedgers.items()
+        }
+
+        return {
+            'suppliers': suppliers,
+            'offer_cache': self.cache.stats(),
+            'cross_graph': self.cross_graph.stats(),
+        }
+
+    def _join_flight(self, article: str) -> SearchFlight:
+        """Возвращает выполняющийся поиск этого артикула или запускает новый"""
+        key = normalize_article(article)
+        flight = self._flights.get(key)
+
+        if flight is not None:
+            logger.info(f"Joined in-flight search for '{key}'")
+            return flight
+
+        flight = self._start_flight(article)
+        self._flights[key] = flight
+        flight.done.add_done_callback(lambda _: self._release_flight(key, flight))
+        return flight
+
+    def _release_flight(self, key: str, flight: SearchFlight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def _start_flight(self, article: str) -> SearchFlight:
+        """Запускает все ЧЕТЫРЕ поиска параллельно; OEM fallback входит в задачу Autotrade"""
+        tasks = {
+            'rossko': self._guarded('rossko', self._fetch(
+                'rossko', article,
+                lambda: self.rossko_client.fetch_offers_async(article)
+            )),
+            'berg': self._guarded('berg', self._fetch(
+                'berg', article,
+                lambda: self.berg_client.search_by_article_async(article, analogs=True),
+                {'analogs': 1}
+            )),
+            'autostels': self._guarded('autostels', self._fetch(
+                'autostels', article,
+                lambda: self.autostels_client.search_by_article_async(article)
+            )),
+        }
+        others = dict(tasks)
+        tasks['autotrade'] = self._guarded('autotrade', self._search_autotrade(article, others))
+
+        return SearchFlight(article, {supplier: tasks[supplier] for supplier in SUPPLIERS})
+
+    def _guarded(self, supplier: str, coro: Awaitable[List[Dict]]) -> asyncio.Task:
+        """Задача поставщика: ошибка логируется и превращается в пустой результат"""
+        async def run():
+            try:
+                return await coro
+            except (CircuitOpenError, LimiterRejectedError) as e:
+                logger.info(f"{supplier.capitalize()} skipped: {str(e)}")
+                return []
+            except Exception as e:
+                logger.error(f"{supplier.capitalize()} search failed: {str(e)}")
+                return []
+
+        return asyncio.ensure_future(run())
+
+    async def _search_autotrade(self, article: str, others: Dict[str, asyncio.Task]) -> List[Dict]:
+        """
+        Прямой поиск в Autotrade; если он пуст - результаты поиска по OEM номерам (кроссам)
+
+        OEM номера берутся из графа кроссов. Поиск по ним спекулятивный: кроссы, по которым
+        Autotrade уже находил предложения, запрашиваются сразу, остальные - как только ответил
+        первый из других поставщиков (его кроссы к этому моменту уже в графе). Если прямой
+        поиск нашел предложения, спекулятивные запросы отменяются
+
+        Если прямой поиск пуст, новых кандидатов от других поставщиков ждем не дольше
+        OEM_CANDIDATE_WAIT_SECONDS от начала поиска и только пока запущенные OEM запросы
+        ничего не нашли: результат не зависит от самого медленного поставщика
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + OEM_CANDIDATE_WAIT_SECONDS
+        direct = asyncio.ensure_future(self._fetch_autotrade(article))
+        lookups: Dict[str, asyncio.Task] = {}
+        self._start_oem_lookups(article, lookups, proven_only=True)
+
+        try:
+            waiting = {direct, *others.values()}
+            while direct in waiting:
+                done, waiting = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+                if direct in done:
+                    autotrade_parts = self._direct_autotrade_result(direct)
+                    if autotrade_parts:
+                        if lookups:
+                            logger.info(f"Autotrade direct search found parts, cancelling {len(lookups)} OEM lookups")
+                        return autotrade_parts
+                else:
+                    self._start_oem_lookups(article, lookups)
+
+            logger.info("Autotrade returned 0 results, using OEM search...")
+            self._start_oem_lookups(article, lookups)
+
+            # Дожидаемся остальных поставщиков, только пока есть свободные OEM запросы,
+            # запущенные запросы еще ничего не нашли и не истек срок ожидания кандидатов
+            while waiting and len(lookups) < OEM_MAX_LOOKUPS and not self._oem_lookups_found(lookups):
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                running = {task for task in lookups.values() if not task.done()}
+                done, _ = await asyncio.wait(waiting | running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                waiting -= done
+                self._start_oem_lookups(article, lookups)
+
+            return await self._collect_oem_lookups(article, lookups)
+        finally:
+            for task in lookups.values():
+                task.cancel()
+            if not direct.done():
+                direct.cancel()
+
+    @staticmethod
+    def _direct_autotrade_result(direct: asyncio.Task) -> List[Dict]:
+        """
+        Результат прямого поиска в Autotrade; ошибка (таймаут, отказ ограничителя) - пустой результат,
+        чтобы OEM fallback все равно выполнился. Открытый circuit breaker пробрасывается: OEM запросы
+        к Autotrade он бы тоже отклонил
+        """
+        try:
+            return direct.result()
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f"Autotrade direct search failed: {str(e)}")
+            return []
+
+    @staticmethod
+    def _oem_lookups_found(lookups: Dict[str, asyncio.Task]) -> bool:
+        """Все запущенные OEM запросы завершились и хотя бы один нашел предложения"""
+        if not lookups or not all(task.done() for task in lookups.values()):
+            return False
+        return any(not task.cancelled() and task.exception() is None and task.result() for task in lookups.values())
+
+    def _start_oem_lookups(self, article: str, lookups: Dict[str, asyncio.Task], proven_only: bool = False):
+        """Запускает поиск в Autotrade по лучшим кроссам из графа, пока не исчерпан OEM_MAX_LOOKUPS"""
+        if len(lookups) >= OEM_MAX_LOOKUPS:
+            return
+
+        for oem_number in self.cross_graph.equivalents(article, limit=OEM_MAX_LOOKUPS * 2, proven_only=proven_only):
+            if len(lookups) >= OEM_MAX_LOOKUPS:
+                break
+            if oem_number not in lookups:
+                logger.info(f"Starting speculative Autotrade OEM lookup: {oem_number}")
+                lookups[oem_number] = asyncio.ensure_future(self._fetch_autotrade(oem_number, speculative=True))
+
+    async def _collect_oem_lookups(self, article: str, lookups: Dict[str, asyncio.Task]) -> List[Dict]:
+        """Объединяет результаты поиска в Autotrade по OEM номерам и записывает их в граф кроссов"""
+        if not lookups:
+            return []
+
+        oem_results = await asyncio.gather(*lookups.values(), return_exceptions=True)
+
+        autotrade_parts = []
+        for oem_number, result in zip(lookups, oem_results):
+            if isinstance(result, Exception):
+                logger.error(f"OEM search failed for {oem_number}: {str(result)}")
+                continue
+
+            self.cross_graph.record_lookup(article, oem_number, found=bool(result))
+            if result:
+                logger.info(f"Found {len(result)} results from OEM search")
+                autotrade_parts.extend(result)
+
+        if autotrade_parts:
+            logger.info(f"✅ Autotrade OEM search successful: found {len(autotrade_parts)} parts")
+
+        return autotrade_parts
+
+    def _fetch_autotrade(self, article: str, speculative: bool = False) -> Awaitable[List[Dict]]:
+        """Поиск в Autotrade с аналогами (общий ключ кэша для прямого поиска и OEM fallback)"""
+        return self._fetch(
+            'autotrade', article,
+            lambda: self.autotrade_client.search_by_article_async(article, cross=True, replace=False),
+            {'cross': 1, 'replace': 0},
+            speculative=speculative
+        )
+
+    async def _fetch(
+        self,
+        supplier: str,
+        article: str,
+        fetch: Callable[[], Awaitable[List[Dict]]],
+        options: Optional[Dict] = None,
+        speculative: bool = False
+    ) -> List[Dict]:
+        """
+        Запрос к поставщику через кэш (stale-while-revalidate)
+
+        Args:
+            supplier: Имя поставщика (ключ TTL в кэше)
+            article: Артикул запроса
+            fetch: Фабрика корутины, выполняющей запрос к поставщику
+            options: Параметры запроса, влияющие на результат (входят в ключ кэша)
+            speculative: Запрос к поставщику отменяется, если его результат больше никто не ждет
+        """
+        async def fetch_and_observe():
+            offers = await fetch()
+            self.cross_graph.observe(article, supplier, offers)
+            return offers
+
+        if not self.cache.enabled(supplier):
+            return await fetch_and_observe()
+
+        key = OfferCache.make_key(article, options)
+        entry = self.cache.get(supplier, key)
+
+        if entry is not None:
+            if entry.is_stale():
+                self._refresh_in_background(supplier, key, fetch_and_observe)
+            return entry.offers
+
+        return await self._calls.do(
+            f'{supplier}:{key}',
+            lambda: self._fetch_and_store(supplier, key, fetch_and_observe),
+            cancel_abandoned=speculative
+        )
+
+    async def _fetch_and_store(self, supplier: str, key: str, fetch: Callable[[], Awaitable[List[Dict]]]) -> List[Dict]:
+        offers = await fetch()
+        self.cache.set(supplier, key, offers)
+        return offers
+
+    def _refresh_in_background(self, supplier: str, key: str, fetch: Callable[[], Awaitable[List[Dict]]]):
+        """Обновляет устаревшую запись кэша в фоне (не более одного обновления на ключ)"""
+        call_key = f'{supplier}:{key}'
+        if self._calls.is_running(call_key):
+            return
+
+        async def refresh():
+            try:
+                offers = await self._fetch_and_store(supplier, key, fetch)
+                logger.info(f"Refreshed stale {supplier} offers for '{key}'")
+                return offers
+            except Exception as e:
+                logger.error(f"Background refresh of {supplier} offers for '{key}' failed: {str(e)}")
+                return []
+
+        self._calls.start(call_key, refresh)
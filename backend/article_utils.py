@@ -0,0 +1,57 @@
+"""
+Article Utils
+Общие функции для работы с артикулами запчастей
+"""
+
+import re
+
+
+def normalize_article(article: str) -> str:
+    """Нормализует артикул для сравнения: убирает пробелы, дефисы, приводит к верхнему регистру"""
+    return article.upper().replace('-', '').replace(' ', '').replace('/', '')
+
+
+def is_exact_match(search_article: str, result_article: str) -> bool:
+    """Проверяет точное совпадение артикулов (с учетом нормализации)"""
+    return normalize_article(search_article) == normalize_article(result_article)
+
+
+def article_ngrams(normalized: str, n: int = 4) -> frozenset:
+    """Все подстроки длины n нормализованного артикула"""
+    return frozenset(normalized[i:i + n] for i in range(len(normalized) - n + 1))
+
+
+class ArticleMatcher:
+    """
+    Нечеткая связь артикулов с запрошенным: прямое вхождение одного в другой
+    или общая подстрока не короче n символов (аналоги и кроссы могут сильно отличаться)
+
+    n-граммы запроса собираются один раз в скомпилированное регулярное выражение:
+    проверка позиции - один поиск по ее артикулу вместо цикла по подстрокам запроса
+
+    Args:
+        article: Запрошенный артикул
+        n: Минимальная длина общей подстроки
+        normalize: Нормализация артикулов запроса и позиций (по умолчанию normalize_article)
+    """
+
+    __slots__ = ('query', 'n', 'normalize', '_pattern')
+
+    def __init__(self, article: str, n: int = 4, normalize=normalize_article):
+        self.normalize = normalize
+        self.n = n
+        self.query = normalize(article)
+
+        grams = article_ngrams(self.query, n)
+        self._pattern = re.compile('|'.join(map(re.escape, sorted(grams)))) if grams else None
+
+    def is_related(self, article: str) -> bool:
+        """Связан ли артикул позиции с запрошенным"""
+        item = self.normalize(article)
+
+        if self.query in item or item in self.query:
+            return True
+
+        if self._pattern is None or len(item) < self.n:
+            return False
+        return self._pattern.search(item) is not None
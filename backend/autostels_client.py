@@ -1,10 +1,83 @@
+import os
+import asyncio
 import requests
-import xml.etree.ElementTree as ET
+import httpx
 import logging
-from typing import List, Dict, Optional
+from io import BytesIO
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from lxml import etree
+
+from http_pool import get_http_client
+from hedging import create_hedger
+from supplier_errors import SupplierError, SupplierTimeoutError
+from circuit_breaker import create_breaker
+from concurrency_limiter import create_limiter
+from offer import Offer, PartialOffers, offers_to_dicts
 
 logger = logging.getLogger(__name__)
 
+# Сколько запросов Step2 (по брендам) выполняется одновременно в асинхронном поиске
+STEP2_CONCURRENCY = int(os.environ.get('AUTOSTELS_STEP2_CONCURRENCY', 4))
+# Сколько секунд ждать Step2 по всем брендам; бренды, не успевшие ответить, в результат не попадают
+STEP2_BUDGET_SECONDS = float(os.environ.get('AUTOSTELS_STEP2_BUDGET', 5))
+
+# Namespace элементов <Method>Result в SOAP ответе
+RESULT_NS = 'http://tempuri.org/'
+
+# Сущности не раскрываются; huge_tree - вложенный документ с сотнями строк может превышать лимит libxml2 на текст
+_PARSE_OPTIONS = {'resolve_entities': False, 'huge_tree': True}
+
+# Строки результата на любой глубине вложенного документа (как findall('.//row'))
+_ROWS_XPATH = etree.XPath('.//row')
+
+
+def _result_text(content: bytes, method: str) -> Optional[str]:
+    """
+    Вложенный XML документ из элемента <method>Result SOAP ответа
+
+    Конверт разбирается потоково из байтов ответа и только до элемента результата
+    """
+    tag = f'{{{RESULT_NS}}}{method}Result'
+    for _, element in etree.iterparse(BytesIO(content), events=('end',), tag=tag, **_PARSE_OPTIONS):
+        return element.text
+    return None
+
+
+def _iter_rows(document: str) -> Iterator[Dict[str, str]]:
+    """
+    Строки <row> вложенного документа: {поле: текст}
+
+    Документ разбирается один раз, строки выбираются скомпилированным XPath, поля строки -
+    одним проходом по ее дочерним элементам (вместо findtext на каждое поле).
+    Как findtext: пустое поле - '', при повторе поля берется первое
+    """
+    parser = etree.XMLParser(encoding='utf-8', **_PARSE_OPTIONS)
+    root = etree.fromstring(document.encode('utf-8'), parser)
+    for row in _ROWS_XPATH(root):
+        values = {}
+        for child in row:
+            if child.tag not in values:
+                values[child.tag] = child.text or ''
+        yield values
+
+
+def _offer_from_row(row: Dict[str, str]) -> Offer:
+    """Предложение из строки ответа SearchOfferStep2 / SearchOfferJoint"""
+    return Offer(
+        article=row.get('CodeAsIs', ''),
+        brand=row.get('ManufacturerName', ''),
+        name=row.get('ProductName', ''),
+        price=float(row.get('Price', '0')),
+        quantity=int(row.get('Quantity', '0')),
+        delivery_days=int(row.get('PeriodMin', '0')),
+        delivery_days_max=int(row.get('PeriodMax', '0')),
+        warehouse=row.get('OfferName', 'Autostels'),
+        is_cross=int(row.get('IsCross', '0')) == 1,
+        in_stock=int(row.get('IsAvailability', '0')) == 1,
+        provider='autostels'
+    )
+
 
 class AutostelsClient:
     def __init__(self):
@@ -15,42 +88,123 @@ class AutostelsClient:
         self.parent_id = "39151"
         self.login_b64 = "Y2FyLndvcmtzaG9wNzJAbWFpbC5ydQ=="
         self.password_b64 = "UXEyMzMyMXE="
+        
+        # Хеджирование медленных запросов по каждому методу (включается через HEDGED_SUPPLIERS)
+        self.hedgers = {
+            'SearchOfferStep1': create_hedger('autostels', 'step1'),
+            'SearchOfferStep2': create_hedger('autostels', 'step2'),
+            'SearchOfferJoint': create_hedger('autostels', 'joint'),
+        }
+        # Общий breaker на все SOAP методы: сбои любого шага говорят о недоступности сервиса
+        self.breaker = create_breaker('autostels')
+        self.limiter = create_limiter('autostels')
     
     def _create_session_info(self) -> str:
         """Создает XML для SessionInfo (используем атрибуты как в документации)"""
         return f'<SessionInfo ParentID="{self.parent_id}" UserLogin="{self.login_b64}" UserPass="{self.password_b64}" />'
     
-    def search_step1(self, article: str) -> List[Dict]:
+    def _build_soap_request(self, method: str, xml_params: str) -> Tuple[bytes, Dict[str, str]]:
+        """Оборачивает XML параметры в SOAP конверт метода (XML передается через CDATA)"""
+        soap_body = f"""<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" xmlns:tem="http://tempuri.org/">
+  <soapenv:Header/>
+  <soapenv:Body>
+    <tem:{method}>
+      <tem:SearchParametersXml><![CDATA[{xml_params}]]></tem:SearchParametersXml>
+    </tem:{method}>
+  </soapenv:Body>
+</soapenv:Envelope>"""
+        
+        headers = {
+            'Content-Type': 'text/xml; charset=utf-8',
+            'SOAPAction': f'http://tempuri.org/IAS2CSearch/{method}'
+        }
+        
+        return soap_body.encode('utf-8'), headers
+    
+    async def _post_async(self, method: str, xml_params: str, budget: Optional[float] = None):
         """
-        Шаг 1: Поиск брендов по артикулу
+        Асинхронный SOAP запрос через общий пул соединений (с хеджированием)
+        
+        Args:
+            budget: Сколько секунд осталось у вызывающего (None - только таймаут запроса). Превышение -
+                такой же таймаут, как у HTTP запроса: его учитывают breaker и лимитер
+        
+        Raises:
+            SupplierError: таймаут, сетевая ошибка или ответ 429/5xx
+            CircuitOpenError: после серии сбоев запросы временно не отправляются
+            LimiterRejectedError: превышен лимит одновременных запросов к поставщику
         """
+        return await self.limiter.call(lambda: self.breaker.call(lambda: self._send_async(method, xml_params, budget)))
+    
+    async def _send_async(self, method: str, xml_params: str, budget: Optional[float] = None):
+        body, headers = self._build_soap_request(method, xml_params)
         try:
-            # XML параметры (внутренний XML)
-            xml_params = f"""<root>
+            response = await asyncio.wait_for(self.hedgers[method].call(lambda: get_http_client().post(
+                self.search_url,
+                content=body,
+                headers=headers,
+                timeout=10
+            )), budget)
+        except asyncio.TimeoutError as e:
+            raise SupplierTimeoutError('autostels', f"{method} budget {budget:.1f}s exceeded") from e
+        except httpx.TimeoutException as e:
+            raise SupplierTimeoutError('autostels', f"{method} timeout") from e
+        except httpx.HTTPError as e:
+            raise SupplierError('autostels', f"{method} request error: {e}") from e
+        
+        if response.status_code == 429 or response.status_code >= 500:
+            raise SupplierError('autostels', f"{method} returned status {response.status_code}", response.status_code)
+        
+        return response
+    
+    def _step1_params(self, article: str) -> str:
+        """XML параметры (внутренний XML) для SearchOfferStep1"""
+        return f"""<root>
   {self._create_session_info()}
   <Search>
     <Key>{article}</Key>
   </Search>
 </root>"""
-            
-            # Формируем SOAP запрос (XML передается через CDATA)
-            soap_body = f"""<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" xmlns:tem="http://tempuri.org/">
-  <soapenv:Header/>
-  <soapenv:Body>
-    <tem:SearchOfferStep1>
-      <tem:SearchParametersXml><![CDATA[{xml_params}]]></tem:SearchParametersXml>
-    </tem:SearchOfferStep1>
-  </soapenv:Body>
-</soapenv:Envelope>"""
-            
-            headers = {
-                'Content-Type': 'text/xml; charset=utf-8',
-                'SOAPAction': 'http://tempuri.org/IAS2CSearch/SearchOfferStep1'
-            }
+    
+    def _step2_params(self, product_id: str, stocks_only: int, in_stock: int, show_cross: int) -> str:
+        """XML параметры для SearchOfferStep2"""
+        return f"""<root>
+  {self._create_session_info()}
+  <Search ResultFilter="0">
+    <ProductID>{product_id}</ProductID>
+    <StocksOnly>{stocks_only}</StocksOnly>
+    <InStock>{in_stock}</InStock>
+    <ShowCross>{show_cross}</ShowCross>
+    <PeriodMin>-1</PeriodMin>
+    <PeriodMax>-1</PeriodMax>
+  </Search>
+</root>"""
+    
+    def _joint_params(self, article: str, brand: str, in_stock: int, show_cross: int) -> str:
+        """XML параметры для SearchOfferJoint"""
+        return f"""<root>
+  {self._create_session_info()}
+  <Search ResultFilter="0">
+    <ProductCode>{article}</ProductCode>
+    <ProducerName>{brand}</ProducerName>
+    <StocksOnly>0</StocksOnly>
+    <InStock>{in_stock}</InStock>
+    <ShowCross>{show_cross}</ShowCross>
+    <PeriodMin>-1</PeriodMin>
+    <PeriodMax>-1</PeriodMax>
+  </Search>
+</root>"""
+    
+    def search_step1(self, article: str) -> List[Dict]:
+        """
+        Шаг 1: Поиск брендов по артикулу
+        """
+        try:
+            body, headers = self._build_soap_request('SearchOfferStep1', self._step1_params(article))
             
             response = requests.post(
                 self.search_url,
-                data=soap_body.encode('utf-8'),
+                data=body,
                 headers=headers,
                 timeout=10
             )
@@ -61,39 +215,51 @@ class AutostelsClient:
                 return []
             
             # Парсим ответ
-            return self._parse_step1_response(response.text)
+            return self._parse_step1_response(response.content)
             
         except Exception as e:
             logger.error(f"Error in search_step1: {str(e)}")
             return []
     
-    def _parse_step1_response(self, xml_text: str) -> List[Dict]:
-        """Парсит ответ Step1 и возвращает список брендов"""
+    async def search_step1_async(self, article: str) -> List[Dict]:
+        """
+        Шаг 1 (асинхронно через общий пул соединений)
+        """
         try:
-            root = ET.fromstring(xml_text)
+            response = await self._post_async('SearchOfferStep1', self._step1_params(article))
             
-            # Находим результат (вложенный XML в виде строки)
-            ns = {'s': 'http://schemas.xmlsoap.org/soap/envelope/',
-                  't': 'http://tempuri.org/'}
+            if response.status_code != 200:
+                logger.error(f"Step1 failed with status {response.status_code}")
+                logger.error(f"Response text: {response.text[:500]}")
+                return []
+            
+            return self._parse_step1_response(response.content)
             
-            result_elem = root.find('.//t:SearchOfferStep1Result', ns)
-            if result_elem is None or not result_elem.text:
+        except SupplierError:
+            raise
+        except Exception as e:
+            logger.error(f"Error in search_step1: {str(e)}")
+            return []
+    
+    def _parse_step1_response(self, content: bytes) -> List[Dict]:
+        """Парсит ответ Step1 (байты SOAP ответа) и возвращает список брендов"""
+        try:
+            # Находим результат (вложенный XML в виде строки)
+            document = _result_text(content, 'SearchOfferStep1')
+            if not document:
                 logger.info("No result element found")
                 return []
             
-            # Парсим вложенный XML
-            inner_root = ET.fromstring(result_elem.text)
-            
             brands = []
-            for row in inner_root.findall('.//row'):
-                product_id = row.findtext('ProductID', '')
-                producer_name = row.findtext('ProducerName', '')
+            for row in _iter_rows(document):
+                product_id = row.get('ProductID', '')
+                producer_name = row.get('ProducerName', '')
                 
                 if product_id and producer_name:
                     brands.append({
                         'product_id': product_id,
                         'producer_name': producer_name,
-                        'stocks_only': row.findtext('StocksOnly', '0')
+                        'stocks_only': row.get('StocksOnly', '0')
                     })
             
             logger.info(f"Found {len(brands)} brands for article")
@@ -112,36 +278,13 @@ class AutostelsClient:
         show_cross: 0 - без аналогов, 1 - с аналогами
         """
         try:
-            # XML параметры
-            xml_params = f"""<root>
-  {self._create_session_info()}
-  <Search ResultFilter="0">
-    <ProductID>{product_id}</ProductID>
-    <StocksOnly>{stocks_only}</StocksOnly>
-    <InStock>{in_stock}</InStock>
-    <ShowCross>{show_cross}</ShowCross>
-    <PeriodMin>-1</PeriodMin>
-    <PeriodMax>-1</PeriodMax>
-  </Search>
-</root>"""
-            
-            soap_body = f"""<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" xmlns:tem="http://tempuri.org/">
-  <soapenv:Header/>
-  <soapenv:Body>
-    <tem:SearchOfferStep2>
-      <tem:SearchParametersXml><![CDATA[{xml_params}]]></tem:SearchParametersXml>
-    </tem:SearchOfferStep2>
-  </soapenv:Body>
-</soapenv:Envelope>"""
-            
-            headers = {
-                'Content-Type': 'text/xml; charset=utf-8',
-                'SOAPAction': 'http://tempuri.org/IAS2CSearch/SearchOfferStep2'
-            }
+            body, headers = self._build_soap_request(
+                'SearchOfferStep2', self._step2_params(product_id, stocks_only, in_stock, show_cross)
+            )
             
             response = requests.post(
                 self.search_url,
-                data=soap_body.encode('utf-8'),
+                data=body,
                 headers=headers,
                 timeout=10
             )
@@ -152,58 +295,53 @@ class AutostelsClient:
                 return []
             
             # Парсим ответ
-            return self._parse_step2_response(response.text)
+            return offers_to_dicts(self._parse_step2_response(response.content))
             
         except Exception as e:
             logger.error(f"Error in search_step2: {str(e)}")
             return []
     
-    def _parse_step2_response(self, xml_text: str) -> List[Dict]:
-        """Парсит ответ Step2 и возвращает список предложений"""
+    async def search_step2_async(
+        self,
+        product_id: str,
+        stocks_only: int = 0,
+        in_stock: int = 1,
+        show_cross: int = 1,
+        budget: Optional[float] = None
+    ) -> List[Dict]:
+        """
+        Шаг 2 (асинхронно через общий пул соединений)
+        
+        budget - сколько секунд ждать ответа (превышение - SupplierTimeoutError, учитывается breaker и лимитером)
+        """
         try:
-            root = ET.fromstring(xml_text)
-            
-            ns = {'s': 'http://schemas.xmlsoap.org/soap/envelope/',
-                  't': 'http://tempuri.org/'}
+            response = await self._post_async(
+                'SearchOfferStep2', self._step2_params(product_id, stocks_only, in_stock, show_cross), budget
+            )
             
-            result_elem = root.find('.//t:SearchOfferStep2Result', ns)
-            if result_elem is None or not result_elem.text:
-                logger.info("No result element found in step2")
+            if response.status_code != 200:
+                logger.error(f"Step2 failed with status {response.status_code}")
+                logger.error(f"Response text: {response.text[:500]}")
                 return []
             
-            # Парсим вложенный XML
-            inner_root = ET.fromstring(result_elem.text)
-            
-            offers = []
-            for row in inner_root.findall('.//row'):
-                try:
-                    offer = {
-                        'article': row.findtext('CodeAsIs', ''),
-                        'brand': row.findtext('ManufacturerName', ''),
-                        'name': row.findtext('ProductName', ''),
-                        'price': float(row.findtext('Price', '0')),
-                        'quantity': int(row.findtext('Quantity', '0')),
-                        'delivery_days': int(row.findtext('PeriodMin', '0')),
-                        'delivery_days_max': int(row.findtext('PeriodMax', '0')),
-                        'warehouse': row.findtext('OfferName', 'Autostels'),
-                        'is_cross': int(row.findtext('IsCross', '0')) == 1,
-                        'in_stock': int(row.findtext('IsAvailability', '0')) == 1,
-                        'provider': 'autostels'
-                    }
-                    
-                    offers.append(offer)
-                    
-                except Exception as e:
-                    logger.warning(f"Error parsing row element: {str(e)}")
-                    continue
-            
-            logger.info(f"Parsed {len(offers)} offers from step2")
-            return offers
+            return self._parse_step2_response(response.content)
             
+        except SupplierError:
+            raise
         except Exception as e:
-            logger.error(f"Error parsing step2 response: {str(e)}")
+            logger.error(f"Error in search_step2: {str(e)}")
             return []
     
+    def _parse_step2_response(self, content: bytes) -> List[Dict]:
+        """Парсит ответ Step2 (байты SOAP ответа) и возвращает список предложений"""
+        offers = self._parse_offers(content, 'SearchOfferStep2')
+        if offers is None:
+            logger.info("No result element found in step2")
+            return []
+        
+        logger.info(f"Parsed {len(offers)} offers from step2")
+        return offers
+    
     def search_joint(self, article: str, brand: str = "", in_stock: int = 0, show_cross: int = 1) -> List[Dict]:
         """
         Комбинированный поиск (SearchOfferJoint) когда известен бренд
@@ -211,37 +349,13 @@ class AutostelsClient:
         show_cross: 0 - без аналогов, 1 - с аналогами
         """
         try:
-            # XML параметры
-            xml_params = f"""<root>
-  {self._create_session_info()}
-  <Search ResultFilter="0">
-    <ProductCode>{article}</ProductCode>
-    <ProducerName>{brand}</ProducerName>
-    <StocksOnly>0</StocksOnly>
-    <InStock>{in_stock}</InStock>
-    <ShowCross>{show_cross}</ShowCross>
-    <PeriodMin>-1</PeriodMin>
-    <PeriodMax>-1</PeriodMax>
-  </Search>
-</root>"""
-            
-            soap_body = f"""<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" xmlns:tem="http://tempuri.org/">
-  <soapenv:Header/>
-  <soapenv:Body>
-    <tem:SearchOfferJoint>
-      <tem:SearchParametersXml><![CDATA[{xml_params}]]></tem:SearchParametersXml>
-    </tem:SearchOfferJoint>
-  </soapenv:Body>
-</soapenv:Envelope>"""
-            
-            headers = {
-                'Content-Type': 'text/xml; charset=utf-8',
-                'SOAPAction': 'http://tempuri.org/IAS2CSearch/SearchOfferJoint'
-            }
+            body, headers = self._build_soap_request(
+                'SearchOfferJoint', self._joint_params(article, brand, in_stock, show_cross)
+            )
             
             response = requests.post(
                 self.search_url,
-                data=soap_body.encode('utf-8'),
+                data=body,
                 headers=headers,
                 timeout=10
             )
@@ -252,56 +366,69 @@ class AutostelsClient:
                 return []
             
             # Парсим ответ
-            return self._parse_joint_response(response.text)
+            return offers_to_dicts(self._parse_joint_response(response.content))
             
         except Exception as e:
             logger.error(f"Error in search_joint: {str(e)}")
             return []
     
-    def _parse_joint_response(self, xml_text: str) -> List[Dict]:
-        """Парсит ответ SearchOfferJoint"""
+    async def search_joint_async(self, article: str, brand: str = "", in_stock: int = 0, show_cross: int = 1) -> List[Dict]:
+        """
+        SearchOfferJoint (асинхронно через общий пул соединений)
+        """
         try:
-            root = ET.fromstring(xml_text)
-            
-            ns = {'s': 'http://schemas.xmlsoap.org/soap/envelope/',
-                  't': 'http://tempuri.org/'}
+            response = await self._post_async(
+                'SearchOfferJoint', self._joint_params(article, brand, in_stock, show_cross)
+            )
             
-            result_elem = root.find('.//t:SearchOfferJointResult', ns)
-            if result_elem is None or not result_elem.text:
-                logger.info("No result element found in SearchJoint")
+            if response.status_code != 200:
+                logger.error(f"SearchJoint failed with status {response.status_code}")
+                logger.error(f"Response text: {response.text[:500]}")
                 return []
             
-            # Парсим вложенный XML
-            inner_root = ET.fromstring(result_elem.text)
+            return self._parse_joint_response(response.content)
+            
+        except SupplierError:
+            raise
+        except Exception as e:
+            logger.error(f"Error in search_joint: {str(e)}")
+            return []
+    
+    def _parse_joint_response(self, content: bytes) -> List[Dict]:
+        """Парсит ответ SearchOfferJoint (байты SOAP ответа)"""
+        offers = self._parse_offers(content, 'SearchOfferJoint')
+        if offers is None:
+            logger.info("No result element found in SearchJoint")
+            return []
+        
+        logger.info(f"Parsed {len(offers)} offers from SearchJoint")
+        return offers
+    
+    def _parse_offers(self, content: bytes, method: str) -> Optional[List[Dict]]:
+        """
+        Предложения из ответа SearchOfferStep2 / SearchOfferJoint за один проход по строкам
+        
+        Returns:
+            Список предложений (строки с некорректными полями пропускаются)
+            или None, если в ответе нет результата
+        """
+        try:
+            document = _result_text(content, method)
+            if not document:
+                return None
             
             offers = []
-            for row in inner_root.findall('.//row'):
+            for row in _iter_rows(document):
                 try:
-                    offer = {
-                        'article': row.findtext('CodeAsIs', ''),
-                        'brand': row.findtext('ManufacturerName', ''),
-                        'name': row.findtext('ProductName', ''),
-                        'price': float(row.findtext('Price', '0')),
-                        'quantity': int(row.findtext('Quantity', '0')),
-                        'delivery_days': int(row.findtext('PeriodMin', '0')),
-                        'delivery_days_max': int(row.findtext('PeriodMax', '0')),
-                        'warehouse': row.findtext('OfferName', 'Autostels'),
-                        'is_cross': int(row.findtext('IsCross', '0')) == 1,
-                        'in_stock': int(row.findtext('IsAvailability', '0')) == 1,
-                        'provider': 'autostels'
-                    }
-                    
-                    offers.append(offer)
-                    
+                    offers.append(_offer_from_row(row))
                 except Exception as e:
                     logger.warning(f"Error parsing row element: {str(e)}")
                     continue
             
-            logger.info(f"Parsed {len(offers)} offers from SearchJoint")
             return offers
             
         except Exception as e:
-            logger.error(f"Error parsing joint response: {str(e)}")
+            logger.error(f"Error parsing {method} response: {str(e)}")
             return []
     
     def search_by_article(self, article: str, brand: str = "", in_stock: int = 0, show_cross: int = 1) -> List[Dict]:
@@ -334,3 +461,84 @@ class AutostelsClient:
         
         logger.info(f"Found total {len(all_offers)} offers from Autostels")
         return all_offers
+    
+    async def search_by_article_async(self, article: str, brand: str = "", in_stock: int = 0, show_cross: int = 1) -> List[Dict]:
+        """
+        Полный поиск по артикулу (асинхронно через общий пул соединений)
+        Логика такая же, как у search_by_article
+        """
+        logger.info(f"Searching Autostels (async) for article: {article}")
+        
+        if brand:
+            return await self.search_joint_async(article, brand, in_stock, show_cross)
+        
+        brands = await self.search_step1_async(article)
+        
+        if not brands:
+            logger.info("No brands found in step1")
+            return await self.search_joint_async(article, "", in_stock, show_cross)
+        
+        return await self._search_step2_concurrent(brands, in_stock, show_cross)
+    
+    async def _search_step2_concurrent(self, brands: List[Dict], in_stock: int, show_cross: int) -> List[Dict]:
+        """
+        Step2 по всем брендам параллельно (не больше STEP2_CONCURRENCY запросов одновременно)
+        
+        Через STEP2_BUDGET_SECONDS возвращаются предложения брендов, успевших ответить
+        (PartialOffers). Отправленный запрос, не уложившийся в бюджет, завершается SupplierTimeoutError
+        внутри лимитера и breaker - они видят замедление поставщика. Бренды, до которых очередь
+        не дошла за бюджет, пропускаются без запроса
+        """
+        semaphore = asyncio.Semaphore(STEP2_CONCURRENCY)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + STEP2_BUDGET_SECONDS
+        
+        async def fetch_brand(brand_info: Dict) -> List[Dict]:
+            async with semaphore:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                stocks_only = int(brand_info.get('stocks_only', 0))
+                return await self.search_step2_async(
+                    brand_info['product_id'], stocks_only, in_stock, show_cross, budget=remaining
+                )
+        
+        tasks = [asyncio.ensure_future(fetch_brand(brand_info)) for brand_info in brands]
+        try:
+            await asyncio.wait(tasks)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        
+        all_offers = []
+        failures = []
+        skipped = 0
+        # Обходим в порядке брендов из Step1, а не в порядке ответов
+        for brand_info, task in zip(brands, tasks):
+            error = task.exception()
+            if isinstance(error, (asyncio.TimeoutError, SupplierTimeoutError)):
+                skipped += 1
+                failures.append(error)
+                continue
+            if error is not None:
+                # Сбой по одному бренду не отменяет предложения по остальным
+                logger.error(f"Step2 failed for {brand_info.get('producer_name')}: {str(error)}")
+                failures.append(error)
+                continue
+            all_offers.extend(task.result())
+        
+        if failures and len(failures) == len(brands):
+            if skipped == len(brands):
+                raise SupplierTimeoutError('autostels', f"Step2 budget {STEP2_BUDGET_SECONDS}s exceeded for all brands")
+            raise next(error for error in reversed(failures) if not isinstance(error, asyncio.TimeoutError))
+        
+        if skipped:
+            logger.warning(
+                f"Step2 budget {STEP2_BUDGET_SECONDS}s exceeded: {skipped} of {len(brands)} brands skipped"
+            )
+            logger.info(f"Found total {len(all_offers)} offers from Autostels (partial)")
+            return PartialOffers(all_offers)
+        
+        logger.info(f"Found total {len(all_offers)} offers from Autostels")
+        return all_offers
@@ -6,13 +6,26 @@ Autotrade API Client
 import os
 import hashlib
 import requests
+import httpx
 import logging
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import json
 
+from http_pool import get_http_client
+from supplier_errors import SupplierError, SupplierTimeoutError
+from circuit_breaker import create_breaker
+from concurrency_limiter import create_limiter
+from offer import Offer, offers_to_dicts
+from article_utils import ArticleMatcher
+
 logger = logging.getLogger(__name__)
 
 
+def _normalize_article(article: str) -> str:
+    # Нормализация Autotrade: без пробелов и дефисов, верхний регистр ('/' сохраняется)
+    return article.replace(' ', '').replace('-', '').upper()
+
+
 class AutotradeClient:
     """Клиент для работы с Autotrade API"""
     
@@ -34,6 +47,9 @@ class AutotradeClient:
             self.auth_key = self._generate_auth_key()
             logger.info("Generated auth_key via MD5")
         
+        self.breaker = create_breaker('autotrade')
+        self.limiter = create_limiter('autotrade')
+        
     def _generate_auth_key(self) -> str:
         """
         Генерация auth_key по формуле: MD5(login + MD5(password) + SALT)
@@ -76,37 +92,9 @@ class AutotradeClient:
         logger.info(f"Searching Autotrade for article: {article}, strict={strict}, cross={cross}, replace={replace}")
         
         try:
-            # Формируем параметры запроса
-            params = {
-                "q": article,
-                "strict": 1 if strict else 0,  # Точный поиск по артикулу
-                "page": 1,
-                "limit": limit,
-                "cross": 1 if cross else 0,
-                "replace": 1 if replace else 0,
-                "discount": 1,
-                "related": 1,
-                "component": 1,
-                "with_stocks_and_prices": 1 if with_stocks_and_prices else 0,
-                "with_delivery": 1 if with_delivery else 0,
-                "check_transit": 0
-            }
-            
-            # Формируем JSON запрос
-            request_data = {
-                "auth_key": self.auth_key,
-                "method": "getItemsByQuery",
-                "params": params
-            }
-            
-            # Важно: добавляем префикс "data=" согласно документации
-            payload = {
-                "data": json.dumps(request_data, ensure_ascii=False)
-            }
-            
-            headers = {
-                'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8'
-            }
+            payload, headers = self._build_request(
+                article, with_stocks_and_prices, with_delivery, cross, replace, strict, limit
+            )
             
             logger.info(f"Sending request to Autotrade API: {self.api_url}")
             
@@ -117,72 +105,7 @@ class AutotradeClient:
                 timeout=10
             )
             
-            logger.info(f"Autotrade API response status: {response.status_code}")
-            
-            if response.status_code != 200:
-                logger.error(f"Autotrade API error: status {response.status_code}, body: {response.text[:500]}")
-                return []
-            
-            result = response.json()
-            
-            # Проверяем код ответа
-            if result.get('code') != 0:
-                logger.error(f"Autotrade API error: code {result.get('code')}, message: {result.get('message')}")
-                return []
-            
-            # Парсим результаты
-            items = result.get('items', [])
-            logger.info(f"Autotrade returned {len(items)} items")
-            
-            # Нормализуем артикул для сравнения (убираем пробелы, дефисы, переводим в верхний регистр)
-            search_article_normalized = article.replace(' ', '').replace('-', '').upper()
-            
-            # Преобразуем в единый формат
-            parts = []
-            for item in items:
-                item_article = item.get('article', '')
-                item_article_normalized = item_article.replace(' ', '').replace('-', '').upper()
-                
-                # Легкая фильтрация: пропускаем только явно неподходящие артикулы
-                # Проверяем что есть хоть какое-то пересечение (аналоги и кроссы могут сильно отличаться)
-                # Минимальная длина общей части - 4 символа
-                
-                # Простая проверка: если совсем разные артикулы (нет общей части >= 4 символов)
-                has_match = False
-                
-                # Проверка 1: Прямое вхождение
-                if search_article_normalized in item_article_normalized or item_article_normalized in search_article_normalized:
-                    has_match = True
-                
-                # Проверка 2: Поиск общей подстроки длиной >= 4 символа
-                if not has_match and len(search_article_normalized) >= 4 and len(item_article_normalized) >= 4:
-                    for i in range(len(search_article_normalized) - 3):
-                        substr = search_article_normalized[i:i+4]
-                        if substr in item_article_normalized:
-                            has_match = True
-                            break
-                
-                if not has_match:
-                    logger.debug(f"Skipping unrelated item: {item_article} (searching for {article})")
-                    continue
-                
-                # Получаем информацию о складах (stocks, не stocks_and_prices!)
-                stocks_info = item.get('stocks', {})
-                
-                # Если есть информация о складах, создаем записи для каждого склада
-                if with_stocks_and_prices and stocks_info:
-                    for stock_id, stock in stocks_info.items():
-                        part = self._format_part(item, stock)
-                        if part:
-                            parts.append(part)
-                else:
-                    # Если нет информации о складах, создаем базовую запись
-                    part = self._format_part(item, None)
-                    if part:
-                        parts.append(part)
-            
-            logger.info(f"Formatted {len(parts)} parts from Autotrade (after filtering)")
-            return parts
+            return offers_to_dicts(self._parse_response(response, article, with_stocks_and_prices))
             
         except requests.exceptions.Timeout:
             logger.error(f"Autotrade API timeout for article: {article}")
@@ -194,7 +117,171 @@ class AutotradeClient:
             logger.error(f"Unexpected error in Autotrade search: {e}", exc_info=True)
             return []
     
-    def _format_part(self, item: Dict, stock: Optional[Dict]) -> Optional[Dict]:
+    async def search_by_article_async(
+        self,
+        article: str,
+        with_stocks_and_prices: bool = True,
+        with_delivery: bool = True,
+        cross: bool = True,
+        replace: bool = False,
+        strict: bool = False,
+        limit: int = 100
+    ) -> List[Dict]:
+        """
+        Асинхронный поиск по артикулу через общий пул соединений
+        
+        Параметры и результат такие же, как у search_by_article
+        
+        Raises:
+            SupplierError: таймаут, сетевая ошибка или ответ 429/5xx
+            CircuitOpenError: после серии сбоев запросы временно не отправляются
+            LimiterRejectedError: превышен лимит одновременных запросов к поставщику
+        """
+        return await self.limiter.call(lambda: self.breaker.call(lambda: self._search_by_article_async(
+            article, with_stocks_and_prices, with_delivery, cross, replace, strict, limit
+        )))
+    
+    async def _search_by_article_async(
+        self,
+        article: str,
+        with_stocks_and_prices: bool,
+        with_delivery: bool,
+        cross: bool,
+        replace: bool,
+        strict: bool,
+        limit: int
+    ) -> List[Dict]:
+        logger.info(f"Searching Autotrade (async) for article: {article}, strict={strict}, cross={cross}, replace={replace}")
+        
+        try:
+            payload, headers = self._build_request(
+                article, with_stocks_and_prices, with_delivery, cross, replace, strict, limit
+            )
+            
+            response = await get_http_client().post(
+                self.api_url,
+                data=payload,
+                headers=headers,
+                timeout=10
+            )
+            
+            if response.status_code == 429 or response.status_code >= 500:
+                raise SupplierError('autotrade', f"API returned status {response.status_code}", response.status_code)
+            
+            return self._parse_response(response, article, with_stocks_and_prices)
+            
+        except SupplierError:
+            raise
+        except httpx.TimeoutException as e:
+            logger.error(f"Autotrade API timeout for article: {article}")
+            raise SupplierTimeoutError('autotrade', f"timeout for article {article}") from e
+        except httpx.HTTPError as e:
+            logger.error(f"Autotrade API request error: {e}")
+            raise SupplierError('autotrade', f"request error: {e}") from e
+        except Exception as e:
+            logger.error(f"Unexpected error in Autotrade search: {e}", exc_info=True)
+            return []
+    
+    def _build_request(
+        self,
+        article: str,
+        with_stocks_and_prices: bool,
+        with_delivery: bool,
+        cross: bool,
+        replace: bool,
+        strict: bool,
+        limit: int
+    ) -> Tuple[Dict, Dict]:
+        """
+        Формирует тело запроса getItemsByQuery и заголовки
+        """
+        # Формируем параметры запроса
+        params = {
+            "q": article,
+            "strict": 1 if strict else 0,  # Точный поиск по артикулу
+            "page": 1,
+            "limit": limit,
+            "cross": 1 if cross else 0,
+            "replace": 1 if replace else 0,
+            "discount": 1,
+            "related": 1,
+            "component": 1,
+            "with_stocks_and_prices": 1 if with_stocks_and_prices else 0,
+            "with_delivery": 1 if with_delivery else 0,
+            "check_transit": 0
+        }
+        
+        # Формируем JSON запрос
+        request_data = {
+            "auth_key": self.auth_key,
+            "method": "getItemsByQuery",
+            "params": params
+        }
+        
+        # Важно: добавляем префикс "data=" согласно документации
+        payload = {
+            "data": json.dumps(request_data, ensure_ascii=False)
+        }
+        
+        headers = {
+            'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8'
+        }
+        
+        return payload, headers
+    
+    def _parse_response(self, response, article: str, with_stocks_and_prices: bool) -> List[Dict]:
+        """
+        Разбор ответа getItemsByQuery (response от requests или httpx)
+        """
+        logger.info(f"Autotrade API response status: {response.status_code}")
+        
+        if response.status_code != 200:
+            logger.error(f"Autotrade API error: status {response.status_code}, body: {response.text[:500]}")
+            return []
+        
+        result = response.json()
+        
+        # Проверяем код ответа
+        if result.get('code') != 0:
+            logger.error(f"Autotrade API error: code {result.get('code')}, message: {result.get('message')}")
+            return []
+        
+        # Парсим результаты
+        items = result.get('items', [])
+        logger.info(f"Autotrade returned {len(items)} items")
+        
+        # Легкая фильтрация: пропускаем только явно неподходящие артикулы.
+        # Аналоги и кроссы могут сильно отличаться - достаточно общей части от 4 символов
+        matcher = ArticleMatcher(article, n=4, normalize=_normalize_article)
+        
+        # Преобразуем в единый формат
+        parts = []
+        for item in items:
+            item_article = item.get('article', '')
+            
+            if not matcher.is_related(item_article):
+                logger.debug(f"Skipping unrelated item: {item_article} (searching for {article})")
+                continue
+            
+            # Получаем информацию о складах (stocks, не stocks_and_prices!)
+            stocks_info = item.get('stocks', {})
+            
+            # Если есть информация о складах, создаем записи для каждого склада
+            if with_stocks_and_prices and stocks_info:
+                for stock_id, stock in stocks_info.items():
+                    part = self._format_part(item, stock)
+                    if part:
+                        parts.append(part)
+            else:
+                # Если нет информации о складах, создаем базовую запись
+                part = self._format_part(item, None)
+                if part:
+                    parts.append(part)
+        
+        logger.info(f"Formatted {len(parts)} parts from Autotrade (after filtering)")
+        return parts
+    
+    def _format_part(self, item: Dict, stock: Optional[Dict]) -> Optional[Offer]:
         """
         Форматирование данных запчасти в единый формат
         
@@ -244,18 +331,18 @@ class AutotradeClient:
             # "В наличии" ТОЛЬКО для Тюмени с delivery ≤ 1
             in_stock = quantity > 0 and is_tyumen and delivery_days <= 1
             
-            return {
-                'article': article,
-                'brand': brand,
-                'name': name,
-                'price': price,
-                'quantity': quantity,
-                'warehouse': warehouse,
-                'delivery_days': delivery_days,
-                'in_stock': in_stock,
-                'provider': 'autotrade',
-                'availability': 'В наличии' if in_stock else 'Под заказ'
-            }
+            return Offer(
+                article=article,
+                brand=brand,
+                name=name,
+                price=price,
+                quantity=quantity,
+                warehouse=warehouse,
+                delivery_days=delivery_days,
+                in_stock=in_stock,
+                provider='autotrade',
+                availability='В наличии' if in_stock else 'Под заказ'
+            )
             
         except Exception as e:
             logger.error(f"Error formatting part from Autotrade: {e}")
@@ -0,0 +1,237 @@
+"""
+Бенчмарк разбора ответов Autostels: ElementTree (конверт + вложенный документ + findtext) / lxml за один проход
+
+Сравнивает с исходной реализацией (копия ниже) на ответах SearchOfferStep2 с сотнями строк
+и проверяет, что предложения совпадают.
+Запуск: python bench_autostels_parser.py [--sizes 100,300,1000] [--repeat 20]
+"""
+
+import argparse
+import logging
+import random
+import time
+import xml.etree.ElementTree as ET
+from typing import Dict, List
+from xml.sax.saxutils import escape
+
+from offer import Offer
+from autostels_client import AutostelsClient
+
+logger = logging.getLogger(__name__)
+
+
+# Исходная реализация (до lxml) - для сравнения
+def legacy_parse_step1_response(xml_text: str) -> List[Dict]:
+    """Парсит ответ Step1 и возвращает список брендов"""
+    try:
+        root = ET.fromstring(xml_text)
+
+        # Находим результат (вложенный XML в виде строки)
+        ns = {'s': 'http://schemas.xmlsoap.org/soap/envelope/',
+              't': 'http://tempuri.org/'}
+
+        result_elem = root.find('.//t:SearchOfferStep1Result', ns)
+        if result_elem is None or not result_elem.text:
+            logger.info("No result element found")
+            return []
+
+        # Парсим вложенный XML
+        inner_root = ET.fromstring(result_elem.text)
+
+        brands = []
+        for row in inner_root.findall('.//row'):
+            product_id = row.findtext('ProductID', '')
+            producer_name = row.findtext('ProducerName', '')
+
+            if product_id and producer_name:
+                brands.append({
+                    'product_id': product_id,
+                    'producer_name': producer_name,
+                    'stocks_only': row.findtext('StocksOnly', '0')
+                })
+
+        logger.info(f"Found {len(brands)} brands for article")
+        return brands
+
+    except Exception as e:
+        logger.error(f"Error parsing step1 response: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return []
+
+
+def legacy_parse_step2_response(xml_text: str) -> List[Dict]:
+    """Парсит ответ Step2 и возвращает список предложений"""
+    try:
+        root = ET.fromstring(xml_text)
+
+        ns = {'s': 'http://schemas.xmlsoap.org/soap/envelope/',
+              't': 'http://tempuri.org/'}
+
+        result_elem = root.find('.//t:SearchOfferStep2Result', ns)
+        if result_elem is None or not result_elem.text:
+            logger.info("No result element found in step2")
+            return []
+
+        # Парсим вложенный XML
+        inner_root = ET.fromstring(result_elem.text)
+
+        offers = []
+        for row in inner_root.findall('.//row'):
+            try:
+                offer = Offer(
+                    article=row.findtext('CodeAsIs', ''),
+                    brand=row.findtext('ManufacturerName', ''),
+                    name=row.findtext('ProductName', ''),
+                    price=float(row.findtext('Price', '0')),
+                    quantity=int(row.findtext('Quantity', '0')),
+                    delivery_days=int(row.findtext('PeriodMin', '0')),
+                    delivery_days_max=int(row.findtext('PeriodMax', '0')),
+                    warehouse=row.findtext('OfferName', 'Autostels'),
+                    is_cross=int(row.findtext('IsCross', '0')) == 1,
+                    in_stock=int(row.findtext('IsAvailability', '0')) == 1,
+                    provider='autostels'
+                )
+
+                offers.append(offer)
+
+            except Exception as e:
+                logger.warning(f"Error parsing row element: {str(e)}")
+                continue
+
+        logger.info(f"Parsed {len(offers)} offers from step2")
+        return offers
+
+    except Exception as e:
+        logger.error(f"Error parsing step2 response: {str(e)}")
+        return []
+
+
+def legacy_parse_joint_response(xml_text: str) -> List[Dict]:
+    """Парсит ответ SearchOfferJoint"""
+    try:
+        root = ET.fromstring(xml_text)
+
+        ns = {'s': 'http://schemas.xmlsoap.org/soap/envelope/',
+              't': 'http://tempuri.org/'}
+
+        result_elem = root.find('.//t:SearchOfferJointResult', ns)
+        if result_elem is None or not result_elem.text:
+            logger.info("No result element found in SearchJoint")
+            return []
+
+        # Парсим вложенный XML
+        inner_root = ET.fromstring(result_elem.text)
+
+        offers = []
+        for row in inner_root.findall('.//row'):
+            try:
+                offer = Offer(
+                    article=row.findtext('CodeAsIs', ''),
+                    brand=row.findtext('ManufacturerName', ''),
+                    name=row.findtext('ProductName', ''),
+                    price=float(row.findtext('Price', '0')),
+                    quantity=int(row.findtext('Quantity', '0')),
+                    delivery_days=int(row.findtext('PeriodMin', '0')),
+                    delivery_days_max=int(row.findtext('PeriodMax', '0')),
+                    warehouse=row.findtext('OfferName', 'Autostels'),
+                    is_cross=int(row.findtext('IsCross', '0')) == 1,
+                    in_stock=int(row.findtext('IsAvailability', '0')) == 1,
+                    provider='autostels'
+                )
+
+                offers.append(offer)
+
+            except Exception as e:
+                logger.warning(f"Error parsing row element: {str(e)}")
+                continue
+
+        logger.info(f"Parsed {len(offers)} offers from SearchJoint")
+        return offers
+
+    except Exception as e:
+        logger.error(f"Error parsing joint response: {str(e)}")
+        return []
+
+
+BRANDS = ['HYUNDAI', 'KIA', 'MOBIS', 'SAT', 'CTR', 'MANDO', 'PARTS-MALL', 'KAYABA']
+OFFER_NAMES = ['Склад Тюмень', 'Склад Екатеринбург (1-2 дня)', 'Партнер Москва', 'Склад поставщика Челябинск']
+
+
+def soap_response(method: str, rows: List[str]) -> bytes:
+    """SOAP ответ Autostels: вложенный документ передается строкой внутри <method>Result"""
+    document = '<?xml version="1.0" encoding="utf-8"?><root><rows>' + ''.join(rows) + '</rows></root>'
+    return (
+        '<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"><s:Body>'
+        f'<{method}Response xmlns="http://tempuri.org/"><{method}Result>{escape(document)}</{method}Result>'
+        f'</{method}Response></s:Body></s:Envelope>'
+    ).encode('utf-8')
+
+
+def generate_step2(rows_count: int, seed: int = 1) -> bytes:
+    """Ответ SearchOfferStep2 с rows_count строками (поля как в ответах сервиса)"""
+    rnd = random.Random(seed)
+    rows = []
+    for index in range(rows_count):
+        period_min = rnd.choice([0, 1, 2, 5, 14])
+        rows.append(
+            f"<row><ProductID>{rnd.randint(10 ** 6, 10 ** 7)}</ProductID><CodeAsIs>{rnd.choice(['', 'ST-'])}"
+            f"54630{index % 50:02d}-1PA1A</CodeAsIs><ManufacturerName>{rnd.choice(BRANDS)}</ManufacturerName>"
+            f"<ProductName>Стойка стабилизатора передняя</ProductName><Price>{rnd.randint(100, 9000)}.{rnd.randint(0, 99)}</Price>"
+            f"<Quantity>{rnd.randint(0, 40)}</Quantity><PeriodMin>{period_min}</PeriodMin>"
+            f"<PeriodMax>{period_min + rnd.randint(0, 3)}</PeriodMax><OfferName>{rnd.choice(OFFER_NAMES)}</OfferName>"
+            f"<IsCross>{rnd.randint(0, 1)}</IsCross><IsAvailability>{rnd.randint(0, 1)}</IsAvailability>"
+            f"<Currency>RUB</Currency><DeliveryProbability>{rnd.randint(50, 100)}</DeliveryProbability></row>"
+        )
+    return soap_response('SearchOfferStep2', rows)
+
+
+def generate_step1(brands_count: int) -> bytes:
+    rows = [
+        f"<row><ProductID>{index}</ProductID><ProducerName>{BRANDS[index % len(BRANDS)]}</ProducerName>"
+        f"<StocksOnly>{index % 2}</StocksOnly></row>"
+        for index in range(brands_count)
+    ]
+    return soap_response('SearchOfferStep1', rows)
+
+
+def best_ms(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк разбора ответов Autostels")
+    parser.add_argument('--sizes', default='100,300,1000', help="Количество строк в ответе Step2 через запятую")
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    client = AutostelsClient()
+
+    step1 = generate_step1(12)
+    assert client._parse_step1_response(step1) == legacy_parse_step1_response(step1.decode('utf-8'))
+
+    for size in [int(value) for value in args.sizes.split(',')]:
+        content = generate_step2(size, seed=size)
+        joint = content.replace(b'SearchOfferStep2', b'SearchOfferJoint')
+
+        # Исходная реализация получала response.text - декодирование входит в ее время
+        expected = [offer.to_dict() for offer in legacy_parse_step2_response(content.decode('utf-8'))]
+        assert [offer.to_dict() for offer in client._parse_step2_response(content)] == expected, f"Step2 mismatch: {size}"
+        assert [offer.to_dict() for offer in client._parse_joint_response(joint)] == expected, f"Joint mismatch: {size}"
+
+        legacy_ms = best_ms(lambda: legacy_parse_step2_response(content.decode('utf-8')), args.repeat)
+        new_ms = best_ms(lambda: client._parse_step2_response(content), args.repeat)
+        print(
+            f"{size:>5} rows, {len(content) / 1024:6.0f} KB   "
+            f"ElementTree {legacy_ms:7.2f} ms   lxml {new_ms:7.2f} ms   x{legacy_ms / new_ms:.1f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+Бенчмарк CacheManager: SQLite-хранилище и LRU в памяти против прежнего кэша в JSON-файлах
+
+Прежняя реализация (файл на ключ, json с indent=2, mtime не используется - время в теле файла)
+встроена ниже для сравнения. Проверяет, что обе реализации возвращают одинаковые данные.
+Запуск: python bench_cache_manager.py [--entries 2000] [--reads 5000]
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from cache_manager import CacheManager
+
+
+class LegacyFileCache:
+    """Прежний CacheManager: JSON-файл на ключ в cache_dir"""
+
+    def __init__(self, cache_dir: str, ttl: int = 3600):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(exist_ok=True)
+        self.ttl = ttl
+
+    def _path(self, vin, category, parts_type):
+        key = hashlib.md5(f"{vin}_{category}_{parts_type}".encode()).hexdigest()
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, vin, category, parts_type="oem"):
+        cache_file = self._path(vin, category, parts_type)
+        if not cache_file.exists():
+            return None
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if time.time() - cached['cached_at'] > self.ttl:
+            cache_file.unlink()
+            return None
+        return cached['data']
+
+    def set(self, vin, category, data, parts_type="oem"):
+        with open(self._path(vin, category, parts_type), 'w', encoding='utf-8') as f:
+            json.dump({'cached_at': time.time(), 'vin': vin, 'category': category,
+                       'parts_type': parts_type, 'data': data}, f, ensure_ascii=False, indent=2)
+
+    def clear_expired(self):
+        cleared = 0
+        for cache_file in self.cache_dir.glob("*.json"):
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if time.time() - cached['cached_at'] > self.ttl:
+                cache_file.unlink()
+                cleared += 1
+        return cleared
+
+
+def generate_parts(rnd: random.Random) -> list:
+    """Ответ PartsAPI для VIN и категории: десятки позиций с текстовыми полями"""
+    return [
+        {
+            'oem': f"{rnd.randint(10000, 99999)}-{rnd.choice(['1PA1A', '2H000', '3K100'])}",
+            'name': rnd.choice(['Фильтр масляный', 'Колодки тормозные', 'Стойка стабилизатора']),
+            'brand': rnd.choice(['HYUNDAI', 'KIA', 'MOBIS']),
+            'group': 'Подвеска',
+            'quantity': rnd.randint(1, 4),
+        }
+        for _ in range(rnd.randint(10, 60))
+    ]
+
+
+def run(cache, keys, payloads, reads, rnd) -> dict:
+    started = time.perf_counter()
+    for (vin, category), data in zip(keys, payloads):
+        cache.set(vin, category, data)
+    write_s = time.perf_counter() - started
+
+    sample = [rnd.choice(keys) for _ in range(reads)]
+    started = time.perf_counter()
+    for vin, category in sample:
+        cache.get(vin, category)
+    read_s = time.perf_counter() - started
+
+    cache.ttl = 0
+    time.sleep(0.01)
+    started = time.perf_counter()
+    cleared = cache.clear_expired()
+    sweep_s = time.perf_counter() - started
+    assert cleared == len(keys), cleared
+
+    return {'write': write_s, 'read': read_s, 'sweep': sweep_s}
+
+
+def directory_size(path: Path) -> int:
+    return sum(item.stat().st_size for item in path.iterdir() if item.is_file())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк хранилища CacheManager")
+    parser.add_argument('--entries', type=int, default=2000)
+    parser.add_argument('--reads', type=int, default=5000)
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    keys = [(f"KMHD{index:013d}", rnd.choice(['engine', 'brakes', 'suspension'])) for index in range(args.entries)]
+    keys = list(dict.fromkeys(keys))
+    payloads = [generate_parts(rnd) for _ in keys]
+
+    with tempfile.TemporaryDirectory() as legacy_dir, tempfile.TemporaryDirectory() as sqlite_dir:
+        legacy = LegacyFileCache(legacy_dir)
+        current = CacheManager(cache_dir=sqlite_dir, memory_entries=0)
+
+        # Одинаковые данные из обеих реализаций
+        for (vin, category), data in list(zip(keys, payloads))[:50]:
+            legacy.set(vin, category, data)
+            current.set(vin, category, data)
+            assert legacy.get(vin, category) == current.get(vin, category) == data
+        current.clear_all()
+        for cache_file in Path(legacy_dir).glob("*.json"):
+            cache_file.unlink()
+
+        results = {}
+        for name, cache in (('files', legacy), ('sqlite', current)):
+            results[name] = run(cache, keys, payloads, args.reads, random.Random(2))
+
+        # Повторные чтения в пределах уровня в памяти (все ключи помещаются в него)
+        with tempfile.TemporaryDirectory() as tiered_dir:
+            tiered = CacheManager(cache_dir=tiered_dir, memory_entries=len(keys), memory_bytes=1 << 30)
+            results['memory'] = run(tiered, keys, payloads, args.reads, random.Random(2))
+            memory_stats = tiered.stats()
+            tiered.close()
+
+        # Размер на диске после повторной записи
+        for (vin, category), data in zip(keys, payloads):
+            legacy.set(vin, category, data)
+            current.set(vin, category, data)
+        current._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        sizes = {'files': directory_size(Path(legacy_dir)), 'sqlite': directory_size(Path(sqlite_dir))}
+        current.close()
+
+    print(f"{len(keys)} записей, {args.reads} чтений")
+    for name, timings in results.items():
+        disk = f"   disk {sizes[name] / 1024:8.0f} KB" if name in sizes else ''
+        print(
+            f"  {name:>6}: set {timings['write'] * 1000:8.1f} ms   get {timings['read'] * 1000:8.1f} ms   "
+            f"clear_expired {timings['sweep'] * 1000:8.1f} ms{disk}"
+        )
+    for stage in ('write', 'read', 'sweep'):
+        print(
+            f"  {stage}: sqlite x{results['files'][stage] / results['sqlite'][stage]:.1f}   "
+            f"memory x{results['files'][stage] / results['memory'][stage]:.1f}"
+        )
+    print(f"  memory tier: {memory_stats['memory']}")
+
+
+if __name__ == '__main__':
+    main()
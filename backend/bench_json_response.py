@@ -0,0 +1,123 @@
+"""
+Бенчмарк api_response: время сериализации и размер ответа поиска по артикулу
+
+Сравнивает стандартный JSONResponse (json.dumps) с FastJSONResponse (orjson) и компактным форматом,
+размер - без сжатия, gzip и brotli (если установлен). Проверяет, что orjson дает те же байты,
+а компактный формат декодируется обратно без потерь.
+Запуск: python bench_json_response.py [--sizes 30,200,1000] [--repeat 50]
+"""
+
+import argparse
+import gzip
+import json
+import random
+import time
+
+from starlette.responses import JSONResponse
+
+import api_response
+from api_response import FastJSONResponse, compact_encode, compact_decode, dumps
+
+BRANDS = ['HYUNDAI', 'KIA', 'MOBIS', 'Sat', 'BOSCH', 'MANDO', 'PARTS-MALL']
+NAMES = [
+    'Фильтр масляный', 'Колодки тормозные передние', 'Диск тормозной вентилируемый',
+    'Амортизатор передний правый газовый', 'Стойка стабилизатора передняя', 'Фильтр салонный угольный'
+]
+WAREHOUSES = [
+    ('rossko', 'Rossko', 'Тюмень, ул. Дружбы 22'), ('rossko', 'Rossko', 'Екатеринбург, центральный склад'),
+    ('autotrade', 'Autotrade', 'Тюмень'), ('autotrade', 'Autotrade', 'Москва (Подольск)'),
+    ('berg', 'Berg', 'BERG Тюмень'), ('berg', 'Berg', 'BERG Новосибирск партнерский'),
+    ('autostels', 'Autostels', 'Склад поставщика (Челябинск)'),
+]
+
+
+def generate_results(count: int, seed: int = 1) -> dict:
+    """Ответ /api/search/article с count позициями (поля и тексты как у реальных поставщиков)"""
+    rnd = random.Random(seed)
+    results = []
+    for index in range(count):
+        provider, supplier, warehouse = rnd.choice(WAREHOUSES)
+        quantity = rnd.randint(0, 40)
+        delivery_days = rnd.randint(0, 14)
+        results.append({
+            'article': f"{rnd.choice(['', 'ST-', 'HY-'])}5463{index % 97:02d}-1PA1A",
+            'brand': rnd.choice(BRANDS),
+            'name': rnd.choice(NAMES),
+            'price': round(rnd.uniform(300, 25000) * 1.15, 2),
+            'quantity': quantity,
+            'delivery_days': delivery_days,
+            'warehouse': warehouse,
+            'in_stock': quantity > 0,
+            'is_cross': rnd.random() < 0.6,
+            'availability': f"В наличии: {quantity} шт." if quantity else 'Под заказ',
+            'supplier': supplier,
+            'provider': provider,
+            'is_original': rnd.random() < 0.2,
+            'is_requested': rnd.random() < 0.3,
+            'has_prefix': rnd.random() < 0.3,
+        })
+    return {
+        'status': 'success',
+        'query': '54630-1PA1A',
+        'results': results,
+        'count': count,
+        'partial': False,
+        'pending_suppliers': [],
+        'session_id': 'Jx2tH3q0s9V6yqRk1bZf8w',
+    }
+
+
+def best_ms(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def compressed_sizes(body: bytes) -> str:
+    sizes = f"gzip {len(gzip.compress(body, compresslevel=api_response.GZIP_LEVEL)):>7}"
+    if api_response.brotli is not None:
+        sizes += f"   br {len(api_response.brotli.compress(body, quality=api_response.BROTLI_QUALITY)):>7}"
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк сериализации и сжатия ответов API")
+    parser.add_argument('--sizes', default='30,200,1000', help="Количество позиций в выдаче через запятую")
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"orjson: {'да' if api_response.orjson else 'нет'}, brotli: {'да' if api_response.brotli else 'нет'}")
+    standard = JSONResponse(None)
+    fast = FastJSONResponse(None)
+
+    for size in [int(value) for value in args.sizes.split(',')]:
+        payload = generate_results(size)
+
+        standard_body = standard.render(payload)
+        fast_body = fast.render(payload)
+        assert fast_body == standard_body, f"Serialization mismatch: {size} results"
+
+        compact = compact_encode(payload)
+        compact_body = dumps(compact)
+        decoded = compact_decode(json.loads(compact_body))
+        assert decoded == payload, f"Compact round trip mismatch: {size} results"
+
+        standard_ms = best_ms(lambda: standard.render(payload), args.repeat)
+        fast_ms = best_ms(lambda: fast.render(payload), args.repeat)
+        compact_ms = best_ms(lambda: dumps(compact_encode(payload)), args.repeat)
+        gzip_ms = best_ms(lambda: gzip.compress(fast_body, compresslevel=api_response.GZIP_LEVEL), args.repeat)
+
+        print(f"\n{size} позиций")
+        print(
+            f"  encode: json {standard_ms:6.2f} ms   orjson {fast_ms:6.2f} ms (x{standard_ms / fast_ms:.1f})   "
+            f"compact {compact_ms:6.2f} ms   gzip {gzip_ms:6.2f} ms"
+        )
+        print(f"  bytes:  json    {len(standard_body):>7}   {compressed_sizes(standard_body)}")
+        print(f"          compact {len(compact_body):>7}   {compressed_sizes(compact_body)}")
+
+
+if __name__ == '__main__':
+    main()
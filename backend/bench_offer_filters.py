@@ -0,0 +1,446 @@
+"""
+Бенчмарк offer_filters: фильтрация и дедупликация 5-10 тыс. предложений
+
+Сравнивает с исходной реализацией (копия ниже) и проверяет, что результаты совпадают.
+Отдельно сравнивает дедупликацию через dict и через колонки NumPy на выдаче популярного артикула
+и выбор первой страницы выдачи (top-K через кучу) с полной сортировкой.
+Запуск: python bench_offer_filters.py [--sizes 5000,10000] [--repeat 10] [--limit 30]
+"""
+
+import argparse
+import copy
+import random
+import time
+from typing import Optional
+
+import offer_filters
+from article_utils import normalize_article
+from offer_filters import filter_relevant_results, deduplicate_and_prioritize, rank_offers, top_offers
+
+
+# Исходная реализация (до offer_filters) - для сравнения
+def legacy_filter_relevant_results(parts: list, search_article: str) -> list:
+    """
+    Фильтрует результаты, оставляя только релевантные:
+    - ВСЕ аналоги которые вернули API поставщиков
+    - НЕ показывает комплектующие (сальники, кольца и т.д.)
+    - Убирает позиции с нулевой ценой или количеством
+    
+    Примечание: API поставщиков сами возвращают релевантные аналоги для запрошенного артикула,
+    поэтому мы не фильтруем по точному совпадению номера - показываем все что вернули API.
+    """
+    if not parts:
+        return []
+    
+    filtered = []
+    
+    for part in parts:
+        part_name = part.get('name', '').strip()
+        provider = part.get('provider', '')
+        
+        # Пропускаем позиции с нулевой ценой
+        if part.get('price', 0) <= 0:
+            continue
+        
+        # Для Rossko не проверяем quantity (они всегда возвращают 0, но товар есть под заказ)
+        # Для остальных проверяем quantity
+        if provider != 'rossko' and part.get('quantity', 0) <= 0:
+            continue
+        
+        # Пропускаем позиции БЕЗ названия (только артикул)
+        if not part_name or len(part_name) < 3:
+            continue
+        
+        # Пропускаем позиции с кракозябрами (неправильная кодировка)
+        # Если в названии больше 30% русских "Р" или "С" подряд - это кракозябры
+        if len(part_name) > 5:
+            char_counts = {'Р': 0, 'С': 0}
+            for char in part_name:
+                if char in char_counts:
+                    char_counts[char] += 1
+            # Если больше 40% символов - это Р или С, скорее всего кракозябры
+            total_rs = char_counts['Р'] + char_counts['С']
+            if total_rs / len(part_name) > 0.4:
+                continue
+        
+        # Фильтруем комплектующие, инструменты и наборы по ключевым словам в названии
+        part_name_lower = part_name.lower()
+        is_unwanted = any(keyword in part_name_lower for keyword in [
+            # Комплектующие
+            'сальник', 'кольцо', 'резинов', 'хомут', 'тефлон', 
+            'ремкомплект', 'ремонтный комплект', 'заглушка', 'втулк',
+            'пыльник', 'чехол', 'манжет', 'уплотнител',
+            # Инструменты и наборы
+            'инструмент', 'ключ', 'ключей', 'набор', 'комплект ключей',
+            'bausatz', 'tool', 'wrench', 'монтаж', 'демонтаж'
+        ])
+        
+        if is_unwanted:
+            continue
+        
+        # Все остальное - показываем (API сами вернули релевантные аналоги)
+        filtered.append(part)
+    
+    return filtered
+
+
+def legacy_deduplicate_and_prioritize(parts: list, search_article: str = "", availability_filter=None, sort_by=None) -> list:
+    """
+    Объединяет результаты от разных поставщиков:
+    - Для одинаковых артикулов оставляет 2 позиции: самую дешевую + самую быструю
+    - Если одна позиция и дешевая и быстрая - оставляем 1
+    - Разные артикулы - показываем все
+    - Приоритет: оригинал → запрошенный артикул → аналоги
+    """
+    if not parts:
+        return []
+    
+    # Если фильтр по складам - не дедуплицируем по складу, показываем все варианты
+    if availability_filter == 'in_stock_tyumen':
+        # Группируем по артикулу + бренд + склад (чтобы показать все склады)
+        grouped = {}
+        for part in parts:
+            key = f"{part['article']}_{part['brand']}_{part.get('warehouse', 'unknown')}".upper()
+            
+            if key not in grouped:
+                grouped[key] = part
+            else:
+                # Если тот же склад - берем дешевле
+                existing = grouped[key]
+                if part['price'] < existing['price']:
+                    grouped[key] = part
+        
+        result = list(grouped.values())
+    else:
+        # Дедупликация: для каждого уникального артикула оставляем ОДНУ лучшую позицию
+        # Лучшая = самая дешевая, при равной цене - самая быстрая
+        grouped = {}
+        
+        for part in parts:
+            # Нормализуем артикул для группировки (игнорируем бренд - один артикул от любого поставщика)
+            article_normalized = normalize_article(part['article'])
+            
+            if article_normalized not in grouped:
+                # Первая позиция для этого артикула
+                grouped[article_normalized] = part
+            else:
+                # Сравниваем с существующей позицией
+                existing = grouped[article_normalized]
+                
+                # Выбираем лучшую по критериям:
+                # 1. Самая дешевая
+                # 2. При равной цене - самая быстрая доставка
+                # 3. При равной цене и доставке - с большим количеством
+                
+                if part['price'] < existing['price']:
+                    # Дешевле - заменяем
+                    grouped[article_normalized] = part
+                elif part['price'] == existing['price']:
+                    # Цена равна - сравниваем по доставке
+                    if part['delivery_days'] < existing['delivery_days']:
+                        grouped[article_normalized] = part
+                    elif part['delivery_days'] == existing['delivery_days']:
+                        # И цена и доставка равны - берем с большим количеством
+                        if part.get('quantity', 0) > existing.get('quantity', 0):
+                            grouped[article_normalized] = part
+        
+        result = list(grouped.values())
+    
+    # Применяем фильтр по наличию если нужно
+    if availability_filter == 'in_stock_tyumen':
+        # "В наличии" = ТОЛЬКО реальная Тюмень с быстрой доставкой (0-1 день)
+        tyumen_results = []
+        
+        for p in result:
+            warehouse = p.get('warehouse', '').upper()
+            provider = p.get('provider', '')
+            delivery_days = p.get('delivery_days', 999)
+            
+            # Проверяем склад Тюмени по названию и быстрой доставке:
+            # Autotrade: "Тюмень (Дружбы)" + delivery <= 1 + in_stock=True
+            # Autostels, Berg, Rossko: содержит "ТЮМЕНЬ" в названии + delivery <= 1
+            
+            # Для Autotrade используем флаг in_stock (он правильно настроен)
+            if provider == 'autotrade':
+                if p.get('in_stock', False):
+                    tyumen_results.append(p)
+            # Для остальных проверяем название склада + быстрая доставка
+            else:
+                # Реальная Тюмень должна содержать слово "ТЮМЕНЬ" или "TYUMEN"
+                # НЕ просто код "TYM-STC-" (это могут быть любые склады)
+                has_tyumen_in_name = any(marker in warehouse for marker in ['ТЮМЕНЬ', 'ТЮМЕН', 'TYUMEN'])
+                
+                # И доставка должна быть быстрой (0-1 день)
+                if has_tyumen_in_name and delivery_days <= 1:
+                    tyumen_results.append(p)
+        
+        result = tyumen_results
+        
+        # ВАЖНО: После фильтрации применяем дедупликацию
+        # Оставляем максимум 2 позиции на артикул: дешевая + быстрая
+        grouped_after_filter = {}
+        for part in result:
+            article_normalized = normalize_article(part['article'])
+            brand = part.get('brand', 'UNKNOWN').upper()
+            key = f"{article_normalized}_{brand}"
+            
+            if key not in grouped_after_filter:
+                grouped_after_filter[key] = {
+                    'cheapest': part,
+                    'fastest': part
+                }
+            else:
+                # Обновляем самую дешевую
+                if part['price'] < grouped_after_filter[key]['cheapest']['price']:
+                    grouped_after_filter[key]['cheapest'] = part
+                
+                # Обновляем самую быструю
+                if part['delivery_days'] < grouped_after_filter[key]['fastest']['delivery_days']:
+                    grouped_after_filter[key]['fastest'] = part
+        
+        # Собираем результат
+        result = []
+        for data in grouped_after_filter.values():
+            result.append(data['cheapest'])
+            # Добавляем fastest только если это другая позиция
+            if data['cheapest'] != data['fastest']:
+                cheapest = data['cheapest']
+                fastest = data['fastest']
+                if (cheapest.get('provider') != fastest.get('provider') or
+                    cheapest.get('warehouse') != fastest.get('warehouse') or
+                    cheapest.get('price') != fastest.get('price')):
+                    result.append(fastest)
+    
+    elif availability_filter == 'on_order':
+        # "Под заказ" = не в наличии или доставка > 1 дня
+        result = [p for p in result if not p.get('in_stock', False) or p.get('delivery_days', 999) > 1]
+    
+    # Добавляем флаги для frontend
+    search_normalized = normalize_article(search_article) if search_article else ""
+    search_original = search_article.upper().replace('-', '').replace(' ', '') if search_article else ""
+    
+    # Убираем префиксы из поискового запроса
+    search_without_prefix = search_normalized
+    for prefix in ['ST', 'EX', 'HAZ', 'HNQ', 'PSG', 'AGS', 'SL', 'R', 'SR']:
+        if search_normalized.startswith(prefix):
+            search_without_prefix = search_normalized[len(prefix):]
+            break
+    
+    for part in result:
+        part_article = part.get('article', '')
+        part_normalized = normalize_article(part_article)
+        part_clean = part_article.upper().replace('-', '').replace(' ', '')
+        
+        # Проверяем наличие префикса у детали (ST-, EX-, HAZ- и т.д.)
+        common_prefixes = ['ST', 'EX', 'HAZ', 'HNQ', 'PSG', 'AGS', 'SL', 'HY', 'R', 'SR']
+        part_has_prefix = any(part_normalized.startswith(prefix) for prefix in common_prefixes)
+        
+        # Помечаем оригинальный артикул:
+        # 1) Артикул БЕЗ префикса (57710-25510)
+        # 2) ИЛИ API явно сказал что это не аналог (is_cross=false)
+        part['is_original'] = (not part_has_prefix) or (not part.get('is_cross', False))
+        
+        # Помечаем запрошенный артикул (точное совпадение с запросом)
+        part['is_requested'] = (part_normalized == search_normalized) or (part_clean == search_original)
+    
+    # Приоритизация результатов
+    def get_priority(part):
+        part_article = part.get('article', '')
+        part_clean = part_article.upper().replace('-', '').replace(' ', '').replace('/', '')
+        
+        # Проверяем наличие префиксов (ST-, EX-, HAZ-, и т.д.)
+        common_prefixes = ['ST', 'EX', 'HAZ', 'HNQ', 'PSG', 'AGS', 'SL', 'HY', 'R', 'SR']
+        has_prefix = any(part_clean.startswith(prefix) for prefix in common_prefixes)
+        
+        # Проверяем был ли запрошен артикул с префиксом
+        search_has_prefix = any(search_normalized.startswith(prefix) for prefix in common_prefixes)
+        
+        # ВСЕГДА: Оригинал БЕЗ префикса имеет наивысший приоритет
+        # (например 57710-25510 идет перед ST-5771025510)
+        if not has_prefix:
+            # Оригинальный OEM номер без префикса
+            if part.get('is_requested', False):
+                return 0  # Запрошенный оригинал (например, искали "57710-25510")
+            else:
+                return 1  # Другой оригинал без префикса
+        
+        # Артикулы С префиксом (ST-, EX-, и т.д.)
+        else:
+            if part.get('is_requested', False):
+                return 2  # Запрошенный артикул с префиксом (например, искали "ST-5771025510")
+            else:
+                return 3  # Другие артикулы с префиксом (аналоги)
+    
+    # Сортировка результатов
+    if sort_by == 'price_asc':
+        # Сортировка по цене (возрастание)
+        result.sort(key=lambda x: (x.get('price', 999999), x.get('delivery_days', 999)))
+    elif sort_by == 'price_desc':
+        # Сортировка по цене (убывание)
+        result.sort(key=lambda x: (-x.get('price', 0), x.get('delivery_days', 999)))
+    elif sort_by == 'delivery_asc':
+        # Быстрая доставка: СТРОГО по скорости доставки, потом по цене
+        # Оригинал НЕ имеет приоритета, только помечается звездочкой
+        result.sort(key=lambda x: (x.get('delivery_days', 999), x.get('price', 999999)))
+    else:
+        # По умолчанию: оригинал первым (приоритет), потом по доставке и цене
+        result.sort(key=lambda x: (get_priority(x), x.get('delivery_days', 999), x.get('price', 999999)))
+    
+    return result
+
+
+NAMES = [
+    'Фильтр масляный', 'Колодки тормозные передние', 'Сальник коленвала', 'Диск тормозной',
+    'Кольцо уплотнительное', 'Набор ключей', 'РСРСРСРСРС', 'Амортизатор', 'ab',
+    'Ремкомплект суппорта', 'Brake pad', 'Втулка стабилизатора', 'Стойка амортизатора передняя'
+]
+PREFIXES = ['', '', '', 'ST-', 'EX-', 'HAZ', 'R', 'SR-', 'HY-', 'AGS']
+WAREHOUSES = ['Тюмень (Дружбы)', 'ТЮМЕНЬ центральный', 'TYM-STC-1', 'Москва', 'Екатеринбург']
+PROVIDERS = ['rossko', 'autotrade', 'berg', 'autostels']
+
+
+def generate_offers(count: int, seed: int = 1, articles_count: Optional[int] = None, prefixes=PREFIXES):
+    """
+    Синтетические предложения, похожие на ответы поставщиков (артикулы с префиксами и повторами)
+
+    Args:
+        articles_count: Сколько разных артикулов (по умолчанию count / 8)
+        prefixes: Префиксы аналогов, добавляемые к артикулам
+    """
+    rnd = random.Random(seed)
+    articles = [
+        f"{rnd.randint(10000, 99999)}-{rnd.choice(['1PA1A', '25510', '0K', 'A/B'])}"
+        for _ in range(articles_count or count // 8)
+    ]
+    offers = []
+    for _ in range(count):
+        offers.append({
+            'article': rnd.choice(prefixes) + rnd.choice(articles),
+            'brand': rnd.choice(['HYUNDAI', 'KIA', 'Sat', 'bosch']),
+            'name': rnd.choice(NAMES),
+            'price': rnd.choice([0, rnd.randint(100, 9000), 500]),
+            'delivery_days': rnd.randint(0, 5),
+            'quantity': rnd.randint(0, 4),
+            'provider': rnd.choice(PROVIDERS),
+            'warehouse': rnd.choice(WAREHOUSES),
+            'in_stock': rnd.random() < 0.5,
+            'is_cross': rnd.random() < 0.5,
+        })
+    return offers, articles[0]
+
+
+def run_pipeline(filter_fn, dedupe_fn, offers, article, availability_filter, sort_by):
+    relevant = filter_fn(copy.deepcopy(offers), article)
+    return dedupe_fn(relevant, article, availability_filter, sort_by)
+
+
+def bench(filter_fn, dedupe_fn, offers, article, availability_filter, repeat: int) -> float:
+    """Лучшее время (мс) фильтра и дедупликации; копирование входных данных не учитывается"""
+    best = float('inf')
+    for _ in range(repeat):
+        parts = copy.deepcopy(offers)
+        started = time.perf_counter()
+        dedupe_fn(filter_fn(parts, article), article, availability_filter, None)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def bench_dedupe(offers, article, availability_filter, repeat: int, columnar: bool) -> float:
+    """Лучшее время (мс) одной дедупликации отфильтрованных предложений через dict или колонки"""
+    threshold = offer_filters.COLUMNAR_THRESHOLD
+    offer_filters.COLUMNAR_THRESHOLD = 0 if columnar else float('inf')
+    try:
+        return bench(lambda parts, _: parts, deduplicate_and_prioritize, offers, article, availability_filter, repeat)
+    finally:
+        offer_filters.COLUMNAR_THRESHOLD = threshold
+
+
+def bench_first_page(result, sort_key, limit: int, repeat: int, top_k: bool) -> float:
+    """Лучшее время (мс) первой страницы выдачи: top-K через кучу или полная сортировка и срез"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        if top_k:
+            top_offers(result, sort_key, limit)
+        else:
+            sorted(result, key=sort_key)[:limit]
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк фильтрации и дедупликации предложений")
+    parser.add_argument('--sizes', default='5000,10000', help="Количество предложений через запятую")
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--limit', type=int, default=30, help="Размер первой страницы выдачи")
+    args = parser.parse_args()
+
+    sizes = [int(value) for value in args.sizes.split(',')]
+    for size in sizes:
+        offers, article = generate_offers(size)
+        for availability_filter in (None, 'in_stock_tyumen', 'on_order'):
+            # Результаты должны совпадать с исходной реализацией
+            for sort_by in (None, 'price_asc', 'price_desc', 'delivery_asc'):
+                expected = run_pipeline(
+                    legacy_filter_relevant_results, legacy_deduplicate_and_prioritize,
+                    offers, article, availability_filter, sort_by
+                )
+                actual = run_pipeline(
+                    filter_relevant_results, deduplicate_and_prioritize,
+                    offers, article, availability_filter, sort_by
+                )
+                assert actual == expected, f"Result mismatch: {size} offers, {availability_filter}, {sort_by}"
+
+            legacy_ms = bench(
+                legacy_filter_relevant_results, legacy_deduplicate_and_prioritize,
+                offers, article, availability_filter, args.repeat
+            )
+            new_ms = bench(filter_relevant_results, deduplicate_and_prioritize, offers, article, availability_filter, args.repeat)
+            print(
+                f"{size:>6} offers, filter={availability_filter or 'all':<16} "
+                f"legacy {legacy_ms:7.2f} ms   offer_filters {new_ms:7.2f} ms   x{legacy_ms / new_ms:.1f}"
+            )
+
+    # Популярный артикул: тысячи строк (по строке на склад) на десятки кроссов
+    print("\nДедупликация популярного артикула (без фильтра релевантности): dict / колонки NumPy")
+    for size in sorted(set(sizes) | {1000, 2000}):
+        offers, article = generate_offers(size, articles_count=max(size // 100, 1), prefixes=['', 'ST-'])
+        for availability_filter in (None, 'on_order'):
+            for sort_by in (None, 'price_asc'):
+                expected = run_pipeline(
+                    lambda parts, _: parts, legacy_deduplicate_and_prioritize,
+                    offers, article, availability_filter, sort_by
+                )
+                actual = run_pipeline(
+                    lambda parts, _: parts, deduplicate_and_prioritize,
+                    offers, article, availability_filter, sort_by
+                )
+                assert actual == expected, f"Result mismatch: {size} offers, {availability_filter}, {sort_by}"
+
+            dict_ms = bench_dedupe(offers, article, availability_filter, args.repeat, columnar=False)
+            columnar_ms = bench_dedupe(offers, article, availability_filter, args.repeat, columnar=True)
+            print(
+                f"{size:>6} offers, filter={availability_filter or 'all':<16} "
+                f"dict {dict_ms:7.2f} ms   columnar {columnar_ms:7.2f} ms   x{dict_ms / columnar_ms:.1f}"
+            )
+
+    # Первая страница: выдача по разным артикулам (без группировки в несколько строк).
+    # Колоночный путь сортирует сам через lexsort, поэтому здесь сравнивается dict-путь
+    print(f"\nПервая страница выдачи (limit={args.limit}, dict-путь): полная сортировка / top-K")
+    offer_filters.COLUMNAR_THRESHOLD = float('inf')
+    for size in sizes:
+        offers, article = generate_offers(size, articles_count=size)
+        for sort_by in (None, 'price_asc', 'delivery_asc'):
+            result, sort_key = rank_offers(copy.deepcopy(offers), article, None, sort_by)
+            expected = deduplicate_and_prioritize(copy.deepcopy(offers), article, None, sort_by)[:args.limit]
+            assert top_offers(result, sort_key, args.limit) == expected, f"Page mismatch: {size} offers, {sort_by}"
+
+            sort_ms = bench_first_page(result, sort_key, args.limit, args.repeat, top_k=False)
+            top_ms = bench_first_page(result, sort_key, args.limit, args.repeat, top_k=True)
+            print(
+                f"{len(result):>6} results, sort={sort_by or 'default':<14} "
+                f"sort {sort_ms:7.2f} ms   top-K {top_ms:7.2f} ms   x{sort_ms / top_ms:.1f}"
+            )
+
+if __name__ == '__main__':
+    main()
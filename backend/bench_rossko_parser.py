@@ -0,0 +1,292 @@
+"""
+Бенчмарк разбора ответа Rossko GetSearch: xmltodict + группировка складов / потоковый lxml.iterparse
+
+Сравнивает с исходной реализацией (копия ниже) и проверяет, что предложения совпадают.
+Запуск: python bench_rossko_parser.py [--sizes 50,300,1000] [--crosses 10] [--repeat 5]
+"""
+
+import argparse
+import os
+import random
+import time
+from typing import Dict, List
+
+import xmltodict
+
+os.environ.setdefault('ROSSKO_API_KEY1', 'bench')
+os.environ.setdefault('ROSSKO_API_KEY2', 'bench')
+
+from offer import Offer
+from rossko_client import RosskoClient
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+# Исходная реализация (до потокового разбора) - для сравнения
+def legacy_parse_search_response(xml_data: dict) -> List[Dict]:
+    """
+    Парсинг XML ответа от Rossko API v2.1
+    Сохраняет полную информацию о всех складах для каждой запчасти
+    """
+    try:
+        parts = []
+
+        # Навигация по структуре SOAP ответа согласно WSDL
+        soap_body = xml_data.get('SOAP-ENV:Envelope', {}).get('SOAP-ENV:Body', {})
+        search_response = soap_body.get('ns1:GetSearchResponse', {})
+        search_result = search_response.get('ns1:SearchResult', {})
+
+        # Проверяем успешность запроса
+        success = search_result.get('ns1:success', 'false')
+        if success != 'true':
+            message = search_result.get('ns1:message', 'Unknown error')
+            logger.warning(f"Rossko API returned error: {message}")
+            return []
+
+        # Получаем список запчастей
+        parts_list = search_result.get('ns1:PartsList', {})
+        if parts_list and 'ns1:Part' in parts_list:
+            part_items = parts_list['ns1:Part']
+
+            # Может быть один элемент или список
+            if isinstance(part_items, dict):
+                part_items = [part_items]
+
+            for item in part_items:
+                # Обрабатываем основную запчасть (оригинал)
+                legacy_process_part_item(item, parts, is_cross=False)
+
+                # Обрабатываем аналоги (crosses)
+                crosses = item.get('ns1:crosses', {})
+                if crosses and 'ns1:Part' in crosses:
+                    cross_items = crosses['ns1:Part']
+                    if isinstance(cross_items, dict):
+                        cross_items = [cross_items]
+
+                    for cross_item in cross_items:
+                        legacy_process_part_item(cross_item, parts, is_cross=True)
+
+        return parts
+
+    except Exception as e:
+        logger.error(f"Error parsing Rossko response: {str(e)}")
+        import traceback
+        logger.error(traceback.format_exc())
+        return []
+
+def legacy_process_part_item(item: dict, parts: List[Dict], is_cross: bool = False):
+    """
+    Обработка одной запчасти (оригинал или аналог) и всех её складов
+    """
+    # Получаем информацию о всех складах
+    stocks = item.get('ns1:stocks', {})
+    stocks_list = []
+
+    if stocks and 'ns1:stock' in stocks:
+        stock_items = stocks['ns1:stock']
+        if isinstance(stock_items, dict):
+            stock_items = [stock_items]
+
+        for stock in stock_items:
+            stock_info = {
+                'id': stock.get('ns1:id', ''),
+                'price': float(stock.get('ns1:price', 0)),
+                'count': int(stock.get('ns1:count', 0)),
+                'delivery': int(stock.get('ns1:delivery', 0)),
+                'description': stock.get('ns1:description', ''),
+                'extra': int(stock.get('ns1:extra', 0))
+            }
+            stocks_list.append(stock_info)
+
+    # Для каждого склада создаём отдельную запись
+    for stock in stocks_list:
+        part = Offer(
+            article=item.get('ns1:partnumber', ''),
+            name=item.get('ns1:name', ''),
+            brand=item.get('ns1:brand', ''),
+            guid=item.get('ns1:guid', ''),
+            price=stock['price'],
+            delivery_days=stock['delivery'],
+            count=stock['count'],
+            stock_id=stock['id'],
+            stock_description=stock['description'],
+            is_extra=stock['extra'] == 1,
+            is_cross=is_cross,  # Метка аналога
+            availability='В наличии' if stock['delivery'] == 0 else 'Под заказ',
+            supplier='ROSSKO',
+            provider='rossko'
+        )
+        parts.append(part)
+
+def legacy_deduplicate_parts(parts: List[Dict], original_article: str = '') -> List[Dict]:
+    """
+    Убирает дубликаты и суммирует количество для складов Тюмени
+    Приоритет: точное совпадение с запросом > оригинал > аналог, в наличии > под заказ, дешевле > дороже
+    """
+    # Группируем по артикулу + бренд. Предложения только что разобраны из ответа -
+    # копировать их не нужно, склады группы для суммирования храним отдельно
+    groups = {}
+    all_stocks = {}
+
+    for part in parts:
+        key = f"{part['brand']}_{part['article']}"
+
+        if key not in groups:
+            groups[key] = part
+            all_stocks[key] = [part]
+        else:
+            existing = groups[key]
+
+            # Добавляем в список складов для суммирования
+            all_stocks[key].append(part)
+
+            # Выбираем лучшее предложение по критериям:
+            # 0. Приоритет - точное совпадение артикула с запросом
+            # 1. Оригинал (is_cross=False)
+            # 2. В наличии (delivery_days = 0)
+            # 3. Меньше срок доставки
+            # 4. Дешевле цена
+
+            is_better = False
+
+            # Нормализуем артикулы для сравнения
+            part_article_norm = part['article'].upper().replace('-', '').replace(' ', '')
+            existing_article_norm = existing['article'].upper().replace('-', '').replace(' ', '')
+
+            # Точное совпадение с запросом всегда лучше
+            part_is_exact = (part_article_norm == original_article)
+            existing_is_exact = (existing_article_norm == original_article)
+
+            if part_is_exact and not existing_is_exact:
+                is_better = True
+            elif existing_is_exact and not part_is_exact:
+                is_better = False
+            # Оригинал всегда лучше аналога
+            elif not part['is_cross'] and existing['is_cross']:
+                is_better = True
+            elif part['is_cross'] and not existing['is_cross']:
+                is_better = False
+            else:
+                # Оба оригиналы или оба аналоги - сравниваем по другим критериям
+                if part['delivery_days'] == 0 and existing['delivery_days'] > 0:
+                    is_better = True
+                elif part['delivery_days'] == 0 and existing['delivery_days'] == 0:
+                    # Оба в наличии - выбираем дешевле
+                    if part['price'] < existing['price']:
+                        is_better = True
+                elif existing['delivery_days'] > 0 and part['delivery_days'] > 0:
+                    # Оба под заказ - сравниваем сроки и цену
+                    if part['delivery_days'] < existing['delivery_days']:
+                        is_better = True
+                    elif part['delivery_days'] == existing['delivery_days'] and part['price'] < existing['price']:
+                        is_better = True
+
+            if is_better:
+                groups[key] = part
+
+    # Суммируем количество для складов Тюмени (в наличии)
+    result = []
+    for key, part in groups.items():
+        # Подсчитываем общее количество на складах Тюмени
+        total_count = 0
+        tyumen_stocks = []
+
+        for stock in all_stocks[key]:
+            if stock['delivery_days'] == 0:  # В наличии
+                total_count += stock['count']
+                tyumen_stocks.append(stock['stock_description'])
+
+        # Обновляем count и availability
+        if total_count > 0:
+            part['count'] = total_count
+            part['availability'] = f'В наличии: {total_count} шт.'
+
+        result.append(part)
+
+    return result
+
+
+def legacy_parse(content: bytes, original_article: str) -> List[Dict]:
+    parts = legacy_parse_search_response(xmltodict.parse(content))
+    return legacy_deduplicate_parts(parts, original_article) if parts else []
+
+
+BRANDS = ['HYUNDAI', 'KIA', 'MOBIS', 'SAT', 'CTR', 'MANDO', 'PARTS-MALL', 'KAYABA']
+DESCRIPTIONS = ['Тюмень', 'Партнерский склад', 'Екатеринбург', 'Омск', 'Москва']
+
+
+def _stocks_xml(rnd: random.Random) -> str:
+    stocks = []
+    for index in range(rnd.randint(1, 6)):
+        stocks.append(
+            f"<ns1:stock><ns1:id>{index}</ns1:id><ns1:price>{rnd.choice([500, rnd.randint(100, 9000)])}.{rnd.randint(0, 99)}"
+            f"</ns1:price><ns1:count>{rnd.randint(0, 20)}</ns1:count><ns1:delivery>{rnd.choice([0, 0, 1, 2, 5])}"
+            f"</ns1:delivery><ns1:description>{rnd.choice(DESCRIPTIONS)}</ns1:description>"
+            f"<ns1:extra>{rnd.randint(0, 1)}</ns1:extra></ns1:stock>"
+        )
+    return f"<ns1:stocks>{''.join(stocks)}</ns1:stocks>"
+
+
+def _part_xml(rnd: random.Random, articles: List[str], crosses: str = '') -> str:
+    return (
+        f"<ns1:Part><ns1:guid>{rnd.randint(1, 10 ** 9)}</ns1:guid><ns1:brand>{rnd.choice(BRANDS)}</ns1:brand>"
+        f"<ns1:partnumber>{rnd.choice(articles)}</ns1:partnumber><ns1:name>Стойка стабилизатора</ns1:name>"
+        f"{_stocks_xml(rnd)}{crosses}</ns1:Part>"
+    )
+
+
+def generate_response(parts_count: int, crosses: int, seed: int = 1) -> bytes:
+    """Ответ GetSearch: parts_count запчастей, у каждой до crosses аналогов (бренд + артикул повторяются)"""
+    rnd = random.Random(seed)
+    articles = ['54630-1PA1A', '546301PA1A'] + [f"ST-{rnd.randint(10000, 99999)}" for _ in range(parts_count)]
+    items = []
+    for _ in range(parts_count):
+        cross_items = ''.join(_part_xml(rnd, articles) for _ in range(rnd.randint(0, crosses)))
+        items.append(_part_xml(rnd, articles, f"<ns1:crosses>{cross_items}</ns1:crosses>" if cross_items else ''))
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<SOAP-ENV:Envelope xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" xmlns:ns1="http://api.rossko.ru/">'
+        '<SOAP-ENV:Body><ns1:GetSearchResponse><ns1:SearchResult><ns1:success>true</ns1:success>'
+        f"<ns1:PartsList>{''.join(items)}</ns1:PartsList></ns1:SearchResult></ns1:GetSearchResponse>"
+        '</SOAP-ENV:Body></SOAP-ENV:Envelope>'
+    ).encode('utf-8')
+
+
+def best_ms(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк разбора ответа Rossko GetSearch")
+    parser.add_argument('--sizes', default='50,300,1000', help="Количество запчастей в ответе через запятую")
+    parser.add_argument('--crosses', type=int, default=10, help="Максимум аналогов у запчасти")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    client = RosskoClient()
+    original_article = '546301PA1A'
+
+    for size in [int(value) for value in args.sizes.split(',')]:
+        content = generate_response(size, args.crosses, seed=size)
+
+        expected = [part.to_dict() for part in legacy_parse(content, original_article)]
+        actual = [part.to_dict() for part in client._parse_search_response(content, original_article)]
+        assert actual == expected, f"Result mismatch: {size} parts"
+
+        legacy_ms = best_ms(lambda: legacy_parse(content, original_article), args.repeat)
+        new_ms = best_ms(lambda: client._parse_search_response(content, original_article), args.repeat)
+        print(
+            f"{size:>5} parts, {len(content) / 1024:8.0f} KB, {len(actual):>5} offers   "
+            f"xmltodict {legacy_ms:8.2f} ms   iterparse {new_ms:8.2f} ms   x{legacy_ms / new_ms:.1f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -3,19 +3,33 @@ Berg API Client
 Клиент для работы с API поставщика Berg.ru
 """
 
+import asyncio
 import requests
+import httpx
 import logging
 from typing import List, Dict, Optional
 import os
 
+from http_pool import get_http_client
+from supplier_errors import SupplierError, SupplierTimeoutError
+from circuit_breaker import create_breaker
+from concurrency_limiter import create_limiter
+from offer import Offer, offers_to_dicts
+
 logger = logging.getLogger(__name__)
 
+# Сколько брендов неоднозначного артикула запрашивается одним вызовом get_stock (items[N][...])
+BRANDS_PER_REQUEST = int(os.environ.get('BERG_BRANDS_PER_REQUEST', 20))
+
 class BergClient:
     """Клиент для работы с API Berg"""
     
     def __init__(self):
         self.api_key = os.getenv('BERG_API_KEY')
         self.base_url = "https://api.berg.ru/v1.0"
+        self.stock_url = f"{self.base_url}/ordering/get_stock.json"
+        self.breaker = create_breaker('berg')
+        self.limiter = create_limiter('berg')
         
         if not self.api_key:
             logger.warning("BERG_API_KEY not found in environment variables")
@@ -46,26 +60,10 @@ class BergClient:
         logger.info(f"Searching Berg for article: {article}, analogs={analogs}, brand={brand_name}")
         
         try:
-            # Формируем параметры запроса
-            params = {
-                "key": self.api_key,
-                "items[0][resource_article]": article,
-                "analogs": 1 if analogs else 0
-            }
-            
-            # Добавляем бренд если указан
-            if brand_name:
-                params["items[0][brand_name]"] = brand_name
-            
-            # Добавляем фильтр по складам если указан
-            if warehouse_types:
-                for idx, wh_type in enumerate(warehouse_types):
-                    params[f"warehouse_types[{idx}]"] = wh_type
-            
             # Отправляем первый запрос
-            url = f"{self.base_url}/ordering/get_stock.json"
+            params = self._build_params(article, brand_name, analogs, warehouse_types)
             response = requests.get(
-                url,
+                self.stock_url,
                 params=params,
                 timeout=10
             )
@@ -78,47 +76,16 @@ class BergClient:
                 logger.error(f"Berg API error: {result.get('error')}")
                 return []
             
-            # Проверяем Status 300 (WARN_ARTICLE_IS_AMBIGUOUS) - нужно указать бренд
-            warnings = result.get('warnings', [])
-            is_ambiguous = any(w.get('code') == 'WARN_ARTICLE_IS_AMBIGUOUS' for w in warnings)
-            
-            all_parts = []
-            
-            if is_ambiguous and not brand_name:
-                # Артикул неоднозначный - делаем запросы для каждого бренда
-                resources = result.get('resources', [])
-                logger.info(f"Article is ambiguous, found {len(resources)} brands")
-                
-                for resource in resources:
-                    brand = resource.get('brand', {})
-                    brand_name_from_resource = brand.get('name')
-                    
-                    if brand_name_from_resource:
-                        # Запрашиваем с конкретным брендом
-                        logger.info(f"Requesting Berg for brand: {brand_name_from_resource}")
-                        brand_parts = self._request_with_brand(article, brand_name_from_resource, analogs, warehouse_types)
-                        all_parts.extend(brand_parts)
+            if self._is_ambiguous(result) and not brand_name:
+                # Артикул неоднозначный - запрашиваем все бренды пачками
+                all_parts = []
+                for brands in self._brand_batches(self._ambiguous_brands(result)):
+                    all_parts.extend(self._request_with_brands(article, brands, analogs, warehouse_types))
             else:
-                # Обычный ответ - парсим сразу
-                resources = result.get('resources', [])
-                logger.info(f"Berg returned {len(resources)} resources")
-                
-                for resource in resources:
-                    offers = resource.get('offers', [])
-                    
-                    if offers:
-                        for offer in offers:
-                            part = self._format_part(resource, offer)
-                            if part:
-                                all_parts.append(part)
-                    else:
-                        # Создаем базовую запись без offer (цена = 0)
-                        part = self._format_part(resource, None)
-                        if part:
-                            all_parts.append(part)
+                all_parts = self._parse_resources(result)
             
             logger.info(f"Formatted {len(all_parts)} parts from Berg")
-            return all_parts
+            return offers_to_dicts(all_parts)
             
         except requests.exceptions.Timeout:
             logger.error(f"Berg API timeout for article: {article}")
@@ -130,43 +97,204 @@ class BergClient:
             logger.error(f"Unexpected error in Berg search: {e}", exc_info=True)
             return []
     
-    def _request_with_brand(self, article: str, brand_name: str, analogs: bool, warehouse_types: Optional[List[int]] = None) -> List[Dict]:
-        """Запрос к Berg API с указанием конкретного бренда"""
+    async def search_by_article_async(
+        self,
+        article: str,
+        brand_name: Optional[str] = None,
+        analogs: bool = True,
+        warehouse_types: Optional[List[int]] = None
+    ) -> List[Dict]:
+        """
+        Асинхронный поиск по артикулу через общий пул соединений
+        
+        Параметры и результат такие же, как у search_by_article
+        
+        Raises:
+            SupplierError: таймаут, сетевая ошибка или HTTP ошибка основного запроса
+            CircuitOpenError: после серии сбоев запросы временно не отправляются
+            LimiterRejectedError: превышен лимит одновременных запросов к поставщику
+        """
+        if not self.api_key:
+            logger.error("Berg API key not configured")
+            return []
+        
+        return await self.limiter.call(lambda: self.breaker.call(lambda: self._search_by_article_async(
+            article, brand_name, analogs, warehouse_types
+        )))
+    
+    async def _search_by_article_async(
+        self,
+        article: str,
+        brand_name: Optional[str],
+        analogs: bool,
+        warehouse_types: Optional[List[int]]
+    ) -> List[Dict]:
+        logger.info(f"Searching Berg (async) for article: {article}, analogs={analogs}, brand={brand_name}")
+        
         try:
-            params = {
-                "key": self.api_key,
-                "items[0][resource_article]": article,
-                "items[0][brand_name]": brand_name,
-                "analogs": 1 if analogs else 0
-            }
-            
-            if warehouse_types:
-                for idx, wh_type in enumerate(warehouse_types):
-                    params[f"warehouse_types[{idx}]"] = wh_type
+            params = self._build_params(article, brand_name, analogs, warehouse_types)
+            response = await get_http_client().get(
+                self.stock_url,
+                params=params,
+                timeout=10
+            )
             
-            url = f"{self.base_url}/ordering/get_stock.json"
-            response = requests.get(url, params=params, timeout=10)
             response.raise_for_status()
             result = response.json()
             
-            parts = []
-            resources = result.get('resources', [])
+            if "error" in result:
+                logger.error(f"Berg API error: {result.get('error')}")
+                return []
+            
+            if self._is_ambiguous(result) and not brand_name:
+                # Пачки брендов запрашиваются параллельно
+                batches = await asyncio.gather(*(
+                    self._request_with_brands_async(article, brands, analogs, warehouse_types)
+                    for brands in self._brand_batches(self._ambiguous_brands(result))
+                ))
+                all_parts = [part for batch in batches for part in batch]
+            else:
+                all_parts = self._parse_resources(result)
+            
+            logger.info(f"Formatted {len(all_parts)} parts from Berg")
+            return all_parts
+            
+        except httpx.TimeoutException as e:
+            logger.error(f"Berg API timeout for article: {article}")
+            raise SupplierTimeoutError('berg', f"timeout for article {article}") from e
+        except httpx.HTTPStatusError as e:
+            logger.error(f"Berg API request error: {e}")
+            raise SupplierError('berg', f"API returned status {e.response.status_code}", e.response.status_code) from e
+        except httpx.HTTPError as e:
+            logger.error(f"Berg API request error: {e}")
+            raise SupplierError('berg', f"request error: {e}") from e
+        except Exception as e:
+            logger.error(f"Unexpected error in Berg search: {e}", exc_info=True)
+            return []
+    
+    def _build_params(
+        self,
+        article: str,
+        brand_name: Optional[str],
+        analogs: bool,
+        warehouse_types: Optional[List[int]] = None
+    ) -> Dict:
+        """Формирует параметры запроса get_stock"""
+        params = {
+            "key": self.api_key,
+            "items[0][resource_article]": article,
+            "analogs": 1 if analogs else 0
+        }
+        
+        # Добавляем бренд если указан
+        if brand_name:
+            params["items[0][brand_name]"] = brand_name
+        
+        self._add_warehouse_types(params, warehouse_types)
+        return params
+    
+    def _build_batch_params(
+        self,
+        article: str,
+        brands: List[str],
+        analogs: bool,
+        warehouse_types: Optional[List[int]] = None
+    ) -> Dict:
+        """Параметры get_stock для одного артикула сразу по нескольким брендам"""
+        params = {
+            "key": self.api_key,
+            "analogs": 1 if analogs else 0
+        }
+        
+        for idx, brand_name in enumerate(brands):
+            params[f"items[{idx}][resource_article]"] = article
+            params[f"items[{idx}][brand_name]"] = brand_name
+        
+        self._add_warehouse_types(params, warehouse_types)
+        return params
+    
+    def _add_warehouse_types(self, params: Dict, warehouse_types: Optional[List[int]]):
+        """Добавляет фильтр по складам, если указан"""
+        if warehouse_types:
+            for idx, wh_type in enumerate(warehouse_types):
+                params[f"warehouse_types[{idx}]"] = wh_type
+    
+    def _is_ambiguous(self, result: Dict) -> bool:
+        """Проверяет Status 300 (WARN_ARTICLE_IS_AMBIGUOUS) - нужно указать бренд"""
+        warnings = result.get('warnings', [])
+        return any(w.get('code') == 'WARN_ARTICLE_IS_AMBIGUOUS' for w in warnings)
+    
+    def _ambiguous_brands(self, result: Dict) -> List[str]:
+        """Список брендов из неоднозначного ответа"""
+        resources = result.get('resources', [])
+        logger.info(f"Article is ambiguous, found {len(resources)} brands")
+        
+        brands = []
+        for resource in resources:
+            brand_name = resource.get('brand', {}).get('name')
+            if brand_name:
+                brands.append(brand_name)
+        return brands
+    
+    def _parse_resources(self, result: Dict, include_empty: bool = True) -> List[Dict]:
+        """
+        Разбор resources из ответа get_stock
+        
+        Args:
+            result: JSON ответ Berg API
+            include_empty: Создавать базовую запись для товара без предложений
+        """
+        resources = result.get('resources', [])
+        logger.info(f"Berg returned {len(resources)} resources")
+        
+        parts = []
+        for resource in resources:
+            offers = resource.get('offers', [])
             
-            for resource in resources:
-                offers = resource.get('offers', [])
-                if offers:
-                    for offer in offers:
-                        part = self._format_part(resource, offer)
-                        if part:
-                            parts.append(part)
+            if offers:
+                for offer in offers:
+                    part = self._format_part(resource, offer)
+                    if part:
+                        parts.append(part)
+            elif include_empty:
+                # Создаем базовую запись без offer (цена = 0)
+                part = self._format_part(resource, None)
+                if part:
+                    parts.append(part)
+        
+        return parts
+    
+    def _brand_batches(self, brands: List[str]) -> List[List[str]]:
+        """Делит бренды на пачки по BRANDS_PER_REQUEST"""
+        return [brands[i:i + BRANDS_PER_REQUEST] for i in range(0, len(brands), BRANDS_PER_REQUEST)]
+    
+    def _request_with_brands(self, article: str, brands: List[str], analogs: bool, warehouse_types: Optional[List[int]] = None) -> List[Dict]:
+        """Один запрос к Berg API по артикулу сразу для нескольких брендов"""
+        try:
+            logger.info(f"Requesting Berg for brands: {', '.join(brands)}")
+            params = self._build_batch_params(article, brands, analogs, warehouse_types)
+            response = requests.get(self.stock_url, params=params, timeout=10)
+            response.raise_for_status()
+            return self._parse_resources(response.json(), include_empty=False)
             
-            return parts
+        except Exception as e:
+            logger.error(f"Error in _request_with_brands for {brands}: {e}")
+            return []
+    
+    async def _request_with_brands_async(self, article: str, brands: List[str], analogs: bool, warehouse_types: Optional[List[int]] = None) -> List[Dict]:
+        """Асинхронный запрос к Berg API по артикулу сразу для нескольких брендов"""
+        try:
+            logger.info(f"Requesting Berg for brands: {', '.join(brands)}")
+            params = self._build_batch_params(article, brands, analogs, warehouse_types)
+            response = await get_http_client().get(self.stock_url, params=params, timeout=10)
+            response.raise_for_status()
+            return self._parse_resources(response.json(), include_empty=False)
             
         except Exception as e:
-            logger.error(f"Error in _request_with_brand for {brand_name}: {e}")
+            logger.error(f"Error in _request_with_brands for {brands}: {e}")
             return []
     
-    def _format_part(self, resource: Dict, offer: Optional[Dict]) -> Optional[Dict]:
+    def _format_part(self, resource: Dict, offer: Optional[Dict]) -> Optional[Offer]:
         """
         Форматирование данных о запчасти в единый формат
         
@@ -175,7 +303,7 @@ class BergClient:
             offer: Данные о предложении (наличие/цена)
             
         Returns:
-            Словарь с данными о запчасти или None
+            Предложение (Offer) или None
         """
         try:
             article = resource.get('article', '')
@@ -240,7 +368,7 @@ class BergClient:
                     'in_stock': False,  # Required for frontend
                 })
             
-            return part_data
+            return Offer(**part_data)
             
         except Exception as e:
             logger.error(f"Error formatting Berg part: {e}")
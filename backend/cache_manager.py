@@ -1,117 +1,290 @@
 import json
+import zlib
+import sqlite3
 import hashlib
+import threading
 import time
-from typing import Optional, Any
+from collections import OrderedDict
+from typing import Optional, Any, Dict, Tuple
 from pathlib import Path
 import logging
 
+from env_utils import env_float
+
 logger = logging.getLogger(__name__)
 
+# Файл базы кэша внутри cache_dir
+CACHE_DB_NAME = "cache.sqlite3"
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS cache (
+        key TEXT PRIMARY KEY,
+        cached_at REAL NOT NULL,
+        value BLOB NOT NULL
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS cache_cached_at ON cache (cached_at)",
+)
+
+
+def _dumps(data: Any) -> bytes:
+    """JSON без пробелов; его длина - оценка размера записи в памяти"""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class MemoryTier:
+    """
+    LRU-кэш в памяти перед SQLite-хранилищем
+
+    - Ограничен числом записей и суммарным размером (длина JSON записи в байтах)
+    - Запись живет столько же, сколько в хранилище: время записи общее
+    - Данные отдаются без копирования: вызывающий код их не изменяет
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Any, int]]" = OrderedDict()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, ttl: float) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[0] > ttl:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, data: Any, size: int, cached_at: float):
+        if self.max_entries <= 0 or size > self.max_bytes:
+            # Запись больше всего уровня остается только в хранилище
+            self.discard(key)
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (cached_at, data, size)
+            self.size_bytes += size
+
+            while len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self.size_bytes -= evicted_size
+                self.evictions += 1
+
+    def discard(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear_expired(self, ttl: float):
+        with self._lock:
+            expired_before = time.time() - ttl
+            for key in [key for key, entry in self._entries.items() if entry[0] < expired_before]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def _remove(self, key: str):
+        self.size_bytes -= self._entries.pop(key)[2]
+
+    def stats(self) -> Dict:
+        return {
+            'entries': len(self._entries),
+            'bytes': self.size_bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
 class CacheManager:
     """
     Менеджер кэширования для API запросов
     Помогает избежать повторных запросов к PartsAPI и снизить нагрузку
+
+    Два уровня:
+    - MemoryTier - LRU в памяти процесса: повторные запросы одного VIN не обращаются к диску
+    - встроенная база SQLite (один файл в cache_dir) с индексом по времени записи:
+      чтение - один запрос по первичному ключу, очистка устаревших записей - один DELETE по индексу
+    Запись идет в оба уровня сразу (write-through), найденное только на диске поднимается в память
     """
-    
-    def __init__(self, cache_dir: str = "/tmp/partsapi_cache", ttl: int = 3600):
+
+    def __init__(
+        self,
+        cache_dir: str = "/tmp/partsapi_cache",
+        ttl: int = 3600,
+        memory_entries: Optional[int] = None,
+        memory_bytes: Optional[int] = None
+    ):
         """
         Args:
             cache_dir: Директория для хранения кэша
             ttl: Время жизни кэша в секундах (по умолчанию 1 час)
+            memory_entries: Максимум записей в памяти (по умолчанию PARTSAPI_CACHE_MEMORY_ENTRIES или 256, 0 - выключено)
+            memory_bytes: Максимальный размер записей в памяти (по умолчанию PARTSAPI_CACHE_MEMORY_BYTES или 16 МБ)
         """
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(exist_ok=True)
         self.ttl = ttl
-        
+
+        if memory_entries is None:
+            memory_entries = int(env_float('PARTSAPI_CACHE_MEMORY_ENTRIES', 256))
+        if memory_bytes is None:
+            memory_bytes = int(env_float('PARTSAPI_CACHE_MEMORY_BYTES', 16 * 1024 * 1024))
+        self.memory = MemoryTier(memory_entries, memory_bytes)
+        self.store_hits = 0
+        self.store_misses = 0
+
+        # Одно соединение на менеджер; синхронные методы клиента могут вызываться из разных потоков
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            str(self.cache_dir / CACHE_DB_NAME),
+            isolation_level=None,
+            check_same_thread=False
+        )
+        # WAL: чтение не блокируется записью (в том числе из других процессов сервера)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SCHEMA:
+            self._db.execute(statement)
+
     def _get_cache_key(self, vin: str, category: str, parts_type: str = "oem") -> str:
         """Генерирует уникальный ключ кэша"""
         data = f"{vin}_{category}_{parts_type}"
         return hashlib.md5(data.encode()).hexdigest()
-    
+
     def get(self, vin: str, category: str, parts_type: str = "oem") -> Optional[Any]:
         """
         Получает данные из кэша
-        
+
         Returns:
             Закэшированные данные или None если кэш устарел или не найден
         """
+        data = self.get_from_memory(vin, category, parts_type)
+        if data is not None:
+            return data
+        return self.get_from_store(vin, category, parts_type)
+
+    def get_from_memory(self, vin: str, category: str, parts_type: str = "oem") -> Optional[Any]:
+        """Данные только из уровня в памяти: без обращения к диску, можно вызывать из event loop"""
+        data = self.memory.get(self._get_cache_key(vin, category, parts_type), self.ttl)
+        if data is not None:
+            logger.info(f"Cache hit for VIN {vin}, category {category}")
+        return data
+
+    def get_from_store(self, vin: str, category: str, parts_type: str = "oem") -> Optional[Any]:
+        """
+        Данные из SQLite (найденное поднимается в память)
+
+        Блокирующий вызов: из асинхронного кода - через asyncio.to_thread
+        """
         cache_key = self._get_cache_key(vin, category, parts_type)
-        cache_file = self.cache_dir / f"{cache_key}.json"
-        
-        if not cache_file.exists():
-            logger.debug(f"Cache miss for VIN {vin}, category {category}")
-            return None
-        
+
         try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cached_data = json.load(f)
-            
-            # Проверяем время жизни кэша
-            cached_time = cached_data.get('cached_at', 0)
-            if time.time() - cached_time > self.ttl:
-                logger.debug(f"Cache expired for VIN {vin}, category {category}")
-                cache_file.unlink()  # Удаляем устаревший кэш
-                return None
-            
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT cached_at, value FROM cache WHERE key = ?", (cache_key,)
+                ).fetchone()
+
+                if row is None:
+                    self.store_misses += 1
+                    logger.debug(f"Cache miss for VIN {vin}, category {category}")
+                    return None
+
+                # Проверяем время жизни кэша
+                cached_time, value = row
+                if time.time() - cached_time > self.ttl:
+                    self.store_misses += 1
+                    logger.debug(f"Cache expired for VIN {vin}, category {category}")
+                    self._db.execute("DELETE FROM cache WHERE key = ?", (cache_key,))  # Удаляем устаревший кэш
+                    return None
+
+                self.store_hits += 1
+
+            raw = zlib.decompress(value)
+            data = json.loads(raw)
+            self.memory.set(cache_key, data, len(raw), cached_time)
+
             logger.info(f"Cache hit for VIN {vin}, category {category}")
-            return cached_data.get('data')
-            
+            return data
+
         except Exception as e:
             logger.error(f"Error reading cache: {e}")
             return None
-    
+
     def set(self, vin: str, category: str, data: Any, parts_type: str = "oem"):
         """Сохраняет данные в кэш"""
         cache_key = self._get_cache_key(vin, category, parts_type)
-        cache_file = self.cache_dir / f"{cache_key}.json"
-        
+
         try:
-            cached_data = {
-                'cached_at': time.time(),
-                'vin': vin,
-                'category': category,
-                'parts_type': parts_type,
-                'data': data
-            }
-            
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(cached_data, f, ensure_ascii=False, indent=2)
-            
+            raw = _dumps(data)
+            cached_at = time.time()
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache (key, cached_at, value) VALUES (?, ?, ?)",
+                    (cache_key, cached_at, zlib.compress(raw))
+                )
+            self.memory.set(cache_key, data, len(raw), cached_at)
+
             logger.info(f"Cached data for VIN {vin}, category {category}")
-            
+
         except Exception as e:
             logger.error(f"Error writing cache: {e}")
-    
+
     def clear_expired(self):
-        """Очищает устаревший кэш"""
-        cleared_count = 0
-        
-        for cache_file in self.cache_dir.glob("*.json"):
-            try:
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    cached_data = json.load(f)
-                
-                cached_time = cached_data.get('cached_at', 0)
-                if time.time() - cached_time > self.ttl:
-                    cache_file.unlink()
-                    cleared_count += 1
-                    
-            except Exception as e:
-                logger.error(f"Error clearing cache file {cache_file}: {e}")
-        
+        """Очищает устаревший кэш (один DELETE по индексу cached_at)"""
+        self.memory.clear_expired(self.ttl)
+        try:
+            with self._lock:
+                cleared_count = self._db.execute(
+                    "DELETE FROM cache WHERE cached_at < ?", (time.time() - self.ttl,)
+                ).rowcount
+        except Exception as e:
+            logger.error(f"Error clearing expired cache: {e}")
+            return 0
+
         logger.info(f"Cleared {cleared_count} expired cache entries")
         return cleared_count
-    
+
     def clear_all(self):
         """Очищает весь кэш"""
-        cleared_count = 0
-        
-        for cache_file in self.cache_dir.glob("*.json"):
-            try:
-                cache_file.unlink()
-                cleared_count += 1
-            except Exception as e:
-                logger.error(f"Error clearing cache file {cache_file}: {e}")
-        
+        self.memory.clear()
+        try:
+            with self._lock:
+                cleared_count = self._db.execute("DELETE FROM cache").rowcount
+        except Exception as e:
+            logger.error(f"Error clearing cache: {e}")
+            return 0
+
         logger.info(f"Cleared all cache ({cleared_count} entries)")
         return cleared_count
+
+    def stats(self) -> Dict:
+        """Статистика уровней кэша"""
+        return {
+            'memory': self.memory.stats(),
+            'store_hits': self.store_hits,
+            'store_misses': self.store_misses,
+        }
+
+    def close(self):
+        """Закрывает соединение с базой кэша"""
+        with self._lock:
+            self._db.close()
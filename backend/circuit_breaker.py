@@ -0,0 +1,155 @@
+"""
+Circuit Breaker
+Быстрый отказ от запросов к недоступному поставщику
+"""
+
+import os
+import time
+import logging
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from supplier_errors import SupplierError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(SupplierError):
+    """Запрос не отправлен: цепь поставщика разомкнута"""
+
+    def __init__(self, supplier: str, retry_in: float):
+        super().__init__(supplier, f"circuit open, retry in {retry_in:.1f}s")
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker одного поставщика
+
+    - closed: запросы идут как обычно; failure_threshold сбоев подряд размыкают цепь
+    - open: запросы не отправляются (CircuitOpenError сразу), пока не пройдет reset_timeout
+    - half_open: пропускается не больше half_open_max_calls пробных запросов; успех замыкает
+      цепь, сбой снова размыкает ее на reset_timeout
+
+    Сбоем считается только SupplierError (таймаут, сетевая ошибка, 429/5xx). Пустой результат
+    и ошибки разбора ответа - это не недоступность поставщика
+    """
+
+    def __init__(
+        self,
+        supplier: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        half_open_max_calls: int = 1
+    ):
+        """
+        Args:
+            supplier: Имя поставщика (для логов и ошибок)
+            failure_threshold: Сколько сбоев подряд размыкают цепь
+            reset_timeout: Через сколько секунд после размыкания пробовать снова
+            half_open_max_calls: Сколько пробных запросов одновременно в состоянии half_open
+        """
+        self.supplier = supplier
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_calls = 0
+
+        self.rejected = 0
+        self.trips = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        """Текущее состояние (open переходит в half_open по истечении reset_timeout)"""
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._trial_calls = 0
+            logger.info(f"Circuit {self.supplier}: half-open, probing supplier")
+        return self._state
+
+    def _acquire(self):
+        """Проверяет, можно ли отправить запрос; иначе CircuitOpenError"""
+        state = self.state
+        if state == CLOSED:
+            return
+        if state == HALF_OPEN and self._trial_calls < self.half_open_max_calls:
+            self._trial_calls += 1
+            return
+
+        self.rejected += 1
+        retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+        raise CircuitOpenError(self.supplier, retry_in)
+
+    def record_success(self):
+        if self._state != CLOSED:
+            logger.info(f"Circuit {self.supplier}: closed, supplier recovered")
+        self._state = CLOSED
+        self._failures = 0
+        self._trial_calls = 0
+
+    def record_failure(self, error: Exception):
+        self.last_error = str(error)
+        self._failures += 1
+
+        if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != OPEN:
+                self.trips += 1
+                logger.warning(
+                    f"Circuit {self.supplier}: open for {self.reset_timeout:.0f}s "
+                    f"after {self._failures} failures ({self.last_error})"
+                )
+            self._state = OPEN
+            self._opened_at = time.monotonic()
+            self._trial_calls = 0
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Выполняет запрос fn() через breaker
+
+        Raises:
+            CircuitOpenError: цепь разомкнута, запрос не отправлялся
+            SupplierError: запрос завершился сбоем (учтен в счетчике)
+        """
+        self._acquire()
+        try:
+            result = await fn()
+        except SupplierError as e:
+            self.record_failure(e)
+            raise
+        except BaseException:
+            # Отмена или ошибка в нашем коде - не повод судить о поставщике,
+            # но пробный вызов надо вернуть, иначе half_open зависнет
+            if self._state == HALF_OPEN:
+                self._trial_calls = max(0, self._trial_calls - 1)
+            raise
+        self.record_success()
+        return result
+
+    def stats(self) -> Dict:
+        """Состояние breaker для health check"""
+        return {
+            'state': self.state,
+            'consecutive_failures': self._failures,
+            'trips': self.trips,
+            'rejected': self.rejected,
+            'last_error': self.last_error,
+        }
+
+
+def create_breaker(supplier: str) -> CircuitBreaker:
+    """Breaker поставщика с настройками из BREAKER_FAILURE_THRESHOLD / BREAKER_RESET_TIMEOUT"""
+    return CircuitBreaker(
+        supplier,
+        failure_threshold=int(os.environ.get('BREAKER_FAILURE_THRESHOLD', 5)),
+        reset_timeout=float(os.environ.get('BREAKER_RESET_TIMEOUT', 30))
+    )
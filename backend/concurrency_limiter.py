@@ -0,0 +1,181 @@
+"""
+Concurrency Limiter
+Адаптивное ограничение числа одновременных запросов к поставщику (AIMD)
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Dict, TypeVar
+
+from supplier_errors import SupplierError
+from circuit_breaker import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class LimiterRejectedError(SupplierError):
+    """Запрос не отправлен: очередь к поставщику переполнена или ожидание слота слишком долгое"""
+
+
+class AdaptiveLimiter:
+    """
+    AIMD лимит одновременных запросов к одному поставщику
+
+    - Пока задержка в норме (не больше latency_tolerance * минимальная задержка по окну),
+      лимит растет аддитивно: примерно +1 за каждые limit успешных ответов
+    - Таймаут или ответ 429/5xx уменьшают лимит в backoff раз. Сбои запросов, отправленных
+      до последнего уменьшения, лимит повторно не уменьшают: одна волна ошибок - одно снижение
+    - Запросы сверх лимита ждут в очереди (не больше max_queue, не дольше queue_timeout),
+      остальные сразу отклоняются LimiterRejectedError
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        backoff: float = 0.5,
+        latency_tolerance: float = 2.0,
+        max_queue: int = 100,
+        queue_timeout: float = 5.0,
+        window: int = 100
+    ):
+        """
+        Args:
+            name: Имя поставщика (для логов и ошибок)
+            initial_limit: Начальный лимит одновременных запросов
+            min_limit: Минимальный лимит
+            max_limit: Максимальный лимит
+            backoff: Множитель лимита при перегрузке поставщика
+            latency_tolerance: Во сколько раз задержка может превышать минимальную и считаться нормальной
+            max_queue: Максимум запросов, ожидающих слота
+            queue_timeout: Сколько секунд запрос может ждать слота
+            window: Размер окна замеров задержки
+        """
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self.limit = float(initial_limit)
+        self.in_flight = 0
+        self._waiters = deque()
+        self._latencies = deque(maxlen=window)
+        self._last_decrease = 0.0
+
+        self.rejected = 0
+        self.decreases = 0
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Выполняет запрос fn() в пределах лимита
+
+        Raises:
+            LimiterRejectedError: очередь переполнена или слот не освободился за queue_timeout
+        """
+        await self._acquire()
+        started = time.monotonic()
+        try:
+            result = await fn()
+        except CircuitOpenError:
+            # Запрос не отправлялся - о нагрузке на поставщика он ничего не говорит
+            raise
+        except SupplierError as e:
+            if e.is_overload:
+                self._on_overload(started)
+            raise
+        else:
+            self._on_success(time.monotonic() - started)
+            return result
+        finally:
+            self._release()
+
+    async def _acquire(self):
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self._reject("queue is full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._reject(f"no free slot after {self.queue_timeout:.1f}s")
+        except asyncio.CancelledError:
+            # Слот мог быть передан нам одновременно с отменой - возвращаем его
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def _reject(self, reason: str):
+        self.rejected += 1
+        raise LimiterRejectedError(self.name, f"request shed: {reason} (limit {int(self.limit)})")
+
+    def _release(self):
+        self.in_flight -= 1
+        self._wake_waiters()
+
+    def _wake_waiters(self):
+        """Передает освободившиеся слоты ожидающим запросам (в порядке очереди)"""
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def _on_success(self, latency: float):
+        self._latencies.append(latency)
+        baseline = min(self._latencies)
+
+        # Растем, только если лимит действительно используется и задержка в норме
+        saturated = self.in_flight >= int(self.limit) or self._waiters
+        if saturated and latency <= baseline * self.latency_tolerance:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._wake_waiters()
+
+    def _on_overload(self, started: float):
+        if started < self._last_decrease:
+            return
+
+        previous = int(self.limit)
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+        self._last_decrease = time.monotonic()
+        self.decreases += 1
+        logger.warning(f"Concurrency limit {self.name}: {previous} -> {int(self.limit)} (supplier overloaded)")
+
+    def stats(self) -> Dict:
+        """Состояние лимитера для health check"""
+        return {
+            'limit': int(self.limit),
+            'in_flight': self.in_flight,
+            'queued': len(self._waiters),
+            'rejected': self.rejected,
+            'decreases': self.decreases,
+        }
+
+
+def create_limiter(supplier: str) -> AdaptiveLimiter:
+    """Лимитер поставщика с настройками из LIMITER_* (LIMITER_MAX_<SUPPLIER> задает потолок отдельно)"""
+    return AdaptiveLimiter(
+        supplier,
+        initial_limit=int(os.environ.get('LIMITER_INITIAL', 8)),
+        min_limit=int(os.environ.get('LIMITER_MIN', 1)),
+        max_limit=int(os.environ.get(f'LIMITER_MAX_{supplier.upper()}', os.environ.get('LIMITER_MAX', 64))),
+        max_queue=int(os.environ.get('LIMITER_MAX_QUEUE', 100)),
+        queue_timeout=float(os.environ.get('LIMITER_QUEUE_TIMEOUT', 5))
+    )
@@ -0,0 +1,271 @@
+"""
+Cross Reference Graph
+Граф эквивалентных артикулов (кроссов), собранный из ответов поставщиков
+"""
+
+import os
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from pymongo import UpdateOne
+
+from article_utils import normalize_article
+
+logger = logging.getLogger(__name__)
+
+# Поставщики, в ответах которых отмечены аналоги, и признак аналога в предложении
+CROSS_SOURCES = {
+    'rossko': lambda part: part.get('is_cross', False),
+    'autostels': lambda part: part.get('is_cross', False),
+    # Berg с analogs=1 возвращает исходный артикул и его аналоги без отдельной метки:
+    # аналог - любое предложение с другим артикулом
+    'berg': lambda part: True,
+}
+
+# Ребро, по которому Autotrade столько раз ничего не нашел (и ни разу не нашел), не используется
+MAX_MISSES_WITHOUT_HITS = 3
+
+
+class CrossEdge:
+    """Связь двух артикулов: кто из поставщиков ее подтвердил и как она работала в Autotrade"""
+
+    __slots__ = ('sources', 'hits', 'misses')
+
+    def __init__(self, sources: Optional[Set[str]] = None, hits: int = 0, misses: int = 0):
+        self.sources = sources or set()
+        self.hits = hits
+        self.misses = misses
+
+    @property
+    def score(self) -> float:
+        """Чем больше поставщиков подтвердили связь и чем чаще она давала результат, тем выше"""
+        return len(self.sources) + 2 * self.hits - self.misses
+
+    @property
+    def usable(self) -> bool:
+        return self.hits > 0 or self.misses < MAX_MISSES_WITHOUT_HITS
+
+
+class CrossReferenceGraph:
+    """
+    Неориентированный граф кроссов: вершины - нормализованные артикулы, ребра - "это аналог"
+
+    - Ребра добавляются из ответов Rossko (is_cross), Autostels (IsCross) и Berg (аналоги)
+    - Результат поиска в Autotrade по кроссу записывается в ребро (hits / misses) и влияет на порядок
+    - Граф хранится в памяти и сохраняется в MongoDB (коллекция article_crosses, документ на ребро);
+      изменения пишутся пачкой через flush_delay секунд после первого изменения
+    """
+
+    def __init__(self, collection=None, flush_delay: Optional[float] = None, max_edges: Optional[int] = None):
+        """
+        Args:
+            collection: Коллекция Motor для хранения ребер (None - только в памяти)
+            flush_delay: Задержка записи изменений в MongoDB (секунды)
+            max_edges: Максимум ребер в памяти; новые ребра сверх лимита не добавляются
+        """
+        self.collection = collection
+        self.flush_delay = flush_delay if flush_delay is not None else float(os.environ.get('CROSS_GRAPH_FLUSH_DELAY', 5))
+        self.max_edges = max_edges or int(os.environ.get('CROSS_GRAPH_MAX_EDGES', 200000))
+
+        self._neighbors: Dict[str, Dict[str, CrossEdge]] = {}
+        # Написание артикула, под которым его видели у поставщика (для запросов к Autotrade)
+        self._spelling: Dict[str, str] = {}
+        self._edges = 0
+
+        # Несохраненные изменения: ребро -> (новые источники, прирост hits, прирост misses)
+        self._dirty: Dict[Tuple[str, str], list] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _edge_id(a: str, b: str) -> Tuple[str, str]:
+        return (a, b) if a < b else (b, a)
+
+    def _edge(self, a: str, b: str, create: bool) -> Optional[CrossEdge]:
+        edge = self._neighbors.get(a, {}).get(b)
+        if edge is None and create and self._edges < self.max_edges:
+            edge = CrossEdge()
+            self._neighbors.setdefault(a, {})[b] = edge
+            self._neighbors.setdefault(b, {})[a] = edge
+            self._edges += 1
+        return edge
+
+    def _mark_dirty(self, a: str, b: str, source: Optional[str] = None, hits: int = 0, misses: int = 0):
+        if self.collection is None:
+            return
+        change = self._dirty.setdefault(self._edge_id(a, b), [set(), 0, 0])
+        if source:
+            change[0].add(source)
+        change[1] += hits
+        change[2] += misses
+        self._schedule_flush()
+
+    def observe(self, article: str, supplier: str, offers: Iterable[Dict]) -> int:
+        """
+        Добавляет кроссы из ответа поставщика на запрос article
+
+        Returns:
+            Количество новых связей
+        """
+        is_cross = CROSS_SOURCES.get(supplier)
+        query_key = normalize_article(article)
+        if is_cross is None or not query_key:
+            return 0
+
+        added = 0
+        seen = set()
+        for part in offers:
+            part_article = part.get('article', '').strip()
+            key = normalize_article(part_article)
+            if not key or key == query_key or key in seen or not is_cross(part):
+                continue
+            seen.add(key)
+
+            edges_before = self._edges
+            edge = self._edge(query_key, key, create=True)
+            if edge is None:
+                # Граф заполнен: артикул без связей не запоминаем, иначе _spelling растет без ограничения
+                continue
+            self._remember_spelling(key, part_article)
+            if supplier not in edge.sources:
+                edge.sources.add(supplier)
+                self._mark_dirty(query_key, key, source=supplier)
+            added += self._edges - edges_before
+
+        self._remember_spelling(query_key, article.strip())
+        return added
+
+    def _remember_spelling(self, key: str, spelling: str):
+        """Запоминает написание только для артикула, у которого есть связи в графе"""
+        if key in self._neighbors:
+            self._spelling.setdefault(key, spelling)
+
+    def record_lookup(self, article: str, cross_article: str, found: bool):
+        """Записывает результат поиска в Autotrade по кроссу cross_article для запроса article"""
+        a, b = normalize_article(article), normalize_article(cross_article)
+        if a == b:
+            return
+
+        # Найденный результат подтверждает связь, даже если она была двухшаговой
+        edge = self._edge(a, b, create=found)
+        if edge is None:
+            return
+
+        if found:
+            self._remember_spelling(a, article.strip())
+            self._remember_spelling(b, cross_article.strip())
+            edge.hits += 1
+            self._mark_dirty(a, b, hits=1)
+        else:
+            edge.misses += 1
+            self._mark_dirty(a, b, misses=1)
+
+    def equivalents(self, article: str, limit: int = 10, proven_only: bool = False) -> List[str]:
+        """
+        Эквивалентные артикулы, лучшие первыми
+
+        Прямые кроссы идут по score; кроссы кроссов (два шага) - с половинным score.
+        Связи, которые многократно не давали результата в Autotrade, пропускаются
+
+        Args:
+            article: Артикул запроса
+            limit: Сколько артикулов вернуть
+            proven_only: Только прямые кроссы, по которым Autotrade уже находил предложения
+        """
+        query_key = normalize_article(article)
+        direct = self._neighbors.get(query_key, {})
+
+        scores: Dict[str, float] = {}
+        for key, edge in direct.items():
+            if edge.usable and (edge.hits > 0 or not proven_only):
+                scores[key] = edge.score
+
+        if not proven_only:
+            for key, edge in direct.items():
+                if not edge.usable:
+                    continue
+                for second_key, second_edge in self._neighbors.get(key, {}).items():
+                    if second_key == query_key or second_key in direct or not second_edge.usable:
+                        continue
+                    score = min(edge.score, second_edge.score) / 2
+                    if score > scores.get(second_key, float('-inf')):
+                        scores[second_key] = score
+
+        # sorted устойчив: при равном score сохраняется порядок появления связей
+        ranked = sorted(scores, key=lambda key: -scores[key])
+        return [self._spelling.get(key, key) for key in ranked[:limit]]
+
+    async def load(self):
+        """Загружает граф из MongoDB (при старте приложения)"""
+        if self.collection is None:
+            return
+        try:
+            async for doc in self.collection.find({}):
+                a, b = doc['a'], doc['b']
+                edge = self._edge(a, b, create=True)
+                if edge is None:
+                    logger.warning(f"Cross graph limit reached ({self.max_edges} edges), rest not loaded")
+                    break
+                edge.sources.update(doc.get('sources', []))
+                edge.hits += doc.get('hits', 0)
+                edge.misses += doc.get('misses', 0)
+                self._remember_spelling(a, doc.get('a_article') or a)
+                self._remember_spelling(b, doc.get('b_article') or b)
+            logger.info(f"Cross graph loaded: {self._edges} edges, {len(self._neighbors)} articles")
+        except Exception as e:
+            logger.error(f"Failed to load cross graph: {str(e)}")
+
+    def _schedule_flush(self):
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+
+        async def delayed_flush():
+            await asyncio.sleep(self.flush_delay)
+            await self.flush()
+
+        self._flush_task = asyncio.ensure_future(delayed_flush())
+
+    async def flush(self):
+        """Записывает накопленные изменения в MongoDB"""
+        if self.collection is None or not self._dirty:
+            return
+
+        dirty, self._dirty = self._dirty, {}
+        now = datetime.utcnow().isoformat()
+        operations = []
+        for (a, b), (sources, hits, misses) in dirty.items():
+            update = {
+                '$set': {
+                    'a': a,
+                    'b': b,
+                    'a_article': self._spelling.get(a, a),
+                    'b_article': self._spelling.get(b, b),
+                    'updated_at': now,
+                },
+            }
+            if sources:
+                update['$addToSet'] = {'sources': {'$each': sorted(sources)}}
+            if hits or misses:
+                update['$inc'] = {'hits': hits, 'misses': misses}
+            operations.append(UpdateOne({'_id': f'{a}|{b}'}, update, upsert=True))
+
+        try:
+            await self.collection.bulk_write(operations, ordered=False)
+            logger.info(f"Cross graph: saved {len(operations)} edges")
+        except Exception as e:
+            logger.error(f"Failed to save cross graph: {str(e)}")
+            # Возвращаем изменения, чтобы записать их при следующем flush
+            for edge_id, (sources, hits, misses) in dirty.items():
+                change = self._dirty.setdefault(edge_id, [set(), 0, 0])
+                change[0].update(sources)
+                change[1] += hits
+                change[2] += misses
+
+    def stats(self) -> Dict:
+        """Размер графа"""
+        return {
+            'articles': len(self._neighbors),
+            'edges': self._edges,
+            'unsaved': len(self._dirty),
+        }
@@ -0,0 +1,18 @@
+"""
+Env Utils
+Чтение числовых настроек из переменных окружения
+"""
+
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def env_float(name: str, default: float) -> float:
+    """Значение переменной окружения name как число; при ошибке в значении - default"""
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        logger.warning(f"Invalid value for {name}, using {default}")
+        return default
@@ -0,0 +1,173 @@
+"""
+Request Hedging
+Дублирование медленных запросов к поставщикам для сокращения хвостовых задержек
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# Поставщики, для которых хеджирование включено (через запятую), например "rossko,autostels"
+HEDGED_SUPPLIERS = {
+    name.strip().lower()
+    for name in os.environ.get('HEDGED_SUPPLIERS', '').split(',')
+    if name.strip()
+}
+
+
+class LatencyTracker:
+    """Скользящее окно последних задержек для оценки перцентилей"""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+
+    def record(self, latency: float):
+        self.samples.append(latency)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Перцентиль q (0..1) по окну или None, если данных нет"""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(q * len(ordered)))
+        return ordered[index]
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+
+class RequestHedger:
+    """
+    Хеджирование запросов к одной операции поставщика
+
+    Если запрос не ответил за наблюдаемый p90, запускается дубликат; берется первый ответ,
+    второй запрос отменяется. Дубликаты ограничены бюджетом: на каждый запрос начисляется
+    max_ratio токена, дубликат тратит один токен. При max_ratio=0.1 дополнительная нагрузка
+    на поставщика не превышает ~10%, даже если он медленный постоянно
+    """
+
+    def __init__(
+        self,
+        name: str,
+        enabled: bool = True,
+        percentile: float = 0.9,
+        max_ratio: float = 0.1,
+        min_samples: int = 20,
+        min_delay: float = 0.05,
+        window: int = 200
+    ):
+        """
+        Args:
+            name: Имя операции для логов (например "rossko.search")
+            enabled: Если False - запросы только измеряются, дубликаты не отправляются
+            percentile: Перцентиль задержки, после которого отправляется дубликат
+            max_ratio: Доля дубликатов от числа запросов (бюджет)
+            min_samples: Сколько замеров нужно, прежде чем начать хеджирование
+            min_delay: Минимальная задержка перед дубликатом (секунды)
+            window: Размер окна замеров
+        """
+        self.name = name
+        self.enabled = enabled
+        self.percentile = percentile
+        self.max_ratio = max_ratio
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.latency = LatencyTracker(window)
+
+        # Бюджет дубликатов копится не больше чем на 10 штук подряд
+        self._max_tokens = 10.0
+        self._tokens = 0.0
+
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        """Через сколько секунд отправлять дубликат (None - не хеджировать)"""
+        if not self.enabled or len(self.latency) < self.min_samples:
+            return None
+        return max(self.min_delay, self.latency.percentile(self.percentile))
+
+    def _take_token(self) -> bool:
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Выполняет запрос fn() с хеджированием
+
+        Args:
+            fn: Фабрика корутины запроса (вызывается повторно для дубликата)
+        """
+        self.calls += 1
+        self._tokens = min(self._max_tokens, self._tokens + self.max_ratio)
+
+        started = time.monotonic()
+        delay = self.hedge_delay()
+        primary = asyncio.ensure_future(fn())
+
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if not done and self._take_token():
+                    return await self._race(primary, fn, started)
+
+            result = await primary
+            self.latency.record(time.monotonic() - started)
+            return result
+        finally:
+            if not primary.done():
+                primary.cancel()
+
+    async def _race(self, primary: asyncio.Future, fn: Callable[[], Awaitable[T]], started: float) -> T:
+        """Отправляет дубликат и возвращает первый успешный ответ"""
+        self.hedges += 1
+        logger.info(f"Hedging {self.name}: no answer after {time.monotonic() - started:.2f}s")
+
+        hedge = asyncio.ensure_future(fn())
+        pending = {primary, hedge}
+
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        self.latency.record(time.monotonic() - started)
+                        return task.result()
+
+            # Оба запроса завершились ошибкой - пробрасываем ошибку основного
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict:
+        """Статистика хеджирования"""
+        p90 = self.latency.percentile(self.percentile)
+        return {
+            'enabled': self.enabled,
+            'calls': self.calls,
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+            'p90_ms': round(p90 * 1000) if p90 is not None else None,
+        }
+
+
+def create_hedger(supplier: str, operation: str) -> RequestHedger:
+    """Хеджер операции поставщика; дубликаты включаются через HEDGED_SUPPLIERS"""
+    return RequestHedger(
+        f"{supplier}.{operation}",
+        enabled=supplier in HEDGED_SUPPLIERS,
+        max_ratio=float(os.environ.get('HEDGE_MAX_RATIO', 0.1))
+    )
@@ -0,0 +1,65 @@
+"""
+HTTP Pool
+Общий пул HTTP-соединений (httpx.AsyncClient) для клиентов поставщиков
+"""
+
+import os
+import logging
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Лимиты пула: keep-alive соединения переиспользуются между поисками,
+# поэтому TLS-рукопожатие происходит один раз на соединение, а не на запрос
+MAX_CONNECTIONS = int(os.environ.get('HTTP_POOL_MAX_CONNECTIONS', 100))
+MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('HTTP_POOL_MAX_KEEPALIVE', 40))
+KEEPALIVE_EXPIRY = float(os.environ.get('HTTP_POOL_KEEPALIVE_EXPIRY', 60))
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Создает AsyncClient с пулом keep-alive соединений"""
+    limits = httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY
+    )
+    # Таймаут по умолчанию; клиенты поставщиков передают свой timeout в каждом запросе
+    timeout = httpx.Timeout(10.0, connect=5.0)
+    return httpx.AsyncClient(limits=limits, timeout=timeout)
+
+
+async def startup_http_client() -> httpx.AsyncClient:
+    """Создает общий клиент при старте приложения"""
+    global _http_client
+    if _http_client is None:
+        _http_client = create_http_client()
+        logger.info(
+            f"HTTP pool started (max_connections={MAX_CONNECTIONS}, "
+            f"keepalive={MAX_KEEPALIVE_CONNECTIONS})"
+        )
+    return _http_client
+
+
+async def shutdown_http_client():
+    """Закрывает общий клиент и все открытые соединения"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+        logger.info("HTTP pool closed")
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Получить общий AsyncClient
+
+    Вне жизненного цикла приложения (скрипты, ручные тесты) клиент создается лениво
+    """
+    global _http_client
+    if _http_client is None:
+        _http_client = create_http_client()
+    return _http_client
@@ -208,6 +208,16 @@ class SearchArticleRequest(BaseModel):
     telegram_id: int
     availability_filter: Optional[str] = None  # 'in_stock_tyumen', 'on_order', None
     sort_by: Optional[str] = None  # 'price_asc', 'price_desc', 'delivery_asc', None
+    limit: Optional[int] = Field(default=None, ge=1)  # Размер страницы, None - вся выдача
+    cursor: Optional[str] = None  # next_cursor из предыдущей страницы
+
+
+class SearchSessionRequest(BaseModel):
+    session_id: Optional[str] = None  # session_id из ответа /search/article (или cursor)
+    availability_filter: Optional[str] = None  # 'in_stock_tyumen', 'on_order', None
+    sort_by: Optional[str] = None  # 'price_asc', 'price_desc', 'delivery_asc', None
+    limit: Optional[int] = Field(default=None, ge=1)  # Размер страницы, None - вся выдача
+    cursor: Optional[str] = None  # next_cursor из предыдущей страницы
 
 
 class SearchVINRequest(BaseModel):
@@ -0,0 +1,120 @@
+"""
+Offer
+Компактная запись предложения поставщика (общая для Rossko, Autotrade, Berg и Autostels)
+"""
+
+import sys
+from operator import attrgetter
+from typing import Any, Dict, Iterator, List
+
+# Все поля предложений поставщиков. Поле, которое поставщик не заполнил, в предложении отсутствует
+OFFER_FIELDS = (
+    # Общие
+    'article', 'brand', 'name', 'price', 'quantity', 'delivery_days', 'delivery_days_max',
+    'warehouse', 'in_stock', 'is_cross', 'availability', 'supplier', 'provider',
+    # Rossko
+    'guid', 'count', 'stock_id', 'stock_description', 'is_extra', 'delivery_display',
+    # Berg
+    'resource_id', 'available_more', 'reliability', 'is_transit', 'warehouse_type', 'multiplication_factor',
+)
+
+# Строки с небольшим набором значений: одинаковые значения хранятся одним объектом
+_INTERNED_FIELDS = frozenset(('brand', 'warehouse', 'warehouse_type', 'availability', 'supplier', 'provider'))
+
+_FIELDS = frozenset(OFFER_FIELDS)
+_MISSING = object()
+_EMPTY = dict.fromkeys(OFFER_FIELDS, _MISSING)
+_get_all = attrgetter(*OFFER_FIELDS)
+_set = object.__setattr__
+
+
+def _intern(name: str, value: Any) -> Any:
+    if name in _INTERNED_FIELDS and type(value) is str:
+        return sys.intern(value)
+    return value
+
+
+class Offer:
+    """
+    Предложение поставщика: __slots__ вместо dict на каждую строку ответа API
+
+    Сырые предложения живут в кэше (OfferCache) и общие для всех одновременных поисков,
+    поэтому запись заметно компактнее dict. Для чтения поддерживается интерфейс словаря
+    (offer['price'], offer.get('quantity', 0), 'warehouse' in offer) - код фильтров и
+    кросс-графа работает с Offer так же, как с dict.
+
+    Наценка, флаги выдачи и сериализация - в копии для конкретного запроса: to_dict()
+    """
+
+    __slots__ = OFFER_FIELDS
+
+    def __init__(self, **fields):
+        if not _FIELDS.issuperset(fields):
+            raise TypeError(f"Unknown offer fields: {sorted(fields.keys() - _FIELDS)}")
+
+        # Все слоты заполняются одним проходом; интернируются только переданные строковые поля
+        values = {**_EMPTY, **fields}
+        for name in _INTERNED_FIELDS.intersection(fields):
+            value = values[name]
+            if type(value) is str:
+                values[name] = sys.intern(value)
+
+        for name, value in values.items():
+            _set(self, name, value)
+
+    def __getitem__(self, key: str) -> Any:
+        value = getattr(self, key, _MISSING) if key in _FIELDS else _MISSING
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any):
+        if key not in _FIELDS:
+            raise KeyError(key)
+        _set(self, key, _intern(key, value))
+
+    def __contains__(self, key: str) -> bool:
+        return key in _FIELDS and getattr(self, key) is not _MISSING
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (Offer, dict)):
+            return self.to_dict() == (other.to_dict() if isinstance(other, Offer) else other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"Offer({self.to_dict()!r})"
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = getattr(self, key, _MISSING) if key in _FIELDS else _MISSING
+        return default if value is _MISSING else value
+
+    def keys(self) -> List[str]:
+        return [name for name, value in zip(OFFER_FIELDS, _get_all(self)) if value is not _MISSING]
+
+    def items(self) -> List[tuple]:
+        return [(name, value) for name, value in zip(OFFER_FIELDS, _get_all(self)) if value is not _MISSING]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Заполненные поля в новом dict (копия для запроса и формат ответа API)"""
+        return {name: value for name, value in zip(OFFER_FIELDS, _get_all(self)) if value is not _MISSING}
+
+
+def offers_to_dicts(offers: List) -> List[Dict]:
+    """Копии предложений в виде dict (принимает и Offer, и dict)"""
+    return [offer.to_dict() if isinstance(offer, Offer) else offer.copy() for offer in offers]
+
+
+class PartialOffers(list):
+    """
+    Неполный ответ поставщика (часть запросов не уложилась в бюджет)
+
+    Кэшируется, как пустой результат, на короткое время, чтобы следующий поиск запросил поставщика заново
+    """
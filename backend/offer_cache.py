@@ -0,0 +1,146 @@
+"""
+Offer Cache
+Кэш сырых предложений поставщиков (до наценки) с TTL и stale-while-revalidate
+"""
+
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from article_utils import normalize_article
+from env_utils import env_float
+from offer import PartialOffers
+
+logger = logging.getLogger(__name__)
+
+# Время жизни свежей записи по поставщикам (секунды)
+DEFAULT_TTLS = {
+    'rossko': 300,
+    'autotrade': 120,
+    'berg': 300,
+    'autostels': 300,
+}
+
+
+class CacheEntry:
+    """Запись кэша: предложения и время их получения"""
+
+    __slots__ = ('offers', 'stored_at', 'ttl')
+
+    def __init__(self, offers: List[Dict], stored_at: float, ttl: float):
+        self.offers = offers
+        self.stored_at = stored_at
+        self.ttl = ttl
+
+    def age(self) -> float:
+        return time.monotonic() - self.stored_at
+
+    def is_stale(self) -> bool:
+        return self.age() > self.ttl
+
+
+class OfferCache:
+    """
+    In-memory кэш предложений по поставщикам
+
+    - Ключ: нормализованный артикул + параметры запроса к поставщику
+    - Свежая запись (моложе TTL поставщика) отдается как есть
+    - Устаревшая запись отдается еще stale_ttl секунд, пока вызывающий код обновляет ее в фоне
+    - Пустой или неполный результат кэшируется на короткое время (empty_ttl), чтобы не скрывать появившиеся предложения
+    - Наценка в кэш не попадает: ее применяют при чтении, поэтому смена наценки кэш не сбрасывает
+    """
+
+    def __init__(
+        self,
+        ttls: Optional[Dict[str, float]] = None,
+        stale_ttl: Optional[float] = None,
+        empty_ttl: Optional[float] = None,
+        max_entries: Optional[int] = None
+    ):
+        """
+        Args:
+            ttls: TTL свежих записей по поставщикам (по умолчанию OFFER_CACHE_TTL_<SUPPLIER> или DEFAULT_TTLS)
+            stale_ttl: Сколько секунд после TTL можно отдавать устаревшую запись
+            empty_ttl: TTL для пустых результатов
+            max_entries: Максимум записей на поставщика (вытесняются самые давно использованные)
+        """
+        if ttls is None:
+            ttls = {
+                supplier: env_float(f'OFFER_CACHE_TTL_{supplier.upper()}', ttl)
+                for supplier, ttl in DEFAULT_TTLS.items()
+            }
+        self.ttls = ttls
+        self.stale_ttl = stale_ttl if stale_ttl is not None else env_float('OFFER_CACHE_STALE_TTL', 600)
+        self.empty_ttl = empty_ttl if empty_ttl is not None else env_float('OFFER_CACHE_EMPTY_TTL', 30)
+        self.max_entries = max_entries or int(env_float('OFFER_CACHE_MAX_ENTRIES', 5000))
+
+        self._entries: Dict[str, OrderedDict] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(article: str, options: Optional[Dict] = None) -> str:
+        """Ключ кэша: нормализованный артикул + отсортированные параметры запроса"""
+        key = normalize_article(article)
+        if options:
+            key += '|' + '&'.join(f'{name}={options[name]}' for name in sorted(options))
+        return key
+
+    def enabled(self, supplier: str) -> bool:
+        """Кэш поставщика выключается через TTL = 0"""
+        return self.ttls.get(supplier, 0) > 0
+
+    def get(self, supplier: str, key: str) -> Optional[CacheEntry]:
+        """
+        Возвращает запись (свежую или устаревшую в пределах stale_ttl) или None
+        """
+        entries = self._entries.get(supplier)
+        entry = entries.get(key) if entries else None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if entry.age() > entry.ttl + self.stale_ttl:
+            # Слишком старая запись - удаляем
+            del entries[key]
+            self.misses += 1
+            return None
+
+        entries.move_to_end(key)
+        if entry.is_stale():
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def set(self, supplier: str, key: str, offers: List[Dict]):
+        """Сохраняет сырые предложения поставщика"""
+        if not self.enabled(supplier):
+            return
+
+        if offers and not isinstance(offers, PartialOffers):
+            ttl = self.ttls[supplier]
+        else:
+            ttl = min(self.empty_ttl, self.ttls[supplier])
+        entries = self._entries.setdefault(supplier, OrderedDict())
+        entries[key] = CacheEntry(offers, time.monotonic(), ttl)
+        entries.move_to_end(key)
+
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def clear(self):
+        """Очищает весь кэш"""
+        self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Статистика кэша"""
+        return {
+            'entries': {supplier: len(entries) for supplier, entries in self._entries.items()},
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+        }
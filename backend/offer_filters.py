@@ -0,0 +1,408 @@
+"""
+Offer Filters
+Фильтрация, дедупликация и приоритизация предложений поставщиков для выдачи
+"""
+
+import os
+import re
+import heapq
+from operator import itemgetter
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from article_utils import normalize_article
+
+# Комплектующие, инструменты и наборы - такие позиции в выдачу не попадают
+JUNK_KEYWORDS = (
+    # Комплектующие
+    'сальник', 'кольцо', 'резинов', 'хомут', 'тефлон',
+    'ремкомплект', 'ремонтный комплект', 'заглушка', 'втулк',
+    'пыльник', 'чехол', 'манжет', 'уплотнител',
+    # Инструменты и наборы
+    'инструмент', 'ключ', 'ключей', 'набор', 'комплект ключей',
+    'bausatz', 'tool', 'wrench', 'монтаж', 'демонтаж'
+)
+
+# Префиксы производителей аналогов (ST-, EX-, HAZ- и т.д.) в нормализованном артикуле
+ANALOG_PREFIXES = ('ST', 'EX', 'HAZ', 'HNQ', 'PSG', 'AGS', 'SL', 'HY', 'R', 'SR')
+
+# Одно регулярное выражение вместо проверки каждого ключевого слова по очереди
+_JUNK_RE = re.compile('|'.join(re.escape(keyword) for keyword in JUNK_KEYWORDS))
+
+# Маркеры реального склада в Тюмени в названии склада
+_TYUMEN_MARKERS = ('ТЮМЕНЬ', 'ТЮМЕН', 'TYUMEN')
+
+# С какого числа предложений дедупликация идет по колонкам NumPy (меньшие списки быстрее обрабатываются как dict)
+COLUMNAR_THRESHOLD = int(os.environ.get('OFFER_COLUMNAR_THRESHOLD', 3000))
+
+
+def is_junk_name(part_name: str) -> bool:
+    """
+    Название, по которому позицию не показываем: пустое или слишком короткое,
+    с кракозябрами (неправильная кодировка) или комплектующее/инструмент
+    """
+    if len(part_name) < 3:
+        return True
+
+    # Если больше 40% символов - это русские "Р" или "С", скорее всего кракозябры
+    if len(part_name) > 5 and (part_name.count('Р') + part_name.count('С')) / len(part_name) > 0.4:
+        return True
+
+    return _JUNK_RE.search(part_name.lower()) is not None
+
+
+def filter_relevant_results(parts: list, search_article: str) -> list:
+    """
+    Фильтрует результаты, оставляя только релевантные:
+    - ВСЕ аналоги которые вернули API поставщиков
+    - НЕ показывает комплектующие (сальники, кольца и т.д.)
+    - Убирает позиции с нулевой ценой или количеством
+
+    Примечание: API поставщиков сами возвращают релевантные аналоги для запрошенного артикула,
+    поэтому мы не фильтруем по точному совпадению номера - показываем все что вернули API.
+    """
+    filtered = []
+
+    for part in parts:
+        # Пропускаем позиции с нулевой ценой
+        if part.get('price', 0) <= 0:
+            continue
+
+        # Для Rossko не проверяем quantity (они всегда возвращают 0, но товар есть под заказ)
+        # Для остальных проверяем quantity
+        if part.get('provider', '') != 'rossko' and part.get('quantity', 0) <= 0:
+            continue
+
+        if is_junk_name(part.get('name', '').strip()):
+            continue
+
+        # Все остальное - показываем (API сами вернули релевантные аналоги)
+        filtered.append(part)
+
+    return filtered
+
+
+def _pick_best(grouped: Dict[str, Dict], key: str, part: Dict):
+    """Оставляет в группе лучшую позицию: самую дешевую, затем самую быструю, затем с большим количеством"""
+    existing = grouped.get(key)
+    if existing is None:
+        grouped[key] = part
+    elif part['price'] < existing['price']:
+        grouped[key] = part
+    elif part['price'] == existing['price']:
+        if part['delivery_days'] < existing['delivery_days']:
+            grouped[key] = part
+        elif part['delivery_days'] == existing['delivery_days']:
+            if part.get('quantity', 0) > existing.get('quantity', 0):
+                grouped[key] = part
+
+
+def _is_tyumen_stock(part: Dict) -> bool:
+    """
+    "В наличии" = ТОЛЬКО реальная Тюмень с быстрой доставкой (0-1 день)
+
+    Autotrade: флаг in_stock (он правильно настроен). Autostels, Berg, Rossko: склад содержит
+    "ТЮМЕНЬ" в названии (НЕ просто код "TYM-STC-" - это могут быть любые склады) + доставка <= 1
+    """
+    if part.get('provider', '') == 'autotrade':
+        return part.get('in_stock', False)
+
+    warehouse = part.get('warehouse', '').upper()
+    return any(marker in warehouse for marker in _TYUMEN_MARKERS) and part.get('delivery_days', 999) <= 1
+
+
+def _search_keys(search_article: str):
+    """Нормализованный запрос и запрос без дефисов и пробелов (для флага is_requested)"""
+    if not search_article:
+        return "", ""
+    return normalize_article(search_article), search_article.upper().replace('-', '').replace(' ', '')
+
+
+def _mark_and_rank(part: Dict, part_normalized: str, search_normalized: str, search_original: str) -> int:
+    """
+    Проставляет флаги is_original / is_requested и возвращает приоритет позиции:
+    0 - запрошенный оригинал, 1 - другой оригинал без префикса
+    (оригинал БЕЗ префикса ВСЕГДА выше: 57710-25510 идет перед ST-5771025510),
+    2 - запрошенный артикул с префиксом, 3 - другие артикулы с префиксом (аналоги)
+    """
+    # Артикул с префиксом аналога (ST-, EX-, HAZ- и т.д.)
+    has_prefix = part_normalized.startswith(ANALOG_PREFIXES)
+
+    # Помечаем оригинальный артикул:
+    # 1) Артикул БЕЗ префикса (57710-25510)
+    # 2) ИЛИ API явно сказал что это не аналог (is_cross=false)
+    part['is_original'] = (not has_prefix) or (not part.get('is_cross', False))
+
+    # Помечаем запрошенный артикул (точное совпадение с запросом)
+    is_requested = (
+        part_normalized == search_normalized or
+        part.get('article', '').upper().replace('-', '').replace(' ', '') == search_original
+    )
+    part['is_requested'] = is_requested
+
+    return (2 if has_prefix else 0) + (0 if is_requested else 1)
+
+
+def deduplicate_and_prioritize(
+    parts: list,
+    search_article: str = "",
+    availability_filter: Optional[str] = None,
+    sort_by: Optional[str] = None
+) -> list:
+    """
+    Объединяет результаты от разных поставщиков:
+    - Для одинаковых артикулов оставляет 2 позиции: самую дешевую + самую быструю
+    - Если одна позиция и дешевая и быстрая - оставляем 1
+    - Разные артикулы - показываем все
+    - Приоритет: оригинал → запрошенный артикул → аналоги
+
+    Артикул каждой позиции нормализуется один раз; группировка, флаги и ключ сортировки
+    используют сохраненное значение. Большие списки (от COLUMNAR_THRESHOLD позиций)
+    группируются и сортируются по колонкам NumPy с тем же результатом
+    """
+    result, sort_key = rank_offers(parts, search_article, availability_filter, sort_by)
+    if sort_key is not None:
+        result.sort(key=sort_key)
+    return result
+
+
+def top_offers(result: list, sort_key: Optional[Callable], limit: int) -> list:
+    """
+    Первые limit позиций в порядке выдачи без сортировки всего списка (частичный выбор через кучу)
+
+    Порядок совпадает с deduplicate_and_prioritize(...)[:limit]
+    """
+    if sort_key is None:
+        return result[:limit]
+    if limit >= len(result):
+        return sorted(result, key=sort_key)
+    return heapq.nsmallest(limit, result, key=sort_key)
+
+
+def rank_offers(
+    parts: list,
+    search_article: str = "",
+    availability_filter: Optional[str] = None,
+    sort_by: Optional[str] = None
+) -> Tuple[list, Optional[Callable]]:
+    """
+    deduplicate_and_prioritize без финальной сортировки: дедупликация, фильтр по наличию и флаги
+
+    Returns:
+        (позиции, ключ сортировки выдачи); ключ None - позиции уже упорядочены (колоночный путь)
+    """
+    if not parts:
+        return [], None
+
+    # Фильтр по складам Тюмени группирует по строковому ключу артикул + бренд + склад - колонки
+    # там не дают выигрыша, он всегда идет через dict
+    if len(parts) >= COLUMNAR_THRESHOLD and availability_filter != 'in_stock_tyumen':
+        result = _deduplicate_columnar(parts, search_article, availability_filter, sort_by)
+        if result is not None:
+            return result, None
+
+    # Нормализованный артикул по id позиции (позиции - dict, в них ничего лишнего не пишем)
+    normalized = {id(part): normalize_article(part['article']) for part in parts}
+
+    grouped = {}
+    if availability_filter == 'in_stock_tyumen':
+        # Фильтр по складам: не дедуплицируем по складу, показываем все варианты.
+        # Группируем по артикулу + бренд + склад, для одного склада берем дешевле
+        for part in parts:
+            key = f"{part['article']}_{part['brand']}_{part.get('warehouse', 'unknown')}".upper()
+            existing = grouped.get(key)
+            if existing is None or part['price'] < existing['price']:
+                grouped[key] = part
+    else:
+        # Дедупликация: для каждого уникального артикула (без учета бренда) оставляем ОДНУ лучшую позицию
+        for part in parts:
+            _pick_best(grouped, normalized[id(part)], part)
+
+    result = list(grouped.values())
+
+    # Применяем фильтр по наличию если нужно
+    if availability_filter == 'in_stock_tyumen':
+        # После фильтрации оставляем максимум 2 позиции на артикул + бренд: дешевая + быстрая
+        grouped_after_filter = {}
+        for part in result:
+            if not _is_tyumen_stock(part):
+                continue
+
+            key = f"{normalized[id(part)]}_{part.get('brand', 'UNKNOWN').upper()}"
+            data = grouped_after_filter.get(key)
+            if data is None:
+                grouped_after_filter[key] = {'cheapest': part, 'fastest': part}
+            else:
+                if part['price'] < data['cheapest']['price']:
+                    data['cheapest'] = part
+                if part['delivery_days'] < data['fastest']['delivery_days']:
+                    data['fastest'] = part
+
+        result = []
+        for data in grouped_after_filter.values():
+            cheapest, fastest = data['cheapest'], data['fastest']
+            result.append(cheapest)
+            # Добавляем fastest только если это другая позиция
+            if cheapest != fastest and (
+                cheapest.get('provider') != fastest.get('provider') or
+                cheapest.get('warehouse') != fastest.get('warehouse') or
+                cheapest.get('price') != fastest.get('price')
+            ):
+                result.append(fastest)
+
+    elif availability_filter == 'on_order':
+        # "Под заказ" = не в наличии или доставка > 1 дня
+        result = [p for p in result if not p.get('in_stock', False) or p.get('delivery_days', 999) > 1]
+
+    # Добавляем флаги для frontend и считаем приоритет
+    search_keys = _search_keys(search_article)
+    priorities = {id(part): _mark_and_rank(part, normalized[id(part)], *search_keys) for part in result}
+
+    # Ключ сортировки результатов
+    if sort_by == 'price_asc':
+        # Сортировка по цене (возрастание)
+        sort_key = lambda x: (x.get('price', 999999), x.get('delivery_days', 999))
+    elif sort_by == 'price_desc':
+        # Сортировка по цене (убывание)
+        sort_key = lambda x: (-x.get('price', 0), x.get('delivery_days', 999))
+    elif sort_by == 'delivery_asc':
+        # Быстрая доставка: СТРОГО по скорости доставки, потом по цене
+        # Оригинал НЕ имеет приоритета, только помечается звездочкой
+        sort_key = lambda x: (x.get('delivery_days', 999), x.get('price', 999999))
+    else:
+        # По умолчанию: оригинал первым (приоритет), потом по доставке и цене
+        sort_key = lambda x: (priorities[id(x)], x.get('delivery_days', 999), x.get('price', 999999))
+
+    return result, sort_key
+
+
+class OfferColumns:
+    """
+    Колоночное представление предложений: числовые поля - массивы NumPy,
+    нормализованный артикул - коды словаря (номер значения в порядке первого появления)
+
+    Колонки, нужные не каждому фильтру (количество, наличие), строятся по запросу
+    """
+
+    def __init__(self, parts: List[Dict]):
+        """
+        Raises:
+            KeyError: у позиции нет article, price или delivery_days
+            TypeError: нечисловые цена или срок (такие списки обрабатываются как dict)
+        """
+        self.parts = parts
+
+        # Нормализуем каждое написание артикула один раз (у популярных артикулов строк много, написаний мало)
+        raw_codes, raw_articles = self.encode(list(map(itemgetter('article'), parts)))
+        article_codes, self.articles = self.encode([normalize_article(article) for article in raw_articles])
+        self.article_codes = article_codes[raw_codes]
+
+        self.price = self.numeric(list(map(itemgetter('price'), parts)))
+        self.delivery_days = self.numeric(list(map(itemgetter('delivery_days'), parts)))
+
+    def normalized(self, row: int) -> str:
+        """Нормализованный артикул строки"""
+        return self.articles[self.article_codes[row]]
+
+    def quantity(self) -> np.ndarray:
+        return self.numeric([part.get('quantity', 0) for part in self.parts])
+
+    def in_stock(self) -> np.ndarray:
+        return np.fromiter((bool(part.get('in_stock', False)) for part in self.parts), dtype=bool, count=len(self.parts))
+
+    @staticmethod
+    def numeric(values: list) -> np.ndarray:
+        array = np.array(values)
+        if array.dtype.kind not in 'biuf':
+            raise TypeError(f"non-numeric column: {array.dtype}")
+        return array.astype(float)
+
+    @staticmethod
+    def encode(values: list):
+        """
+        Returns:
+            (коды значений, уникальные значения) - коды идут в порядке первого появления
+        """
+        index = {value: code for code, value in enumerate(dict.fromkeys(values))}
+        codes = np.fromiter(map(index.__getitem__, values), dtype=np.int64, count=len(values))
+        return codes, list(index)
+
+
+def _best_in_groups(codes: np.ndarray, n_groups: int, *keys: np.ndarray) -> np.ndarray:
+    """
+    Лучшая строка каждой группы: минимум по keys (лексикографически), при полном равенстве - первая
+
+    Вместо сортировки - последовательные минимумы по группам (np.minimum.at): после каждого
+    ключа остаются только строки, равные минимуму своей группы
+
+    Returns:
+        Номера строк в порядке кодов групп
+    """
+    candidates = np.ones(len(codes), dtype=bool)
+    for values in keys:
+        group_min = np.full(n_groups, np.inf)
+        np.minimum.at(group_min, codes[candidates], values[candidates])
+        candidates &= values == group_min[codes]
+
+    rows = np.flatnonzero(candidates)
+    _, first = np.unique(codes[rows], return_index=True)
+    return rows[first]
+
+
+def _best_per_article_rows(columns: OfferColumns, availability_filter: Optional[str]) -> np.ndarray:
+    """
+    Лучшая строка каждого нормализованного артикула: самая дешевая, затем самая быстрая,
+    затем с большим количеством, при полном равенстве - первая. Коды артикулов идут в порядке
+    первого появления, поэтому группы уже упорядочены как в dict-пути
+    """
+    rows = _best_in_groups(
+        columns.article_codes, len(columns.articles),
+        columns.price, columns.delivery_days, -columns.quantity()
+    )
+
+    if availability_filter == 'on_order':
+        # "Под заказ" = не в наличии или доставка > 1 дня
+        rows = rows[~columns.in_stock()[rows] | (columns.delivery_days[rows] > 1)]
+
+    return rows
+
+
+def _deduplicate_columnar(
+    parts: list,
+    search_article: str,
+    availability_filter: Optional[str],
+    sort_by: Optional[str]
+) -> Optional[list]:
+    """
+    deduplicate_and_prioritize по колонкам NumPy (без фильтра in_stock_tyumen):
+    минимумы по группам, фильтр "под заказ" и сортировка через lexsort
+
+    Returns:
+        Тот же результат, что и dict-путь, или None, если данные не подходят для колонок
+    """
+    try:
+        columns = OfferColumns(parts)
+        rows = _best_per_article_rows(columns, availability_filter)
+    except (KeyError, TypeError):
+        return None
+
+    search_keys = _search_keys(search_article)
+    priorities = np.fromiter(
+        (_mark_and_rank(parts[row], columns.normalized(row), *search_keys) for row in rows.tolist()),
+        dtype=np.int64,
+        count=len(rows)
+    )
+
+    # lexsort устойчив, последний ключ - главный
+    price, delivery_days = columns.price[rows], columns.delivery_days[rows]
+    if sort_by == 'price_asc':
+        order = np.lexsort((delivery_days, price))
+    elif sort_by == 'price_desc':
+        order = np.lexsort((delivery_days, -price))
+    elif sort_by == 'delivery_asc':
+        order = np.lexsort((price, delivery_days))
+    else:
+        order = np.lexsort((price, delivery_days, priorities))
+
+    return [parts[row] for row in rows[order].tolist()]
@@ -1,14 +1,31 @@
 import requests
+import asyncio
 import logging
 import os
-from typing import List, Dict, Optional
+from typing import List, Dict, Iterable, Optional
 from dotenv import load_dotenv
 from cache_manager import CacheManager
 from rate_limiter import RateLimiter
 from proxy_manager import ProxyManager
+from http_pool import get_http_client
+from single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+# Популярные категории для проверки VIN (в порядке приоритета): кузов, фильтры, тормоза
+VIN_TEST_CATEGORIES = ['1191', '7', '8', '70', '82']
+
+# Рабочие категории для текстового каталога
+CATALOG_CATEGORIES = {
+    '7': 'Масляный фильтр',
+    '8': 'Воздушный фильтр',
+    '9': 'Топливный фильтр',
+    '70': 'Тормозные колодки',
+    '82': 'Тормозной диск',
+    '198': 'Стойка амортизатора',
+    '1191': 'Кузовные детали'
+}
+
 class PartsApiClient:
     """
     Клиент для работы с API partsapi.ru
@@ -32,6 +49,9 @@ class PartsApiClient:
         # ⚠️ Инициализируем proxy manager (использовать на свой риск!)
         self.proxy_manager = ProxyManager()
         
+        # Одинаковые одновременные запросы категории (VIN + категория + тип) тратят один слот лимита
+        self._calls = SingleFlight()
+        
         # Основные категории запчастей для быстрого поиска
         self.category_keywords = {
             'масло': ['7', '3353'],  # Масляный фильтр
@@ -78,22 +98,7 @@ class PartsApiClient:
                 logger.error("Rate limit timeout - too many requests")
                 return []
             
-            params = {
-                'method': 'getPartsbyVIN',
-                'key': self.api_key,
-                'vin': vin,
-                'cat': category_id
-            }
-            
-            # Добавляем type только если нужны оригинальные
-            if parts_type == "oem":
-                params['type'] = 'oem'
-            
-            remaining = self.rate_limiter.get_remaining_requests("partsapi")
-            logger.info(
-                f"Getting parts for VIN: {vin}, category: {category_id}, type: {parts_type} "
-                f"(Remaining requests: {remaining})"
-            )
+            params = self._build_params(vin, category_id, parts_type)
             
             # Получаем proxy если включено
             proxies = self.proxy_manager.get_proxy()
@@ -108,29 +113,12 @@ class PartsApiClient:
                 timeout=15
             )
             
-            # Проверяем статус ответа
-            if response.status_code == 401:
-                logger.error(f"API key unauthorized (401)")
-                return []
-            
-            if response.status_code == 429:
-                logger.error(f"Too many requests (429) - rate limited by API")
-                return []
-            
-            if response.status_code != 200:
-                logger.error(f"API returned status {response.status_code}")
-                return []
-            
-            data = response.json()
-            
-            if not isinstance(data, list):
-                logger.error(f"Unexpected response format: {type(data)}")
+            data = self._handle_parts_response(response, category_id)
+            if data is None:
                 return []
             
             # Сохраняем в кэш
             self.cache.set(vin, category_id, data, parts_type)
-            
-            logger.info(f"Found {len(data)} parts for category {category_id}")
             return data
                 
         except requests.exceptions.RequestException as e:
@@ -140,6 +128,130 @@ class PartsApiClient:
             logger.error(f"Unexpected error: {str(e)}")
             return []
     
+    async def get_parts_by_vin_and_category_async(self, vin: str, category_id: str, parts_type: str = "oem") -> List[Dict]:
+        """
+        Асинхронная версия get_parts_by_vin_and_category
+        
+        Слот лимита резервируется через RateLimiter.acquire (ожидание не блокирует event loop),
+        запрос идет через общий пул соединений. Одновременные запросы одной категории объединяются
+        
+        В event loop читается только кэш в памяти; SQLite (чтение и запись) - в потоке
+        """
+        cached_data = self.cache.get_from_memory(vin, category_id, parts_type)
+        if cached_data is not None:
+            logger.info(f"Using cached data for VIN: {vin}, category: {category_id}")
+            return cached_data
+        
+        return await self._calls.do(
+            f"{vin}:{category_id}:{parts_type}",
+            lambda: self._fetch_category_async(vin, category_id, parts_type)
+        )
+    
+    async def _fetch_category_async(self, vin: str, category_id: str, parts_type: str) -> List[Dict]:
+        cached_data = await asyncio.to_thread(self.cache.get_from_store, vin, category_id, parts_type)
+        if cached_data is not None:
+            logger.info(f"Using cached data for VIN: {vin}, category: {category_id}")
+            return cached_data
+        
+        try:
+            if not await self.rate_limiter.acquire(key="partsapi", timeout=60):
+                logger.error("Rate limit timeout - too many requests")
+                return []
+            
+            params = self._build_params(vin, category_id, parts_type)
+            proxies = self.proxy_manager.get_proxy()
+            
+            if proxies:
+                # Прокси задаются на запрос, а у общего пула они фиксированы - запрос идет через requests в потоке
+                logger.info(f"⚠️ Using proxy for request to PartsAPI")
+                response = await asyncio.to_thread(
+                    requests.get, self.base_url, params=params, proxies=proxies, timeout=15
+                )
+            else:
+                response = await get_http_client().get(self.base_url, params=params, timeout=15)
+            
+            data = self._handle_parts_response(response, category_id)
+            if data is None:
+                return []
+            
+            await asyncio.to_thread(self.cache.set, vin, category_id, data, parts_type)
+            return data
+            
+        except Exception as e:
+            logger.error(f"Error getting parts: {str(e)}")
+            return []
+    
+    async def get_parts_by_categories_async(
+        self,
+        vin: str,
+        category_ids: Iterable[str],
+        parts_type: str = "oem"
+    ) -> Dict[str, List[Dict]]:
+        """
+        Запчасти сразу по нескольким категориям
+        
+        Категории из кэша отдаются сразу, остальные запрашиваются параллельно, каждая
+        в своем слоте лимита 10 запросов в минуту
+        
+        Returns:
+            {категория: список запчастей} в порядке category_ids
+        """
+        category_ids = list(dict.fromkeys(category_ids))
+        results = await asyncio.gather(*(
+            self.get_parts_by_vin_and_category_async(vin, category_id, parts_type)
+            for category_id in category_ids
+        ))
+        return dict(zip(category_ids, results))
+    
+    def _build_params(self, vin: str, category_id: str, parts_type: str) -> Dict:
+        """Параметры запроса getPartsbyVIN"""
+        params = {
+            'method': 'getPartsbyVIN',
+            'key': self.api_key,
+            'vin': vin,
+            'cat': category_id
+        }
+        
+        # Добавляем type только если нужны оригинальные
+        if parts_type == "oem":
+            params['type'] = 'oem'
+        
+        remaining = self.rate_limiter.get_remaining_requests("partsapi")
+        logger.info(
+            f"Getting parts for VIN: {vin}, category: {category_id}, type: {parts_type} "
+            f"(Remaining requests: {remaining})"
+        )
+        return params
+    
+    def _handle_parts_response(self, response, category_id: str) -> Optional[List[Dict]]:
+        """
+        Разбор ответа getPartsbyVIN (response от requests или httpx)
+        
+        Returns:
+            Список запчастей для сохранения в кэш или None, если ответ ошибочный
+        """
+        # Проверяем статус ответа
+        if response.status_code == 401:
+            logger.error(f"API key unauthorized (401)")
+            return None
+        
+        if response.status_code == 429:
+            logger.error(f"Too many requests (429) - rate limited by API")
+            return None
+        
+        if response.status_code != 200:
+            logger.error(f"API returned status {response.status_code}")
+            return None
+        
+        data = response.json()
+        
+        if not isinstance(data, list):
+            logger.error(f"Unexpected response format: {type(data)}")
+            return None
+        
+        logger.info(f"Found {len(data)} parts for category {category_id}")
+        return data
+    
     def parse_parts_response(self, raw_parts: List[Dict]) -> List[Dict]:
         """
         Парсит ответ от PartsAPI и извлекает артикулы из поля 'parts'
@@ -193,26 +305,8 @@ class PartsApiClient:
             Список найденных запчастей с распарсенными артикулами
         """
         try:
-            query_lower = query.lower()
-            
-            # Определяем подходящие категории
-            categories = []
-            for keyword, cat_ids in self.category_keywords.items():
-                if keyword in query_lower:
-                    categories.extend(cat_ids)
-            
-            # Если не нашли подходящих категорий, используем базовые
-            if not categories:
-                logger.info(f"No specific categories found for query '{query}', using common categories")
-                # Используем самые популярные категории
-                categories = ['7', '8', '9', '70', '82', '198']  # Фильтры, тормоза, амортизаторы
-            
-            # Убираем дубликаты
-            categories = list(set(categories))
-            logger.info(f"Searching in {len(categories)} categories: {categories}")
-            
             all_raw_parts = []
-            for category_id in categories[:10]:  # Ограничиваем 10 категориями
+            for category_id in self._query_categories(query):
                 raw_parts = self.get_parts_by_vin_and_category(vin, category_id, parts_type)
                 if raw_parts:
                     all_raw_parts.extend(raw_parts)
@@ -227,6 +321,48 @@ class PartsApiClient:
             logger.error(f"Error searching parts: {str(e)}")
             return []
     
+    async def search_parts_by_query_async(self, vin: str, query: str, parts_type: str = "oem") -> List[Dict]:
+        """
+        Асинхронная версия search_parts_by_query: категории запрашиваются параллельно
+        """
+        try:
+            parts_by_category = await self.get_parts_by_categories_async(vin, self._query_categories(query), parts_type)
+            
+            all_raw_parts = []
+            for raw_parts in parts_by_category.values():
+                all_raw_parts.extend(raw_parts)
+            
+            parsed_parts = self.parse_parts_response(all_raw_parts)
+            
+            logger.info(f"Total parts found: {len(parsed_parts)}")
+            return parsed_parts
+            
+        except Exception as e:
+            logger.error(f"Error searching parts: {str(e)}")
+            return []
+    
+    def _query_categories(self, query: str) -> List[str]:
+        """Категории для текстового запроса (не больше 10)"""
+        query_lower = query.lower()
+        
+        # Определяем подходящие категории
+        categories = []
+        for keyword, cat_ids in self.category_keywords.items():
+            if keyword in query_lower:
+                categories.extend(cat_ids)
+        
+        # Если не нашли подходящих категорий, используем базовые
+        if not categories:
+            logger.info(f"No specific categories found for query '{query}', using common categories")
+            # Используем самые популярные категории
+            categories = ['7', '8', '9', '70', '82', '198']  # Фильтры, тормоза, амортизаторы
+        
+        # Убираем дубликаты (порядок сохраняется)
+        categories = list(dict.fromkeys(categories))
+        logger.info(f"Searching in {len(categories)} categories: {categories}")
+        
+        return categories[:10]  # Ограничиваем 10 категориями
+    
     def get_car_info_by_vin(self, vin: str) -> Optional[Dict]:
         """
         Получение информации об автомобиле по VIN
@@ -240,32 +376,12 @@ class PartsApiClient:
             Информация об автомобиле или None
         """
         try:
-            # Пробуем несколько популярных категорий для проверки VIN
-            test_categories = ['1191', '7', '8', '70', '82']  # Кузов, фильтры, тормоза
-            
-            for category in test_categories:
+            for category in VIN_TEST_CATEGORIES:
                 logger.info(f"Testing VIN {vin} with category {category}")
                 test_parts = self.get_parts_by_vin_and_category(vin, category, 'oem')
                 
                 if test_parts and len(test_parts) > 0:
-                    # Если получили данные, значит VIN валиден
-                    logger.info(f"VIN {vin} is valid, found {len(test_parts)} parts in category {category}")
-                    
-                    # Извлекаем информацию об автомобиле из первой запчасти
-                    first_part = test_parts[0]
-                    
-                    # Возвращаем информацию об автомобиле
-                    return {
-                        'vin': vin,
-                        'make': 'Unknown',  # PartsAPI не возвращает марку напрямую
-                        'model': 'Unknown',  # PartsAPI не возвращает модель напрямую  
-                        'year': 'Unknown',   # PartsAPI не возвращает год напрямую
-                        'status': 'valid',
-                        'parts_available': True,
-                        'test_category': category,
-                        'parts_found': len(test_parts),
-                        'sample_part': first_part.get('name', 'Unknown')
-                    }
+                    return self._car_info(vin, category, test_parts)
             
             logger.warning(f"No data found for VIN: {vin} in any test category")
             return None
@@ -274,6 +390,54 @@ class PartsApiClient:
             logger.error(f"Error getting car info: {str(e)}")
             return None
     
+    async def get_car_info_by_vin_async(self, vin: str) -> Optional[Dict]:
+        """
+        Асинхронная версия get_car_info_by_vin
+        
+        Сначала запрашивается только первая категория VIN_TEST_CATEGORIES (обычно ее достаточно),
+        остальные - параллельно и только если в ней нет данных: лимит PartsAPI 10 запросов в минуту.
+        Ответ строится по первой в порядке VIN_TEST_CATEGORIES категории с данными
+        """
+        try:
+            first_category = VIN_TEST_CATEGORIES[0]
+            test_parts = await self.get_parts_by_vin_and_category_async(vin, first_category, 'oem')
+            if test_parts:
+                return self._car_info(vin, first_category, test_parts)
+            
+            parts_by_category = await self.get_parts_by_categories_async(vin, VIN_TEST_CATEGORIES[1:], 'oem')
+            
+            for category, test_parts in parts_by_category.items():
+                if test_parts:
+                    return self._car_info(vin, category, test_parts)
+            
+            logger.warning(f"No data found for VIN: {vin} in any test category")
+            return None
+            
+        except Exception as e:
+            logger.error(f"Error getting car info: {str(e)}")
+            return None
+    
+    def _car_info(self, vin: str, category: str, test_parts: List[Dict]) -> Dict:
+        """Информация об автомобиле по первой категории, в которой VIN вернул данные"""
+        # Если получили данные, значит VIN валиден
+        logger.info(f"VIN {vin} is valid, found {len(test_parts)} parts in category {category}")
+        
+        # Извлекаем информацию об автомобиле из первой запчасти
+        first_part = test_parts[0]
+        
+        # Возвращаем информацию об автомобиле
+        return {
+            'vin': vin,
+            'make': 'Unknown',  # PartsAPI не возвращает марку напрямую
+            'model': 'Unknown',  # PartsAPI не возвращает модель напрямую  
+            'year': 'Unknown',   # PartsAPI не возвращает год напрямую
+            'status': 'valid',
+            'parts_available': True,
+            'test_category': category,
+            'parts_found': len(test_parts),
+            'sample_part': first_part.get('name', 'Unknown')
+        }
+    
     def get_catalog_groups(self, vin: str) -> List[Dict]:
         """
         Возвращает список основных групп каталога запчастей
@@ -323,53 +487,58 @@ class PartsApiClient:
             Текстовое представление каталога с артикулами
         """
         try:
-            catalog_text = f"Каталог запчастей для VIN: {vin}\n\n"
-            
-            # Используем рабочие категории для каталога
-            working_categories = ['7', '8', '9', '70', '82', '198', '1191']
-            category_names = {
-                '7': 'Масляный фильтр',
-                '8': 'Воздушный фильтр',
-                '9': 'Топливный фильтр',
-                '70': 'Тормозные колодки',
-                '82': 'Тормозной диск',
-                '198': 'Стойка амортизатора',
-                '1191': 'Кузовные детали'
+            parts_by_category = {
+                category_id: self.get_parts_by_vin_and_category(vin, category_id, 'oem')
+                for category_id in CATALOG_CATEGORIES
             }
+            return self._format_catalog_text(vin, parts_by_category)
             
-            for category_id in working_categories:
-                category_name = category_names.get(category_id, 'Unknown')
-                
-                catalog_text += f"\nГруппа: {category_name} (ID: {category_id})\n"
-                
-                # Получаем запчасти в группе
-                raw_parts = self.get_parts_by_vin_and_category(vin, category_id, 'oem')
-                
-                if not raw_parts:
-                    catalog_text += "  (нет данных)\n"
-                    continue
-                
-                # Парсим артикулы
-                for part_group in raw_parts[:3]:  # Ограничиваем 3 группами на категорию
-                    part_name = part_group.get('name', 'Unknown')
-                    parts_string = part_group.get('parts', '')
-                    
-                    if not parts_string:
-                        continue
-                    
-                    # Извлекаем первые несколько артикулов
-                    parts_list = parts_string.split(',')[:5]  # Первые 5 артикулов
-                    
-                    catalog_text += f"  - {part_name}:\n"
-                    for part_str in parts_list:
-                        part_str = part_str.strip()
-                        if '|' in part_str:
-                            brand, article = part_str.split('|', 1)
-                            catalog_text += f"    * {brand} {article}\n"
-            
-            logger.info(f"Generated catalog text with {len(catalog_text)} characters")
-            return catalog_text
+        except Exception as e:
+            logger.error(f"Error generating catalog text: {str(e)}")
+            return ""
+    
+    async def get_full_catalog_text_async(self, vin: str) -> str:
+        """
+        Асинхронная версия get_full_catalog_text: категории каталога запрашиваются параллельно
+        """
+        try:
+            parts_by_category = await self.get_parts_by_categories_async(vin, CATALOG_CATEGORIES, 'oem')
+            return self._format_catalog_text(vin, parts_by_category)
             
         except Exception as e:
             logger.error(f"Error generating catalog text: {str(e)}")
             return ""
+    
+    def _format_catalog_text(self, vin: str, parts_by_category: Dict[str, List[Dict]]) -> str:
+        """Текст каталога по запчастям категорий (в порядке CATALOG_CATEGORIES)"""
+        catalog_text = f"Каталог запчастей для VIN: {vin}\n\n"
+        
+        for category_id, category_name in CATALOG_CATEGORIES.items():
+            catalog_text += f"\nГруппа: {category_name} (ID: {category_id})\n"
+            
+            raw_parts = parts_by_category.get(category_id)
+            
+            if not raw_parts:
+                catalog_text += "  (нет данных)\n"
+                continue
+            
+            # Парсим артикулы
+            for part_group in raw_parts[:3]:  # Ограничиваем 3 группами на категорию
+                part_name = part_group.get('name', 'Unknown')
+                parts_string = part_group.get('parts', '')
+                
+                if not parts_string:
+                    continue
+                
+                # Извлекаем первые несколько артикулов
+                parts_list = parts_string.split(',')[:5]  # Первые 5 артикулов
+                
+                catalog_text += f"  - {part_name}:\n"
+                for part_str in parts_list:
+                    part_str = part_str.strip()
+                    if '|' in part_str:
+                        brand, article = part_str.split('|', 1)
+                        catalog_text += f"    * {brand} {article}\n"
+        
+        logger.info(f"Generated catalog text with {len(catalog_text)} characters")
+        return catalog_text
@@ -1,4 +1,5 @@
 import time
+import asyncio
 from collections import deque
 from typing import Dict
 import logging
@@ -101,6 +102,47 @@ class RateLimiter:
         
         return True
     
+    async def acquire(self, key: str = "default", timeout: float = 60) -> bool:
+        """
+        Асинхронно занимает ближайший свободный слот в окне (без опроса в цикле)
+        
+        Слот резервируется сразу: одновременные вызовы получают последовательные слоты
+        и ждут каждый свое время, не блокируя event loop
+        
+        Args:
+            key: Ключ для идентификации
+            timeout: Максимальное время ожидания слота в секундах
+            
+        Returns:
+            True когда запрос можно отправлять, False если ближайший слот дальше timeout
+        """
+        self._clean_old_requests(key)
+        queue = self.requests.setdefault(key, deque())
+        
+        current_time = time.time()
+        slot_time = current_time
+        if len(queue) >= self.max_requests:
+            # Слот освобождается, когда из окна выходит запрос, стоящий на max_requests позиций раньше
+            slot_time = max(current_time, queue[-self.max_requests] + self.time_window)
+        
+        wait_time = slot_time - current_time
+        if wait_time > timeout:
+            logger.error(f"Rate limiter: next slot for key '{key}' in {wait_time:.1f}s exceeds timeout")
+            return False
+        
+        queue.append(slot_time)
+        if wait_time > 0:
+            logger.info(f"Scheduled request for key '{key}' in {wait_time:.1f}s due to rate limit")
+            try:
+                await asyncio.sleep(wait_time)
+            except asyncio.CancelledError:
+                # Запрос не будет отправлен - освобождаем слот
+                if slot_time in queue:
+                    queue.remove(slot_time)
+                raise
+        
+        return True
+    
     def get_remaining_requests(self, key: str = "default") -> int:
         """Возвращает количество оставшихся разрешенных запросов"""
         self._clean_old_requests(key)
@@ -0,0 +1,166 @@
+"""
+Result Sessions
+Снимки результатов поиска: смена фильтра и сортировки без повторных запросов к поставщикам
+"""
+
+import time
+import zlib
+import secrets
+import logging
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from env_utils import env_float
+
+logger = logging.getLogger(__name__)
+
+
+def view_tag(availability_filter: Optional[str], sort_by: Optional[str]) -> str:
+    """Короткий отпечаток пары фильтр + сортировка для курсора"""
+    return format(zlib.crc32(f"{availability_filter}|{sort_by}".encode('utf-8')), '08x')
+
+
+def make_cursor(session_id: str, offset: int, availability_filter: Optional[str], sort_by: Optional[str]) -> str:
+    """Курсор следующей страницы: сессия поиска, позиция в ее выдаче и выдача (фильтр + сортировка)"""
+    return f"{session_id}:{offset}:{view_tag(availability_filter, sort_by)}"
+
+
+def parse_cursor(cursor: str, availability_filter: Optional[str], sort_by: Optional[str]) -> Tuple[str, int]:
+    """
+    Разбирает курсор страницы и проверяет, что он выдан для той же пары фильтр + сортировка
+
+    Raises:
+        ValueError: курсор не в формате make_cursor или выдан для другого фильтра или сортировки
+    """
+    rest, _, tag = cursor.rpartition(':')
+    session_id, _, offset = rest.rpartition(':')
+    if not session_id or not offset.isdigit() or not tag:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    if tag != view_tag(availability_filter, sort_by):
+        raise ValueError("Cursor was issued for a different availability_filter or sort_by")
+    return session_id, int(offset)
+
+
+class ResultSession:
+    """
+    Снимок поиска: сырые предложения поставщиков и наценка на момент поиска
+
+    views - выдача, посчитанная для последней пары (availability_filter, sort_by): позиции и ключ сортировки.
+    Хранится только одна выдача: это копии позиций с наценкой, и при смене фильтра или сортировки
+    прежняя освобождается. Первая страница выбирается без полной сортировки, полный порядок
+    считается один раз при запросе следующей страницы (сортировка на месте, без второй копии)
+    """
+
+    __slots__ = ('article', 'offers', 'pending_suppliers', 'markup_percent', 'created_at', 'views')
+
+    def __init__(
+        self,
+        article: str,
+        offers: Dict[str, List],
+        pending_suppliers: List[str],
+        markup_percent: float
+    ):
+        self.article = article
+        self.offers = offers
+        self.pending_suppliers = pending_suppliers
+        self.markup_percent = markup_percent
+        self.created_at = time.monotonic()
+        self.views: Dict[Tuple[Optional[str], Optional[str]], Tuple[list, Optional[Callable]]] = {}
+
+    def set_view(self, view: Tuple, result: list, sort_key: Optional[Callable]):
+        """Сохраняет выдачу для (availability_filter, sort_by) вместо прежней; sort_key None - позиции уже упорядочены"""
+        self.views = {view: (result, sort_key)}
+
+    def ordered_view(self, view: Tuple) -> Optional[list]:
+        """Упорядоченная выдача для (availability_filter, sort_by) или None, если она еще не посчитана"""
+        if view not in self.views:
+            return None
+
+        result, sort_key = self.views[view]
+        if sort_key is not None:
+            result.sort(key=sort_key)
+            self.views[view] = (result, None)
+        return result
+
+    def age(self) -> float:
+        return time.monotonic() - self.created_at
+
+
+class ResultSessionStore:
+    """
+    In-memory хранилище снимков поиска по session_id
+
+    - Первый поиск сохраняет объединенные сырые предложения под новым session_id
+    - Запросы с другим фильтром или сортировкой пересчитывают выдачу из снимка в памяти:
+      без вызовов поставщиков, OEM fallback и записей в MongoDB
+    - Сырые предложения в снимке - те же объекты, что и в OfferCache; собственная память сессии -
+      одна выдача (копии позиций с наценкой) для последних фильтра и сортировки
+    - Сессия живет ttl секунд с момента поиска; при превышении max_sessions вытесняется самая давняя
+    """
+
+    def __init__(self, ttl: Optional[float] = None, max_sessions: Optional[int] = None):
+        """
+        Args:
+            ttl: Время жизни сессии в секундах (по умолчанию RESULT_SESSION_TTL или 600)
+            max_sessions: Максимальное число сессий (по умолчанию RESULT_SESSION_MAX или 2000)
+        """
+        self.ttl = ttl if ttl is not None else env_float('RESULT_SESSION_TTL', 600)
+        self.max_sessions = max_sessions if max_sessions is not None else int(
+            env_float('RESULT_SESSION_MAX', 2000)
+        )
+
+        self._sessions: "OrderedDict[str, ResultSession]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def create(
+        self,
+        article: str,
+        offers: Dict[str, List],
+        pending_suppliers: List[str],
+        markup_percent: float
+    ) -> str:
+        """Сохраняет снимок поиска и возвращает его session_id"""
+        self._evict_expired()
+
+        session_id = secrets.token_urlsafe(16)
+        self._sessions[session_id] = ResultSession(
+            article,
+            dict(offers),
+            list(pending_suppliers),
+            markup_percent
+        )
+
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+        return session_id
+
+    def get(self, session_id: str) -> Optional[ResultSession]:
+        """Снимок поиска или None, если сессии нет или она истекла"""
+        session = self._sessions.get(session_id)
+        if session is None or session.age() > self.ttl:
+            if session is not None:
+                del self._sessions[session_id]
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return session
+
+    def _evict_expired(self):
+        # Сессии упорядочены по времени создания: истекшие всегда в начале
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.age() <= self.ttl:
+                break
+            self._sessions.popitem(last=False)
+
+    def stats(self) -> Dict:
+        return {
+            'sessions': len(self._sessions),
+            'max_sessions': self.max_sessions,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
@@ -1,11 +1,121 @@
 import requests
+import httpx
 import xmltodict
 import os
-from typing import List, Dict, Optional
+from io import BytesIO
+from typing import List, Dict, Optional, Tuple
 import logging
 
+from lxml import etree
+
+from http_pool import get_http_client
+from hedging import create_hedger
+from circuit_breaker import create_breaker
+from concurrency_limiter import create_limiter
+from supplier_errors import SupplierError, SupplierTimeoutError
+from offer import Offer, offers_to_dicts
+
 logger = logging.getLogger(__name__)
 
+# Элементы ответа GetSearch, на которых срабатывает потоковый разбор (любой namespace)
+_SEARCH_EVENT_TAGS = ('{*}success', '{*}message', '{*}Part')
+
+
+# Локальное имя по полному тегу ({namespace}name): тегов в ответе единицы, а элементов - десятки тысяч
+_localnames: Dict[str, str] = {}
+
+
+def _localname(tag) -> str:
+    name = _localnames.get(tag)
+    if name is None:
+        if not isinstance(tag, str):
+            # Комментарии и инструкции обработки
+            return ''
+        name = _localnames[tag] = tag.rpartition('}')[2]
+    return name
+
+
+def _text(element) -> Optional[str]:
+    # Как xmltodict: пробелы по краям обрезаются, пустой элемент - None
+    text = element.text
+    if text is None:
+        return None
+    return text.strip() or None
+
+
+def _child_texts(element) -> Dict[str, Optional[str]]:
+    """Текст дочерних элементов по локальному имени (при повторе имени - первый)"""
+    values = {}
+    for child in element:
+        tag = child.tag
+        name = _localnames.get(tag) or _localname(tag)
+        if name not in values:
+            text = child.text
+            values[name] = (text.strip() or None) if text is not None else None
+    return values
+
+
+class _StockGroup:
+    """
+    Предложения одной позиции (бренд + артикул) при разборе ответа:
+    лучший склад и сумма количества на складах в наличии
+    """
+
+    __slots__ = ('part', 'is_exact', 'is_cross', 'stock', 'in_stock_count')
+
+    def __init__(self, part: Dict, is_exact: bool, is_cross: bool, stock: tuple):
+        self.part = part
+        self.is_exact = is_exact
+        self.is_cross = is_cross
+        self.stock = stock
+        self.in_stock_count = 0
+
+    def is_better(self, is_exact: bool, is_cross: bool, price: float, delivery: int) -> bool:
+        """
+        Лучше ли склад текущего лучшего:
+        точное совпадение с запросом > оригинал > в наличии > меньше срок доставки > дешевле
+        """
+        if is_exact != self.is_exact:
+            return is_exact
+        if is_cross != self.is_cross:
+            return not is_cross
+
+        best_price, best_delivery = self.stock[1], self.stock[3]
+        if delivery == 0 and best_delivery > 0:
+            return True
+        if delivery == 0 and best_delivery == 0:
+            # Оба в наличии - выбираем дешевле
+            return price < best_price
+        if best_delivery > 0 and delivery > 0:
+            # Оба под заказ - сравниваем сроки и цену
+            return delivery < best_delivery or (delivery == best_delivery and price < best_price)
+        return False
+
+    def to_offer(self) -> Offer:
+        stock_id, price, count, delivery, description, extra = self.stock
+        availability = 'В наличии' if delivery == 0 else 'Под заказ'
+        if self.in_stock_count > 0:
+            # Суммарное количество на складах Тюмени (в наличии)
+            count = self.in_stock_count
+            availability = f'В наличии: {self.in_stock_count} шт.'
+
+        return Offer(
+            article=self.part.get('partnumber', ''),
+            name=self.part.get('name', ''),
+            brand=self.part.get('brand', ''),
+            guid=self.part.get('guid', ''),
+            price=price,
+            delivery_days=delivery,
+            count=count,
+            stock_id=stock_id,
+            stock_description=description,
+            is_extra=extra == 1,
+            is_cross=self.is_cross,  # Метка аналога
+            availability=availability,
+            supplier='ROSSKO',
+            provider='rossko'
+        )
+
 
 class RosskoClient:
     def __init__(self):
@@ -13,6 +123,10 @@ class RosskoClient:
         self.api_url = os.environ.get('ROSSKO_API_URL', 'http://api.rossko.ru/service/v2.1/GetSearch')
         self.api_key1 = os.environ['ROSSKO_API_KEY1']
         self.api_key2 = os.environ['ROSSKO_API_KEY2']
+        # Хеджирование медленных запросов GetSearch (включается через HEDGED_SUPPLIERS)
+        self.search_hedger = create_hedger('rossko', 'search')
+        self.breaker = create_breaker('rossko')
+        self.limiter = create_limiter('rossko')
         
     def search_by_article(
         self, 
@@ -26,25 +140,7 @@ class RosskoClient:
         """
         try:
             logger.info(f"Searching Rossko for article: {article}")
-            original_article = article.upper().replace('-', '').replace(' ', '')
-            
-            # Формируем SOAP запрос для API v2.1 с правильным namespace
-            soap_body = f"""<?xml version="1.0" encoding="utf-8"?>
-<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xsd="http://www.w3.org/2001/XMLSchema">
-    <soap:Body>
-        <GetSearch xmlns="http://api.rossko.ru/">
-            <KEY1>{self.api_key1}</KEY1>
-            <KEY2>{self.api_key2}</KEY2>
-            <text>{article}</text>
-            <delivery_id>000000001</delivery_id>
-        </GetSearch>
-    </soap:Body>
-</soap:Envelope>"""
-            
-            headers = {
-                'Content-Type': 'text/xml; charset=utf-8',
-                'SOAPAction': 'http://api.rossko.ru/GetSearch'
-            }
+            soap_body, headers = self._build_search_request(article)
             
             logger.info(f"Sending SOAP request to {self.api_url}")
             
@@ -55,66 +151,168 @@ class RosskoClient:
                 timeout=30
             )
             
-            logger.info(f"Response status: {response.status_code}")
-            logger.info(f"Response content type: {response.headers.get('content-type', 'unknown')}")
-            
-            if response.status_code == 200:
-                # Проверяем что получили XML
-                content_type = response.headers.get('content-type', '').lower()
-                if 'xml' not in content_type and 'soap' not in content_type:
-                    logger.warning(f"Unexpected content type: {content_type}")
-                    logger.debug(f"Response preview: {response.text[:500]}")
-                    
-                    # Если это не XML, возвращаем mock данные
-                    return self._get_mock_data(article)
-                
-                # Парсим XML ответ
-                result = xmltodict.parse(response.content)
-                logger.info("Successfully parsed XML response")
-                
-                parts = self._parse_search_response(result)
-                
-                if not parts:
-                    logger.warning("No parts found in response, using mock data")
-                    return self._get_mock_data(article)
-                
-                logger.info(f"Found {len(parts)} parts before filtering")
-                
-                # Применяем фильтрацию и дедупликацию
-                parts = self._deduplicate_parts(parts, original_article)
-                logger.info(f"After deduplication: {len(parts)} parts")
-                
-                # Применяем наценку к ценам
-                if markup_percent > 0:
-                    parts = self._apply_markup(parts, markup_percent)
-                    logger.info(f"Applied markup: {markup_percent}%")
-                
-                # Применяем округление цен вверх
-                parts = self._round_prices(parts)
-                
-                # Заменяем адреса складов на конкретные для Тюмени
-                parts = self._map_warehouse_names(parts)
-                
-                # Применяем фильтр по наличию
-                if availability_filter:
-                    parts = self._filter_by_availability(parts, availability_filter)
-                    logger.info(f"After availability filter '{availability_filter}': {len(parts)} parts")
-                
-                # Применяем сортировку (оригинал всегда первый)
-                parts = self._sort_with_original_first(parts, original_article, sort_by)
-                logger.info(f"Sorted by {sort_by}, original first")
-                
-                logger.info(f"Final result: {len(parts)} parts for article {article}")
-                return parts
-            else:
-                logger.error(f"API returned status {response.status_code}")
-                return self._get_mock_data(article)
+            parts = self._handle_search_response(response, article)
             
         except Exception as e:
             logger.error(f"Error searching article {article}: {str(e)}")
             import traceback
             logger.error(traceback.format_exc())
             return self._get_mock_data(article)
+        
+        if not parts:
+            logger.warning("No parts found in response, using mock data")
+            return self._get_mock_data(article)
+        
+        return self.finalize_offers(parts, article, availability_filter, sort_by, markup_percent)
+    
+    async def search_by_article_async(
+        self,
+        article: str,
+        availability_filter: Optional[str] = None,
+        sort_by: Optional[str] = None,
+        markup_percent: float = 0
+    ) -> List[Dict]:
+        """
+        Асинхронный поиск по артикулу через общий пул соединений (не блокирует event loop)
+        В отличие от search_by_article, при сбое API возвращает пустой список, а не mock данные
+        """
+        try:
+            parts = await self.fetch_offers_async(article)
+        except SupplierError as e:
+            logger.error(f"Rossko search failed for {article}: {str(e)}")
+            return []
+        
+        return self.finalize_offers(parts, article, availability_filter, sort_by, markup_percent)
+    
+    async def fetch_offers_async(self, article: str) -> List[Dict]:
+        """
+        Сырые предложения по артикулу: сгруппированы по складам, но без наценки,
+        округления, фильтра и сортировки (их применяет finalize_offers)
+        
+        Raises:
+            SupplierError: API недоступен или вернул не SOAP ответ
+            CircuitOpenError: после серии сбоев запросы временно не отправляются
+            LimiterRejectedError: превышен лимит одновременных запросов к поставщику
+        """
+        return await self.limiter.call(lambda: self.breaker.call(lambda: self._fetch_offers_async(article)))
+    
+    async def _fetch_offers_async(self, article: str) -> List[Dict]:
+        try:
+            logger.info(f"Searching Rossko (async) for article: {article}")
+            soap_body, headers = self._build_search_request(article)
+            
+            response = await self.search_hedger.call(lambda: get_http_client().post(
+                self.api_url,
+                content=soap_body.encode('utf-8'),
+                headers=headers,
+                timeout=30
+            ))
+            
+            return self._handle_search_response(response, article)
+            
+        except SupplierError:
+            raise
+        except httpx.TimeoutException as e:
+            raise SupplierTimeoutError('rossko', f"timeout for article {article}") from e
+        except Exception as e:
+            raise SupplierError('rossko', f"error searching article {article}: {str(e)}") from e
+    
+    def finalize_offers(
+        self,
+        parts: List[Dict],
+        article: str,
+        availability_filter: Optional[str] = None,
+        sort_by: Optional[str] = None,
+        markup_percent: float = 0
+    ) -> List[Dict]:
+        """
+        Применяет наценку, округление, фильтр по наличию и сортировку к сырым предложениям
+        Исходный список не изменяется (он может быть общим для нескольких запросов)
+        """
+        original_article = article.upper().replace('-', '').replace(' ', '')
+        parts = offers_to_dicts(parts)
+        
+        # Применяем наценку к ценам
+        if markup_percent > 0:
+            parts = self._apply_markup(parts, markup_percent)
+            logger.info(f"Applied markup: {markup_percent}%")
+        
+        # Применяем округление цен вверх
+        parts = self._round_prices(parts)
+        
+        # Применяем фильтр по наличию
+        if availability_filter:
+            parts = self._filter_by_availability(parts, availability_filter)
+            logger.info(f"After availability filter '{availability_filter}': {len(parts)} parts")
+        
+        # Применяем сортировку (оригинал всегда первый)
+        parts = self._sort_with_original_first(parts, original_article, sort_by)
+        logger.info(f"Sorted by {sort_by}, original first")
+        
+        logger.info(f"Final result: {len(parts)} parts for article {article}")
+        return parts
+    
+    def _build_search_request(self, article: str) -> Tuple[str, Dict[str, str]]:
+        """
+        Формирует SOAP запрос GetSearch и заголовки
+        """
+        # Формируем SOAP запрос для API v2.1 с правильным namespace
+        soap_body = f"""<?xml version="1.0" encoding="utf-8"?>
+<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+    <soap:Body>
+        <GetSearch xmlns="http://api.rossko.ru/">
+            <KEY1>{self.api_key1}</KEY1>
+            <KEY2>{self.api_key2}</KEY2>
+            <text>{article}</text>
+            <delivery_id>000000001</delivery_id>
+        </GetSearch>
+    </soap:Body>
+</soap:Envelope>"""
+        
+        headers = {
+            'Content-Type': 'text/xml; charset=utf-8',
+            'SOAPAction': 'http://api.rossko.ru/GetSearch'
+        }
+        
+        return soap_body, headers
+    
+    def _handle_search_response(self, response, article: str) -> List[Dict]:
+        """
+        Обработка ответа GetSearch (response от requests или httpx)
+        Возвращает сгруппированные предложения без наценки
+        
+        Raises:
+            SupplierError: API вернул ошибку HTTP или не XML
+        """
+        original_article = article.upper().replace('-', '').replace(' ', '')
+        
+        logger.info(f"Response status: {response.status_code}")
+        logger.info(f"Response content type: {response.headers.get('content-type', 'unknown')}")
+        
+        if response.status_code != 200:
+            logger.error(f"API returned status {response.status_code}")
+            raise SupplierError('rossko', f"API returned status {response.status_code}", response.status_code)
+        
+        # Проверяем что получили XML
+        content_type = response.headers.get('content-type', '').lower()
+        if 'xml' not in content_type and 'soap' not in content_type:
+            logger.warning(f"Unexpected content type: {content_type}")
+            logger.debug(f"Response preview: {response.text[:500]}")
+            raise SupplierError('rossko', f"unexpected content type: {content_type}")
+        
+        # Потоковый разбор XML: склады группируются и дедуплицируются прямо при разборе
+        parts = self._parse_search_response(response.content, original_article)
+        
+        if not parts:
+            logger.info(f"No parts found in Rossko response for {article}")
+            return []
+        
+        logger.info(f"After deduplication: {len(parts)} parts")
+        
+        # Заменяем адреса складов на конкретные для Тюмени
+        parts = self._map_warehouse_names(parts)
+        
+        return parts
     
     def _get_mock_data(self, article: str) -> List[Dict]:
         """
@@ -134,192 +332,120 @@ class RosskoClient:
             }
         ]
     
-    def _parse_search_response(self, xml_data: dict) -> List[Dict]:
+    def _parse_search_response(self, content: bytes, original_article: str = '') -> List[Dict]:
         """
-        Парсинг XML ответа от Rossko API v2.1
-        Сохраняет полную информацию о всех складах для каждой запчасти
+        Потоковый разбор XML ответа Rossko API v2.1 (lxml.etree.iterparse)
+        
+        Склады каждой запчасти и ее аналогов (crosses) сразу сводятся в одно предложение
+        на бренд + артикул: лучший склад и сумма количества в наличии (см. _StockGroup).
+        Разобранная запчасть удаляется из дерева, поэтому память не растет с размером ответа
+        
+        Args:
+            content: Тело SOAP ответа GetSearch
+            original_article: Запрошенный артикул (верхний регистр, без дефисов и пробелов)
+            
+        Returns:
+            Сгруппированные предложения без наценки в порядке первого появления в ответе
         """
+        groups: Dict[str, _StockGroup] = {}
+        success = 'false'
+        message = 'Unknown error'
+        
         try:
-            parts = []
-            
-            # Навигация по структуре SOAP ответа согласно WSDL
-            soap_body = xml_data.get('SOAP-ENV:Envelope', {}).get('SOAP-ENV:Body', {})
-            search_response = soap_body.get('ns1:GetSearchResponse', {})
-            search_result = search_response.get('ns1:SearchResult', {})
-            
-            # Проверяем успешность запроса
-            success = search_result.get('ns1:success', 'false')
-            if success != 'true':
-                message = search_result.get('ns1:message', 'Unknown error')
-                logger.warning(f"Rossko API returned error: {message}")
-                return []
-            
-            # Получаем список запчастей
-            parts_list = search_result.get('ns1:PartsList', {})
-            if parts_list and 'ns1:Part' in parts_list:
-                part_items = parts_list['ns1:Part']
+            for _, element in etree.iterparse(BytesIO(content), events=('end',), tag=_SEARCH_EVENT_TAGS):
+                parent = element.getparent()
+                parent_name = _localname(parent.tag) if parent is not None else ''
+                name = _localname(element.tag)
+                
+                if name != 'Part':
+                    if parent_name == 'SearchResult':
+                        value = _text(element)
+                        if name == 'success':
+                            success = value
+                        else:
+                            message = value
+                    continue
+                
+                # Аналоги разбираются вместе с запчастью, в которую вложены (после ее складов)
+                if parent_name != 'PartsList':
+                    continue
                 
-                # Может быть один элемент или список
-                if isinstance(part_items, dict):
-                    part_items = [part_items]
+                self._collect_part(element, groups, original_article, is_cross=False)
+                for child in element:
+                    if _localname(child.tag) == 'crosses':
+                        for cross in child:
+                            if _localname(cross.tag) == 'Part':
+                                self._collect_part(cross, groups, original_article, is_cross=True)
+                        break
                 
-                for item in part_items:
-                    # Обрабатываем основную запчасть (оригинал)
-                    self._process_part_item(item, parts, is_cross=False)
+                # Освобождаем разобранную запчасть и уже обработанные предыдущие
+                element.clear()
+                while element.getprevious() is not None:
+                    del parent[0]
                     
-                    # Обрабатываем аналоги (crosses)
-                    crosses = item.get('ns1:crosses', {})
-                    if crosses and 'ns1:Part' in crosses:
-                        cross_items = crosses['ns1:Part']
-                        if isinstance(cross_items, dict):
-                            cross_items = [cross_items]
-                        
-                        for cross_item in cross_items:
-                            self._process_part_item(cross_item, parts, is_cross=True)
-            
-            return parts
-            
+        except etree.XMLSyntaxError:
+            raise
         except Exception as e:
             logger.error(f"Error parsing Rossko response: {str(e)}")
             import traceback
             logger.error(traceback.format_exc())
             return []
-    
-    def _process_part_item(self, item: dict, parts: List[Dict], is_cross: bool = False):
-        """
-        Обработка одной запчасти (оригинал или аналог) и всех её складов
-        """
-        # Получаем информацию о всех складах
-        stocks = item.get('ns1:stocks', {})
-        stocks_list = []
         
-        if stocks and 'ns1:stock' in stocks:
-            stock_items = stocks['ns1:stock']
-            if isinstance(stock_items, dict):
-                stock_items = [stock_items]
-            
-            for stock in stock_items:
-                stock_info = {
-                    'id': stock.get('ns1:id', ''),
-                    'price': float(stock.get('ns1:price', 0)),
-                    'count': int(stock.get('ns1:count', 0)),
-                    'delivery': int(stock.get('ns1:delivery', 0)),
-                    'description': stock.get('ns1:description', ''),
-                    'extra': int(stock.get('ns1:extra', 0))
-                }
-                stocks_list.append(stock_info)
-        
-        # Для каждого склада создаём отдельную запись
-        for stock in stocks_list:
-            part = {
-                'article': item.get('ns1:partnumber', ''),
-                'name': item.get('ns1:name', ''),
-                'brand': item.get('ns1:brand', ''),
-                'guid': item.get('ns1:guid', ''),
-                'price': stock['price'],
-                'delivery_days': stock['delivery'],
-                'count': stock['count'],
-                'stock_id': stock['id'],
-                'stock_description': stock['description'],
-                'is_extra': stock['extra'] == 1,
-                'is_cross': is_cross,  # Метка аналога
-                'availability': 'В наличии' if stock['delivery'] == 0 else 'Под заказ',
-                'supplier': 'ROSSKO',
-                'provider': 'rossko'
-            }
-            parts.append(part)
+        # Проверяем успешность запроса
+        if success != 'true':
+            logger.warning(f"Rossko API returned error: {message}")
+            return []
+        
+        return [group.to_offer() for group in groups.values()]
     
-    def _deduplicate_parts(self, parts: List[Dict], original_article: str = '') -> List[Dict]:
+    def _collect_part(self, element, groups: Dict[str, _StockGroup], original_article: str, is_cross: bool):
         """
-        Убирает дубликаты и суммирует количество для складов Тюмени
-        Приоритет: точное совпадение с запросом > оригинал > аналог, в наличии > под заказ, дешевле > дороже
+        Добавляет склады одной запчасти (оригинал или аналог) в группы бренд + артикул
         """
-        # Группируем по артикулу + бренд
-        groups = {}
+        part = {}
+        stocks = None
+        for child in element:
+            name = _localname(child.tag)
+            if name == 'stocks':
+                stocks = child
+            elif name != 'crosses' and name not in part:
+                part[name] = _text(child)
         
-        for part in parts:
-            key = f"{part['brand']}_{part['article']}"
-            
-            if key not in groups:
-                groups[key] = part.copy()
-                # Инициализируем список складов для суммирования
-                groups[key]['all_stocks'] = [part]
-            else:
-                existing = groups[key]
-                
-                # Добавляем в список складов для суммирования
-                existing['all_stocks'].append(part)
-                
-                # Выбираем лучшее предложение по критериям:
-                # 0. Приоритет - точное совпадение артикула с запросом
-                # 1. Оригинал (is_cross=False)
-                # 2. В наличии (delivery_days = 0)
-                # 3. Меньше срок доставки
-                # 4. Дешевле цена
-                
-                is_better = False
-                
-                # Нормализуем артикулы для сравнения
-                part_article_norm = part['article'].upper().replace('-', '').replace(' ', '')
-                existing_article_norm = existing['article'].upper().replace('-', '').replace(' ', '')
-                
-                # Точное совпадение с запросом всегда лучше
-                part_is_exact = (part_article_norm == original_article)
-                existing_is_exact = (existing_article_norm == original_article)
-                
-                if part_is_exact and not existing_is_exact:
-                    is_better = True
-                elif existing_is_exact and not part_is_exact:
-                    is_better = False
-                # Оригинал всегда лучше аналога
-                elif not part['is_cross'] and existing['is_cross']:
-                    is_better = True
-                elif part['is_cross'] and not existing['is_cross']:
-                    is_better = False
-                else:
-                    # Оба оригиналы или оба аналоги - сравниваем по другим критериям
-                    if part['delivery_days'] == 0 and existing['delivery_days'] > 0:
-                        is_better = True
-                    elif part['delivery_days'] == 0 and existing['delivery_days'] == 0:
-                        # Оба в наличии - выбираем дешевле
-                        if part['price'] < existing['price']:
-                            is_better = True
-                    elif existing['delivery_days'] > 0 and part['delivery_days'] > 0:
-                        # Оба под заказ - сравниваем сроки и цену
-                        if part['delivery_days'] < existing['delivery_days']:
-                            is_better = True
-                        elif part['delivery_days'] == existing['delivery_days'] and part['price'] < existing['price']:
-                            is_better = True
-                
-                if is_better:
-                    # Сохраняем список складов
-                    all_stocks = existing['all_stocks']
-                    groups[key] = part.copy()
-                    groups[key]['all_stocks'] = all_stocks
-        
-        # Суммируем количество для складов Тюмени (в наличии)
-        result = []
-        for key, part in groups.items():
-            # Подсчитываем общее количество на складах Тюмени
-            total_count = 0
-            tyumen_stocks = []
+        if stocks is None:
+            return
+        
+        article = part.get('partnumber', '')
+        key = f"{part.get('brand', '')}_{article}"
+        group = groups.get(key)
+        is_exact = None
+        
+        for stock_element in stocks:
+            if _localname(stock_element.tag) != 'stock':
+                continue
             
-            for stock in part.get('all_stocks', []):
-                if stock['delivery_days'] == 0:  # В наличии
-                    total_count += stock['count']
-                    tyumen_stocks.append(stock['stock_description'])
+            stock = _child_texts(stock_element)
+            price = float(stock.get('price', 0))
+            count = int(stock.get('count', 0))
+            delivery = int(stock.get('delivery', 0))
+            stock_info = (
+                stock.get('id', ''),
+                price,
+                count,
+                delivery,
+                stock.get('description', ''),
+                int(stock.get('extra', 0))
+            )
             
-            # Обновляем count и availability
-            if total_count > 0:
-                part['count'] = total_count
-                part['availability'] = f'В наличии: {total_count} шт.'
+            if is_exact is None:
+                is_exact = article.upper().replace('-', '').replace(' ', '') == original_article
             
-            # Удаляем служебное поле
-            part.pop('all_stocks', None)
+            if group is None:
+                group = groups[key] = _StockGroup(part, is_exact, is_cross, stock_info)
+            elif group.is_better(is_exact, is_cross, price, delivery):
+                group.part, group.is_exact, group.is_cross, group.stock = part, is_exact, is_cross, stock_info
             
-            result.append(part)
-        
-        return result
+            if delivery == 0:  # В наличии
+                group.in_stock_count += count
     
     def _apply_markup(self, parts: List[Dict], markup_percent: float) -> List[Dict]:
         """
@@ -375,7 +501,7 @@ class RosskoClient:
         
         for part in parts:
             part_article_norm = part['article'].upper().replace('-', '').replace(' ', '')
-            if part_article_norm == original_article and not part['is_cross']:
+            if part_article_norm == original_article and not part.get('is_cross', False):
                 exact_matches.append(part)
             else:
                 other_parts.append(part)
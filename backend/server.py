@@ -1,8 +1,10 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
 from pathlib import Path
 from datetime import datetime
@@ -12,7 +14,7 @@ from typing import List
 from models import (
     User, Cart, Order, SearchHistory, ActivityLog, Settings,
     Vehicle, ServiceRecord, LogEntry, Reminder,
-    SearchArticleRequest, SearchVINRequest, AISearchRequest,
+    SearchArticleRequest, SearchSessionRequest, SearchVINRequest, AISearchRequest,
     AddToCartRequest, UpdateCartItemRequest, RemoveFromCartRequest,
     CreateOrderRequest, PartInfo, CartItem
 )
@@ -28,6 +30,14 @@ from openai_client import OpenAIClient
 # from partkom_parser import PartKomParser  # Отключено - используем PartsAPI
 from partsapi_client import PartsApiClient
 from n8n_client import TelegramNotifier
+from http_pool import startup_http_client, shutdown_http_client
+from article_search import (
+    ArticleSearchService, SUPPLIERS, SEARCH_BUDGET_SECONDS, SEARCH_STREAM_BUDGET_SECONDS
+)
+from offer_filters import filter_relevant_results, deduplicate_and_prioritize, rank_offers, top_offers
+from cross_graph import CrossReferenceGraph
+from result_sessions import ResultSessionStore, make_cursor, parse_cursor
+from api_response import FastJSONResponse, ResponseMiddleware, dumps
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -38,291 +48,18 @@ client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
 
-def normalize_article(article: str) -> str:
-    """Нормализует артикул для сравнения: убирает пробелы, дефисы, приводит к верхнему регистру"""
-    return article.upper().replace('-', '').replace(' ', '').replace('/', '')
-
-
-def is_exact_match(search_article: str, result_article: str) -> bool:
-    """Проверяет точное совпадение артикулов (с учетом нормализации)"""
-    return normalize_article(search_article) == normalize_article(result_article)
-
-
-def filter_relevant_results(parts: list, search_article: str) -> list:
-    """
-    Фильтрует результаты, оставляя только релевантные:
-    - ВСЕ аналоги которые вернули API поставщиков
-    - НЕ показывает комплектующие (сальники, кольца и т.д.)
-    - Убирает позиции с нулевой ценой или количеством
-    
-    Примечание: API поставщиков сами возвращают релевантные аналоги для запрошенного артикула,
-    поэтому мы не фильтруем по точному совпадению номера - показываем все что вернули API.
-    """
-    if not parts:
-        return []
-    
-    filtered = []
-    
-    for part in parts:
-        part_name = part.get('name', '').strip()
-        provider = part.get('provider', '')
-        
-        # Пропускаем позиции с нулевой ценой
-        if part.get('price', 0) <= 0:
-            continue
-        
-        # Для Rossko не проверяем quantity (они всегда возвращают 0, но товар есть под заказ)
-        # Для остальных проверяем quantity
-        if provider != 'rossko' and part.get('quantity', 0) <= 0:
-            continue
-        
-        # Пропускаем позиции БЕЗ названия (только артикул)
-        if not part_name or len(part_name) < 3:
-            continue
-        
-        # Пропускаем позиции с кракозябрами (неправильная кодировка)
-        # Если в названии больше 30% русских "Р" или "С" подряд - это кракозябры
-        if len(part_name) > 5:
-            char_counts = {'Р': 0, 'С': 0}
-            for char in part_name:
-                if char in char_counts:
-                    char_counts[char] += 1
-            # Если больше 40% символов - это Р или С, скорее всего кракозябры
-            total_rs = char_counts['Р'] + char_counts['С']
-            if total_rs / len(part_name) > 0.4:
-                continue
-        
-        # Фильтруем комплектующие, инструменты и наборы по ключевым словам в названии
-        part_name_lower = part_name.lower()
-        is_unwanted = any(keyword in part_name_lower for keyword in [
-            # Комплектующие
-            'сальник', 'кольцо', 'резинов', 'хомут', 'тефлон', 
-            'ремкомплект', 'ремонтный комплект', 'заглушка', 'втулк',
-            'пыльник', 'чехол', 'манжет', 'уплотнител',
-            # Инструменты и наборы
-            'инструмент', 'ключ', 'ключей', 'набор', 'комплект ключей',
-            'bausatz', 'tool', 'wrench', 'монтаж', 'демонтаж'
-        ])
-        
-        if is_unwanted:
-            continue
-        
-        # Все остальное - показываем (API сами вернули релевантные аналоги)
-        filtered.append(part)
-    
-    return filtered
-
-
-def deduplicate_and_prioritize(parts: list, search_article: str = "", availability_filter=None, sort_by=None) -> list:
-    """
-    Объединяет результаты от разных поставщиков:
-    - Для одинаковых артикулов оставляет 2 позиции: самую дешевую + самую быструю
-    - Если одна позиция и дешевая и быстрая - оставляем 1
-    - Разные артикулы - показываем все
-    - Приоритет: оригинал → запрошенный артикул → аналоги
-    """
-    if not parts:
-        return []
-    
-    # Если фильтр по складам - не дедуплицируем по складу, показываем все варианты
-    if availability_filter == 'in_stock_tyumen':
-        # Группируем по артикулу + бренд + склад (чтобы показать все склады)
-        grouped = {}
-        for part in parts:
-            key = f"{part['article']}_{part['brand']}_{part.get('warehouse', 'unknown')}".upper()
-            
-            if key not in grouped:
-                grouped[key] = part
-            else:
-                # Если тот же склад - берем дешевле
-                existing = grouped[key]
-                if part['price'] < existing['price']:
-                    grouped[key] = part
-        
-        result = list(grouped.values())
-    else:
-        # Дедупликация: для каждого уникального артикула оставляем ОДНУ лучшую позицию
-        # Лучшая = самая дешевая, при равной цене - самая быстрая
-        grouped = {}
-        
-        for part in parts:
-            # Нормализуем артикул для группировки (игнорируем бренд - один артикул от любого поставщика)
-            article_normalized = normalize_article(part['article'])
-            
-            if article_normalized not in grouped:
-                # Первая позиция для этого артикула
-                grouped[article_normalized] = part
-            else:
-                # Сравниваем с существующей позицией
-                existing = grouped[article_normalized]
-                
-                # Выбираем лучшую по критериям:
-                # 1. Самая дешевая
-                # 2. При равной цене - самая быстрая доставка
-                # 3. При равной цене и доставке - с большим количеством
-                
-                if part['price'] < existing['price']:
-                    # Дешевле - заменяем
-                    grouped[article_normalized] = part
-                elif part['price'] == existing['price']:
-                    # Цена равна - сравниваем по доставке
-                    if part['delivery_days'] < existing['delivery_days']:
-                        grouped[article_normalized] = part
-                    elif part['delivery_days'] == existing['delivery_days']:
-                        # И цена и доставка равны - берем с большим количеством
-                        if part.get('quantity', 0) > existing.get('quantity', 0):
-                            grouped[article_normalized] = part
-        
-        result = list(grouped.values())
-    
-    # Применяем фильтр по наличию если нужно
-    if availability_filter == 'in_stock_tyumen':
-        # "В наличии" = ТОЛЬКО реальная Тюмень с быстрой доставкой (0-1 день)
-        tyumen_results = []
-        
-        for p in result:
-            warehouse = p.get('warehouse', '').upper()
-            provider = p.get('provider', '')
-            delivery_days = p.get('delivery_days', 999)
-            
-            # Проверяем склад Тюмени по названию и быстрой доставке:
-            # Autotrade: "Тюмень (Дружбы)" + delivery <= 1 + in_stock=True
-            # Autostels, Berg, Rossko: содержит "ТЮМЕНЬ" в названии + delivery <= 1
-            
-            # Для Autotrade используем флаг in_stock (он правильно настроен)
-            if provider == 'autotrade':
-                if p.get('in_stock', False):
-                    tyumen_results.append(p)
-            # Для остальных проверяем название склада + быстрая доставка
-            else:
-                # Реальная Тюмень должна содержать слово "ТЮМЕНЬ" или "TYUMEN"
-                # НЕ просто код "TYM-STC-" (это могут быть любые склады)
-                has_tyumen_in_name = any(marker in warehouse for marker in ['ТЮМЕНЬ', 'ТЮМЕН', 'TYUMEN'])
-                
-                # И доставка должна быть быстрой (0-1 день)
-                if has_tyumen_in_name and delivery_days <= 1:
-                    tyumen_results.append(p)
-        
-        result = tyumen_results
-        
-        # ВАЖНО: После фильтрации применяем дедупликацию
-        # Оставляем максимум 2 позиции на артикул: дешевая + быстрая
-        grouped_after_filter = {}
-        for part in result:
-            article_normalized = normalize_article(part['article'])
-            brand = part.get('brand', 'UNKNOWN').upper()
-            key = f"{article_normalized}_{brand}"
-            
-            if key not in grouped_after_filter:
-                grouped_after_filter[key] = {
-                    'cheapest': part,
-                    'fastest': part
-                }
-            else:
-                # Обновляем самую дешевую
-                if part['price'] < grouped_after_filter[key]['cheapest']['price']:
-                    grouped_after_filter[key]['cheapest'] = part
-                
-                # Обновляем самую быструю
-                if part['delivery_days'] < grouped_after_filter[key]['fastest']['delivery_days']:
-                    grouped_after_filter[key]['fastest'] = part
-        
-        # Собираем результат
-        result = []
-        for data in grouped_after_filter.values():
-            result.append(data['cheapest'])
-            # Добавляем fastest только если это другая позиция
-            if data['cheapest'] != data['fastest']:
-                cheapest = data['cheapest']
-                fastest = data['fastest']
-                if (cheapest.get('provider') != fastest.get('provider') or
-                    cheapest.get('warehouse') != fastest.get('warehouse') or
-                    cheapest.get('price') != fastest.get('price')):
-                    result.append(fastest)
-    
-    elif availability_filter == 'on_order':
-        # "Под заказ" = не в наличии или доставка > 1 дня
-        result = [p for p in result if not p.get('in_stock', False) or p.get('delivery_days', 999) > 1]
-    
-    # Добавляем флаги для frontend
-    search_normalized = normalize_article(search_article) if search_article else ""
-    search_original = search_article.upper().replace('-', '').replace(' ', '') if search_article else ""
-    
-    # Убираем префиксы из поискового запроса
-    search_without_prefix = search_normalized
-    for prefix in ['ST', 'EX', 'HAZ', 'HNQ', 'PSG', 'AGS', 'SL', 'R', 'SR']:
-        if search_normalized.startswith(prefix):
-            search_without_prefix = search_normalized[len(prefix):]
-            break
-    
-    for part in result:
-        part_article = part.get('article', '')
-        part_normalized = normalize_article(part_article)
-        part_clean = part_article.upper().replace('-', '').replace(' ', '')
-        
-        # Проверяем наличие префикса у детали (ST-, EX-, HAZ- и т.д.)
-        common_prefixes = ['ST', 'EX', 'HAZ', 'HNQ', 'PSG', 'AGS', 'SL', 'HY', 'R', 'SR']
-        part_has_prefix = any(part_normalized.startswith(prefix) for prefix in common_prefixes)
-        
-        # Помечаем оригинальный артикул:
-        # 1) Артикул БЕЗ префикса (57710-25510)
-        # 2) ИЛИ API явно сказал что это не аналог (is_cross=false)
-        part['is_original'] = (not part_has_prefix) or (not part.get('is_cross', False))
-        
-        # Помечаем запрошенный артикул (точное совпадение с запросом)
-        part['is_requested'] = (part_normalized == search_normalized) or (part_clean == search_original)
-    
-    # Приоритизация результатов
-    def get_priority(part):
-        part_article = part.get('article', '')
-        part_clean = part_article.upper().replace('-', '').replace(' ', '').replace('/', '')
-        
-        # Проверяем наличие префиксов (ST-, EX-, HAZ-, и т.д.)
-        common_prefixes = ['ST', 'EX', 'HAZ', 'HNQ', 'PSG', 'AGS', 'SL', 'HY', 'R', 'SR']
-        has_prefix = any(part_clean.startswith(prefix) for prefix in common_prefixes)
-        
-        # Проверяем был ли запрошен артикул с префиксом
-        search_has_prefix = any(search_normalized.startswith(prefix) for prefix in common_prefixes)
-        
-        # ВСЕГДА: Оригинал БЕЗ префикса имеет наивысший приоритет
-        # (например 57710-25510 идет перед ST-5771025510)
-        if not has_prefix:
-            # Оригинальный OEM номер без префикса
-            if part.get('is_requested', False):
-                return 0  # Запрошенный оригинал (например, искали "57710-25510")
-            else:
-                return 1  # Другой оригинал без префикса
-        
-        # Артикулы С префиксом (ST-, EX-, и т.д.)
-        else:
-            if part.get('is_requested', False):
-                return 2  # Запрошенный артикул с префиксом (например, искали "ST-5771025510")
-            else:
-                return 3  # Другие артикулы с префиксом (аналоги)
-    
-    # Сортировка результатов
-    if sort_by == 'price_asc':
-        # Сортировка по цене (возрастание)
-        result.sort(key=lambda x: (x.get('price', 999999), x.get('delivery_days', 999)))
-    elif sort_by == 'price_desc':
-        # Сортировка по цене (убывание)
-        result.sort(key=lambda x: (-x.get('price', 0), x.get('delivery_days', 999)))
-    elif sort_by == 'delivery_asc':
-        # Быстрая доставка: СТРОГО по скорости доставки, потом по цене
-        # Оригинал НЕ имеет приоритета, только помечается звездочкой
-        result.sort(key=lambda x: (x.get('delivery_days', 999), x.get('price', 999999)))
-    else:
-        # По умолчанию: оригинал первым (приоритет), потом по доставке и цене
-        result.sort(key=lambda x: (get_priority(x), x.get('delivery_days', 999), x.get('price', 999999)))
-    
-    return result
-
 # Initialize clients
 rossko_client = RosskoClient()
 autostels_client = AutostelsClient()
 autotrade_client = AutotradeClient()
 berg_client = BergClient()
 oem_parser = AutotradeOEMParser()
+article_search = ArticleSearchService(
+    rossko_client, autotrade_client, berg_client, autostels_client,
+    cross_graph=CrossReferenceGraph(db.article_crosses)
+)
+# Снимки результатов поиска для смены фильтра и сортировки без запросов к поставщикам
+result_sessions = ResultSessionStore()
 
 # Optional clients - only if API keys are provided
 try:
@@ -340,7 +77,7 @@ except (ValueError, Exception) as e:
 telegram_notifier = TelegramNotifier()
 
 # Create the main app
-app = FastAPI(title="Market Auto Parts API")
+app = FastAPI(title="Market Auto Parts API", default_response_class=FastJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -389,259 +126,340 @@ async def create_or_update_user(user_data: dict):
 
 # ============ SEARCH ENDPOINTS ============
 
+def rank_article_results(
+    offers: dict,
+    article: str,
+    markup_percent: float,
+    availability_filter: str = None,
+    sort_by: str = None
+) -> tuple:
+    """
+    Выдача по артикулу из сырых предложений без финальной сортировки (только в памяти)
+    
+    Returns:
+        (позиции, ключ сортировки) - как offer_filters.rank_offers
+    """
+    # Наценка, фильтр и сортировка применяются к общим результатам для каждого запроса отдельно
+    all_parts = article_search.build_offers(
+        offers,
+        article,
+        markup_percent=markup_percent,
+        availability_filter=availability_filter,
+        sort_by=sort_by
+    )
+    logger.info(f"Total parts before filtering: {len(all_parts)}")
+    
+    # Фильтруем только релевантные результаты (точное совпадение артикула, без комплектующих)
+    relevant_parts = filter_relevant_results(all_parts, article)
+    logger.info(f"Parts after relevance filtering: {len(relevant_parts)}")
+    
+    # Дедуплицируем и приоритизируем
+    parts, sort_key = rank_offers(relevant_parts, article, availability_filter, sort_by)
+    logger.info(f"Final parts after deduplication: {len(parts)}")
+    
+    return parts, sort_key
+
+
+def build_article_results(
+    offers: dict,
+    article: str,
+    markup_percent: float,
+    availability_filter: str = None,
+    sort_by: str = None
+) -> List[dict]:
+    """Выдача по артикулу из сырых предложений: наценка, релевантность, дедупликация и сортировка (только в памяти)"""
+    parts, sort_key = rank_article_results(offers, article, markup_percent, availability_filter, sort_by)
+    if sort_key is not None:
+        parts.sort(key=sort_key)
+    return parts
+
+
+def article_page(
+    session_id: str,
+    session,
+    availability_filter: str = None,
+    sort_by: str = None,
+    limit: int = None,
+    offset: int = 0
+) -> dict:
+    """
+    Страница выдачи из снимка сессии
+    
+    Первая страница выбирается частично (top-K через кучу) без сортировки всей выдачи.
+    Следующие страницы берутся из упорядоченной выдачи, которая считается один раз на сессию
+    для пары фильтр + сортировка
+    """
+    view = (availability_filter, sort_by)
+    if view not in session.views:
+        session.set_view(view, *rank_article_results(
+            session.offers, session.article, session.markup_percent, availability_filter, sort_by
+        ))
+    
+    if offset == 0 and limit is not None:
+        parts, sort_key = session.views[view]
+        page = top_offers(parts, sort_key, limit)
+        total = len(parts)
+    else:
+        ordered = session.ordered_view(view)
+        page = ordered[offset:] if limit is None else ordered[offset:offset + limit]
+        total = len(ordered)
+    
+    end = offset + len(page)
+    return {
+        "results": page,
+        "count": len(page),
+        "total": total,
+        "next_cursor": make_cursor(session_id, end, availability_filter, sort_by) if end < total else None
+    }
+
+
+def session_response(session_id: str, session, page: dict) -> dict:
+    return {
+        "status": "success",
+        "query": session.article,
+        **page,
+        "partial": len(session.pending_suppliers) > 0,
+        "pending_suppliers": session.pending_suppliers,
+        "session_id": session_id
+    }
+
+
+def resolve_session(
+    session_id: str = None,
+    cursor: str = None,
+    availability_filter: str = None,
+    sort_by: str = None
+):
+    """
+    Сессия поиска и смещение страницы по session_id или курсору
+    
+    Raises:
+        HTTPException: 400 - некорректный курсор, курсор другого фильтра или сортировки, нет ни сессии,
+            ни курсора; 404 - сессия истекла
+    """
+    offset = 0
+    if cursor:
+        try:
+            session_id, offset = parse_cursor(cursor, availability_filter, sort_by)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if not session_id:
+        raise HTTPException(status_code=400, detail="session_id or cursor is required")
+    
+    session = result_sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Search session expired, repeat the search")
+    
+    return session_id, session, offset
+
+
 @api_router.post("/search/article")
 async def search_by_article(request: SearchArticleRequest):
-    """Поиск запчастей по артикулу через Rossko и Autotrade API с фильтрами"""
+    """
+    Поиск запчастей по артикулу через Rossko и Autotrade API с фильтрами
+    
+    С limit возвращается первая страница выдачи и next_cursor; запрос с cursor отдает следующую
+    страницу из снимка сессии без обращения к поставщикам
+    """
+    availability_filter = request.availability_filter
+    sort_by = request.sort_by
+    
+    if request.cursor:
+        session_id, session, offset = resolve_session(
+            cursor=request.cursor, availability_filter=availability_filter, sort_by=sort_by
+        )
+        return session_response(
+            session_id, session, article_page(session_id, session, availability_filter, sort_by, request.limit, offset)
+        )
+    
     try:
-        # Получаем параметры фильтрации из запроса (если есть)
-        availability_filter = getattr(request, 'availability_filter', None)
-        sort_by = getattr(request, 'sort_by', None)
-        
         # Получаем наценку из настроек
         settings = await db.settings.find_one({}, {"_id": 0})
         markup_percent = settings.get('markup_percent', 0) if settings else 0
         
-        # Параллельный поиск через оба API
-        import asyncio
+        # Параллельный поиск у всех поставщиков (одинаковые одновременные запросы объединяются)
+        # Ждем не дольше бюджета: опоздавшие поставщики дозаполнят кэш для следующих поисков
+        offers, pending_suppliers = await article_search.fetch_offers(
+            request.article,
+            budget=SEARCH_BUDGET_SECONDS
+        )
         
-        async def search_rossko():
-            return rossko_client.search_by_article(
-                request.article,
-                availability_filter=availability_filter,
-                sort_by=sort_by,
-                markup_percent=markup_percent
-            )
+        # Снимок для смены фильтра, сортировки и следующих страниц
+        session_id = result_sessions.create(request.article, offers, pending_suppliers, markup_percent)
         
-        async def search_autotrade():
-            try:
-                # Для Autotrade используем синхронный метод в executor
-                loop = asyncio.get_event_loop()
-                return await loop.run_in_executor(
-                    None,
-                    lambda: autotrade_client.search_by_article(request.article, cross=True, replace=False)
-                )
-            except Exception as e:
-                logger.error(f"Autotrade search error: {str(e)}")
-                return []
+        if request.limit is not None:
+            session = result_sessions.get(session_id)
+            page = article_page(session_id, session, availability_filter, sort_by, request.limit)
+            await save_article_search(request, page["total"])
+            return session_response(session_id, session, page)
         
-        async def search_berg():
-            try:
-                # Для Berg используем синхронный метод в executor
-                loop = asyncio.get_event_loop()
-                return await loop.run_in_executor(
-                    None,
-                    lambda: berg_client.search_by_article(request.article, analogs=True)
-                )
-            except Exception as e:
-                logger.error(f"Berg search error: {str(e)}")
-                return []
-        
-        async def search_autostels():
-            try:
-                # Для Autostels используем синхронный метод в executor
-                loop = asyncio.get_event_loop()
-                return await loop.run_in_executor(
-                    None,
-                    lambda: autostels_client.search_by_article(request.article)
-                )
-            except Exception as e:
-                logger.error(f"Autostels search error: {str(e)}")
-                return []
-        
-        # Запускаем все ЧЕТЫРЕ поиска параллельно
-        rossko_parts, autotrade_parts, berg_parts, autostels_parts = await asyncio.gather(
-            search_rossko(),
-            search_autotrade(),
-            search_berg(),
-            search_autostels(),
-            return_exceptions=True
-        )
+        parts = build_article_results(offers, request.article, markup_percent, availability_filter, sort_by)
         
-        # Обрабатываем возможные ошибки
-        if isinstance(rossko_parts, Exception):
-            logger.error(f"Rossko search failed: {str(rossko_parts)}")
-            rossko_parts = []
+        # Сохраняем историю поиска и активность
+        await save_article_search(request, len(parts))
         
-        if isinstance(autotrade_parts, Exception):
-            logger.error(f"Autotrade search failed: {str(autotrade_parts)}")
-            autotrade_parts = []
+        return {
+            "status": "success",
+            "query": request.article,
+            "results": parts,
+            "count": len(parts),
+            "partial": len(pending_suppliers) > 0,
+            "pending_suppliers": pending_suppliers,
+            "session_id": session_id
+        }
         
-        if isinstance(berg_parts, Exception):
-            logger.error(f"Berg search failed: {str(berg_parts)}")
-            berg_parts = []
+    except Exception as e:
+        logger.error(f"Error searching article: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@api_router.post("/search/article/session")
+async def search_article_session(request: SearchSessionRequest):
+    """
+    Смена фильтра, сортировки или страницы для уже выполненного поиска по артикулу
+    
+    Выдача пересчитывается из снимка сессии в памяти: поставщики не вызываются,
+    история поиска не записывается. Для истекшей сессии - 404, нужно повторить поиск
+    """
+    session_id, session, offset = resolve_session(
+        request.session_id, request.cursor, request.availability_filter, request.sort_by
+    )
+    
+    try:
+        page = article_page(
+            session_id, session, request.availability_filter, request.sort_by, request.limit, offset
+        )
+        if request.limit is None and offset == 0:
+            # Вся выдача - прежний формат ответа
+            page.pop("total")
+            page.pop("next_cursor")
+        return session_response(session_id, session, page)
         
-        if isinstance(autostels_parts, Exception):
-            logger.error(f"Autostels search failed: {str(autostels_parts)}")
-            autostels_parts = []
+    except Exception as e:
+        logger.error(f"Error filtering search session: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@api_router.post("/search/article/stream")
+async def search_by_article_stream(request: SearchArticleRequest):
+    """
+    Потоковый поиск по артикулу (NDJSON)
+    
+    Каждая строка ответа - JSON кадр:
+    - {"type": "supplier", ...} - отфильтрованные предложения поставщика, как только он ответил
+    - {"type": "final", ...} - объединенный и отсортированный результат по всем поставщикам
+      (с limit - первая страница, total и next_cursor, как у /search/article)
+    - {"type": "error", ...} - поиск завершился ошибкой
+    """
+    availability_filter = request.availability_filter
+    sort_by = request.sort_by
+    
+    settings = await db.settings.find_one({}, {"_id": 0})
+    markup_percent = settings.get('markup_percent', 0) if settings else 0
+    
+    def frame(data: dict) -> bytes:
+        # Та же сериализация, что и у обычных JSON ответов API
+        return dumps(data) + b"\n"
+    
+    async def frames():
+        relevant_parts = []
+        answered = []
+        raw_offers = {}
         
-        # Если Autotrade ничего не нашел, пробуем поиск по OEM номерам из других поставщиков
-        if len(autotrade_parts) == 0:
-            logger.info("Autotrade returned 0 results, trying OEM search...")
-            
-            # Функция для генерации вариантов артикула
-            def generate_article_variants(article: str) -> set:
-                """Генерирует варианты артикула для поиска"""
-                variants = {article}
-                
-                # Убираем дефисы
-                no_dash = article.replace('-', '')
-                variants.add(no_dash)
-                
-                # Добавляем ST- префикс если его нет
-                if not article.upper().startswith('ST-') and not article.upper().startswith('ST'):
-                    variants.add(f'ST-{article}')
-                    variants.add(f'ST-{no_dash}')
+        try:
+            async for supplier, offers in article_search.stream_offers(
+                request.article,
+                budget=SEARCH_STREAM_BUDGET_SECONDS
+            ):
+                answered.append(supplier)
+                raw_offers[supplier] = offers
                 
-                # Пробуем заменить суффиксы (например 1PA1A -> H5103)
-                # Берем базовую часть (первые 5 цифр)
-                import re
-                digits = re.findall(r'\d+', article)
-                if digits:
-                    base_number = digits[0]
-                    if len(base_number) >= 5:
-                        # Пробуем популярные суффиксы для Hyundai/Kia
-                        common_suffixes = ['H5103', '1PA1A', 'AA100', '35503']
-                        for suffix in common_suffixes:
-                            variants.add(f'{base_number}-{suffix}')
-                            variants.add(f'ST-{base_number}-{suffix}')
+                supplier_parts = article_search.build_offers(
+                    {supplier: offers},
+                    request.article,
+                    markup_percent=markup_percent,
+                    availability_filter=availability_filter,
+                    sort_by=sort_by
+                )
+                supplier_relevant = filter_relevant_results(supplier_parts, request.article)
+                relevant_parts.extend(supplier_relevant)
                 
-                return variants
-            
-            # Собираем OEM номера из результатов других поставщиков
-            oem_numbers = set()
-            
-            # Из Berg (берем до 20 уникальных артикулов)
-            berg_articles = set()
-            for part in berg_parts:
-                article = part.get('article', '').strip()
-                if article and article.upper() != request.article.upper():
-                    berg_articles.add(article)
-                    if len(berg_articles) >= 20:
-                        break
-            
-            for article in berg_articles:
-                variants = generate_article_variants(article)
-                oem_numbers.update(variants)
-            
-            # Из Rossko (берем до 10 уникальных артикулов)
-            rossko_articles = set()
-            for part in rossko_parts:
-                article = part.get('article', '').strip()
-                if article and article.upper() != request.article.upper():
-                    rossko_articles.add(article)
-                    if len(rossko_articles) >= 10:
-                        break
+                # Копии: deduplicate_and_prioritize проставляет флаги, а итоговый кадр пересчитает их заново
+                batch = deduplicate_and_prioritize(
+                    [part.copy() for part in supplier_relevant],
+                    request.article,
+                    availability_filter,
+                    sort_by
+                )
+                yield frame({
+                    "type": "supplier",
+                    "supplier": supplier,
+                    "results": batch,
+                    "count": len(batch)
+                })
             
-            for article in rossko_articles:
-                variants = generate_article_variants(article)
-                oem_numbers.update(variants)
+            pending_suppliers = [supplier for supplier in SUPPLIERS if supplier not in answered]
+            session_id = result_sessions.create(request.article, raw_offers, pending_suppliers, markup_percent)
             
-            # Из Autostels (берем до 10 уникальных артикулов)
-            autostels_articles = set()
-            for part in autostels_parts:
-                article = part.get('article', '').strip()
-                if article and article.upper() != request.article.upper():
-                    autostels_articles.add(article)
-                    if len(autostels_articles) >= 10:
-                        break
+            if request.limit is not None:
+                # Первая страница в том же порядке, что и следующие страницы из сессии
+                session = result_sessions.get(session_id)
+                page = article_page(session_id, session, availability_filter, sort_by, request.limit)
+                final = {"type": "final", **session_response(session_id, session, page)}
+                results_count = page["total"]
+            else:
+                parts = deduplicate_and_prioritize(relevant_parts, request.article, availability_filter, sort_by)
+                final = {
+                    "type": "final",
+                    "status": "success",
+                    "query": request.article,
+                    "results": parts,
+                    "count": len(parts),
+                    "partial": len(pending_suppliers) > 0,
+                    "pending_suppliers": pending_suppliers,
+                    "session_id": session_id
+                }
+                results_count = len(parts)
             
-            for article in autostels_articles:
-                variants = generate_article_variants(article)
-                oem_numbers.update(variants)
+            # История сохраняется до итогового кадра: клиент может отключиться сразу после него
+            await save_article_search(request, results_count)
             
-            logger.info(f"Found {len(oem_numbers)} OEM variants to search in Autotrade")
+            yield frame(final)
             
-            # Ищем в Autotrade по каждому OEM номеру (максимум 3 чтобы не перегружать API)
-            if oem_numbers:
-                oem_search_tasks = []
-                for oem in list(oem_numbers)[:3]:  # Берем первые 3 OEM
-                    async def search_by_oem(oem_number):
-                        try:
-                            loop = asyncio.get_event_loop()
-                            return await loop.run_in_executor(
-                                None,
-                                lambda: autotrade_client.search_by_article(oem_number, markup_percent)
-                            )
-                        except Exception as e:
-                            logger.error(f"OEM search failed for {oem_number}: {str(e)}")
-                            return []
-                    
-                    oem_search_tasks.append(search_by_oem(oem))
-                
-                # Выполняем поиски параллельно
-                oem_results = await asyncio.gather(*oem_search_tasks, return_exceptions=True)
-                
-                # Объединяем результаты
-                for result in oem_results:
-                    if not isinstance(result, Exception) and result:
-                        logger.info(f"Found {len(result)} results from OEM search")
-                        autotrade_parts.extend(result)
-                
-                if len(autotrade_parts) > 0:
-                    logger.info(f"✅ Autotrade OEM search successful: found {len(autotrade_parts)} parts")
-        
-        # Применяем наценку к Autotrade, Berg и Autostels если нужно
-        if markup_percent > 0:
-            for part in autotrade_parts:
-                part['price'] = round(part['price'] * (1 + markup_percent / 100), 2)
-            for part in berg_parts:
-                part['price'] = round(part['price'] * (1 + markup_percent / 100), 2)
-            for part in autostels_parts:
-                part['price'] = round(part['price'] * (1 + markup_percent / 100), 2)
-        
-        # Логируем результаты от каждого поставщика
-        logger.info(f"Raw results before filtering: Rossko={len(rossko_parts)}, Autotrade={len(autotrade_parts)}, Berg={len(berg_parts)}, Autostels={len(autostels_parts)}")
-        
-        # Объединяем результаты
-        all_parts = rossko_parts + autotrade_parts + berg_parts + autostels_parts
-        logger.info(f"Total parts before filtering: {len(all_parts)}")
-        
-        # Фильтруем только релевантные результаты (точное совпадение артикула, без комплектующих)
-        relevant_parts = filter_relevant_results(all_parts, request.article)
-        logger.info(f"Parts after relevance filtering: {len(relevant_parts)}")
-        
-        # Дедуплицируем и приоритизируем
-        parts = deduplicate_and_prioritize(relevant_parts, request.article, availability_filter, sort_by)
-        logger.info(f"Final parts after deduplication: {len(parts)}")
-        
-        # Сохраняем историю поиска
-        user = await db.users.find_one({"telegram_id": request.telegram_id}, {"_id": 0})
-        if user:
-            search_history = SearchHistory(
-                user_id=user['id'],
-                telegram_id=request.telegram_id,
-                query=request.article,
-                search_type="article",
-                results_count=len(parts)
-            )
-            doc = search_history.model_dump()
-            doc['timestamp'] = doc['timestamp'].isoformat()
-            await db.search_history.insert_one(doc)
-        
-        # Логируем активность для админ-панели
-        await log_activity(
-            request.telegram_id,
-            "search_article",
-            {
-                "article": request.article,
-                "results_count": len(parts),
-                "filters": {
-                    "availability": availability_filter,
-                    "sort": sort_by
-                }
-            }
+        except Exception as e:
+            logger.error(f"Error in streaming article search: {str(e)}")
+            yield frame({"type": "error", "status": "error", "detail": str(e)})
+    
+    return StreamingResponse(frames(), media_type="application/x-ndjson")
+
+
+async def save_article_search(request: SearchArticleRequest, results_count: int):
+    """Сохраняет историю поиска по артикулу и логирует активность для админ-панели"""
+    user = await db.users.find_one({"telegram_id": request.telegram_id}, {"_id": 0})
+    if user:
+        search_history = SearchHistory(
+            user_id=user['id'],
+            telegram_id=request.telegram_id,
+            query=request.article,
+            search_type="article",
+            results_count=results_count
         )
-        
-        return {
-            "status": "success",
-            "query": request.article,
-            "results": parts,
-            "count": len(parts)
+        doc = search_history.model_dump()
+        doc['timestamp'] = doc['timestamp'].isoformat()
+        await db.search_history.insert_one(doc)
+    
+    await log_activity(
+        request.telegram_id,
+        "search_article",
+        {
+            "article": request.article,
+            "results_count": results_count,
+            "filters": {
+                "availability": request.availability_filter,
+                "sort": request.sort_by
+            }
         }
-        
-    except Exception as e:
-        logger.error(f"Error searching article: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+    )
 
 
 @api_router.post("/search/vin")
@@ -655,7 +473,7 @@ async def search_by_vin(request: SearchVINRequest):
             raise HTTPException(status_code=503, detail="PartsAPI service not available - API key not configured")
         
         # Получаем информацию об автомобиле через PartsAPI
-        car_info = partsapi_client.get_car_info_by_vin(request.vin)
+        car_info = await partsapi_client.get_car_info_by_vin_async(request.vin)
         
         if not car_info:
             raise HTTPException(status_code=400, detail="VIN не найден. Проверьте правильность VIN номера.")
@@ -764,56 +582,64 @@ async def ai_search(request: AISearchRequest):
         if not partsapi_client:
             raise HTTPException(status_code=503, detail="PartsAPI service not available - API key not configured")
         
-        # Получаем информацию об автомобиле через PartsAPI
-        car_info = partsapi_client.get_car_info_by_vin(request.vin)
-        
+        # Сначала проверяем VIN: для неверного VIN категории запроса не расходуют лимит PartsAPI
+        car_info = await partsapi_client.get_car_info_by_vin_async(request.vin)
         if not car_info:
             raise HTTPException(status_code=400, detail="VIN не найден")
         
-        # Ищем запчасти напрямую через PartsAPI по запросу пользователя
         logger.info(f"Searching parts via PartsAPI for query: {request.query}")
-        partsapi_results = partsapi_client.search_parts_by_query(request.vin, request.query, 'oem')
+        partsapi_results = await partsapi_client.search_parts_by_query_async(request.vin, request.query, 'oem')
         
         # Преобразуем результаты PartsAPI в формат для frontend
-        parts = []
-        articles_found = []
+        candidates = [part for part in partsapi_results[:20] if part.get('article')]  # Ограничиваем 20 запчастями
+        articles_found = [part['article'] for part in candidates]
+        
+        # Цены и наличие по всем артикулам сразу: все поставщики, те же правила, что в поиске по артикулу
+        settings = await db.settings.find_one({}, {"_id": 0})
+        markup_percent = settings.get('markup_percent', 0) if settings else 0
+        
+        offers_by_article = await article_search.fetch_offers_many(articles_found, budget=SEARCH_BUDGET_SECONDS)
         
-        for part in partsapi_results[:20]:  # Ограничиваем 20 запчастями
-            article = part.get('article', '')
+        parts = []
+        for part in candidates:
+            article = part['article']
             brand = part.get('brand', 'Unknown')
             name = part.get('name', 'Unknown')
             
-            if article:
-                articles_found.append(article)
-                
-                # Пробуем найти цену и наличие через Rossko
-                rossko_info = rossko_client.search_by_article(article)
-                
-                if rossko_info and len(rossko_info) > 0:
-                    # Используем данные из Rossko (с ценами)
-                    for rossko_part in rossko_info[:1]:  # Берем первый результат
-                        parts.append({
-                            'article': article,
-                            'brand': brand,
-                            'name': name,
-                            'price': rossko_part.get('price', 0),
-                            'delivery_days': rossko_part.get('delivery_days', 'Неизвестно'),
-                            'availability': rossko_part.get('availability', 'Под заказ'),
-                            'supplier': rossko_part.get('supplier', brand),
-                            'source': 'partsapi+rossko'
-                        })
-                else:
-                    # Только данные из PartsAPI (без цен)
-                    parts.append({
-                        'article': article,
-                        'brand': brand,
-                        'name': name,
-                        'price': 0,
-                        'delivery_days': 'Уточняйте',
-                        'availability': 'Оригинал',
-                        'supplier': brand,
-                        'source': 'partsapi'
-                    })
+            offers, _ = offers_by_article[article]
+            priced = deduplicate_and_prioritize(
+                filter_relevant_results(
+                    article_search.build_offers(offers, article, markup_percent=markup_percent),
+                    article
+                ),
+                article
+            )
+            
+            if priced:
+                # Лучшее предложение: запрошенный артикул, если он есть у поставщиков
+                best = next((offer for offer in priced if offer.get('is_requested')), priced[0])
+                parts.append({
+                    'article': article,
+                    'brand': brand,
+                    'name': name,
+                    'price': best.get('price', 0),
+                    'delivery_days': best.get('delivery_days', 'Неизвестно'),
+                    'availability': best.get('availability', 'Под заказ'),
+                    'supplier': best.get('supplier', brand),
+                    'source': f"partsapi+{best.get('provider', 'rossko')}"
+                })
+            else:
+                # Только данные из PartsAPI (без цен)
+                parts.append({
+                    'article': article,
+                    'brand': brand,
+                    'name': name,
+                    'price': 0,
+                    'delivery_days': 'Уточняйте',
+                    'availability': 'Оригинал',
+                    'supplier': brand,
+                    'source': 'partsapi'
+                })
         
         logger.info(f"Found {len(parts)} parts from PartsAPI, {len(articles_found)} unique articles")
         
@@ -821,7 +647,7 @@ async def ai_search(request: AISearchRequest):
         if not parts:
             logger.info("No parts found via PartsAPI, trying Rossko direct search")
             search_query = request.query.strip()
-            parts = rossko_client.search_by_article(search_query)
+            parts = await rossko_client.search_by_article_async(search_query)
             logger.info(f"Rossko direct search found {len(parts)} parts")
         
         # Получаем количество групп каталога (если доступен)
@@ -2153,12 +1979,22 @@ async def root():
 
 @api_router.get("/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
+    # Состояние поставщиков не влияет на status: сервис работает и без части из них
+    return {
+        "status": "healthy",
+        "timestamp": datetime.utcnow().isoformat(),
+        **article_search.health(),
+        "result_sessions": result_sessions.stats(),
+        "partsapi_cache": partsapi_client.cache.stats() if partsapi_client else None
+    }
 
 
 # Include the router in the main app
 app.include_router(api_router)
 
+# Сжатие больших ответов и компактный формат выдачи поиска
+app.add_middleware(ResponseMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -2168,6 +2004,17 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+async def startup_http_pool():
+    # Общий пул соединений к поставщикам создается один раз на процесс
+    await startup_http_client()
+    # Граф кроссов для OEM поиска в Autotrade
+    await article_search.cross_graph.load()
+
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    # Несохраненные кроссы записываем до закрытия соединения с MongoDB
+    await article_search.cross_graph.flush()
     client.close()
+    await shutdown_http_client()
@@ -0,0 +1,103 @@
+"""
+Single Flight
+Объединение одновременных одинаковых запросов в один вызов
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Set
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Пока вызов по ключу выполняется, все остальные запросы с тем же ключом
+    ждут его результат вместо того, чтобы запускать свой
+    
+    После завершения вызова ключ освобождается - следующий запрос запустит новый вызов
+    """
+    
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # Число ожидающих do() по задаче и задачи, которые нельзя отменять (их результат нужен в любом случае)
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self._pinned: Set[asyncio.Task] = set()
+        self.started = 0
+        self.joined = 0
+        self.abandoned = 0
+    
+    def start(self, key: str, fn: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """
+        Возвращает задачу, выполняющуюся по ключу, или запускает fn() в новой задаче
+        
+        Задача, полученная через start(), не отменяется, даже если все ожидающие do() ушли
+        
+        Args:
+            key: Ключ объединения (например, нормализованный артикул)
+            fn: Фабрика корутины, вызывается только если по ключу нет активного вызова
+        """
+        task = self._start(key, fn)
+        self._pinned.add(task)
+        return task
+    
+    def _start(self, key: str, fn: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        task = self._inflight.get(key)
+        
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._release(key, t))
+            self.started += 1
+        else:
+            self.joined += 1
+            logger.info(f"Joined in-flight call for key '{key}'")
+        
+        return task
+    
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]], cancel_abandoned: bool = False) -> Any:
+        """
+        Выполняет fn() или присоединяется к уже выполняющемуся вызову с тем же ключом
+        
+        Args:
+            key: Ключ объединения
+            fn: Фабрика корутины
+            cancel_abandoned: Отменить общий вызов, если все ожидающие его отменены
+                (для спекулятивных запросов). По умолчанию вызов доводится до конца
+        
+        Returns:
+            Результат общего вызова (один и тот же объект для всех участников)
+        """
+        task = self._start(key, fn)
+        if not cancel_abandoned:
+            self._pinned.add(task)
+        
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            # shield: отмена одного ожидающего (клиент закрыл соединение) не отменяет общий вызов
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done() and task not in self._pinned:
+                    self.abandoned += 1
+                    logger.info(f"Cancelling abandoned call for key '{key}'")
+                    task.cancel()
+    
+    def is_running(self, key: str) -> bool:
+        """Выполняется ли сейчас вызов по ключу"""
+        return key in self._inflight
+    
+    def _release(self, key: str, task: asyncio.Task):
+        """Освобождает ключ после завершения вызова"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        self._pinned.discard(task)
+        # Помечаем исключение как полученное: фоновый вызов может никто не ждать
+        if not task.cancelled():
+            task.exception()
+    
+    def in_flight(self) -> int:
+        """Количество выполняющихся вызовов"""
+        return len(self._inflight)
@@ -0,0 +1,34 @@
+"""
+Supplier Errors
+Ошибки обращения к API поставщиков
+"""
+
+from typing import Optional
+
+
+class SupplierError(Exception):
+    """
+    Поставщик недоступен: таймаут, сетевая ошибка, ответ 429/5xx или ответ не в том формате
+
+    Асинхронные методы клиентов поставщиков бросают ее вместо того, чтобы возвращать
+    пустой список, - так сбой можно отличить от "ничего не найдено"
+    """
+
+    def __init__(self, supplier: str, message: str, status_code: Optional[int] = None):
+        super().__init__(f"{supplier}: {message}")
+        self.supplier = supplier
+        self.status_code = status_code
+
+    @property
+    def is_overload(self) -> bool:
+        """Поставщик перегружен (429 или 5xx)"""
+        return self.status_code is not None and (self.status_code == 429 or self.status_code >= 500)
+
+
+class SupplierTimeoutError(SupplierError):
+    """Поставщик не ответил за таймаут запроса"""
+
+    @property
+    def is_overload(self) -> bool:
+        # Таймаут - такой же признак перегрузки, как 429/5xx
+        return True
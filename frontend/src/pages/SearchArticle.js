@@ -5,6 +5,43 @@ import { showAlert } from '../utils/telegram';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+const PAGE_SIZE = 30; // Позиций на страницу выдачи
+
+// Читает NDJSON ответ потокового поиска и передает каждый кадр в onFrame по мере получения
+const readFrames = async (response, onFrame) => {
+  const handleLine = (line) => {
+    if (line.trim()) {
+      onFrame(JSON.parse(line));
+    }
+  };
+
+  if (!response.body || !response.body.getReader) {
+    // Браузер без потокового чтения - разбираем ответ целиком
+    (await response.text()).split('\n').forEach(handleLine);
+    return;
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  try {
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split('\n');
+      buffer = lines.pop();
+      lines.forEach(handleLine);
+    }
+    buffer += decoder.decode();
+    handleLine(buffer);
+  } catch (error) {
+    reader.cancel().catch(() => {});
+    throw error;
+  }
+};
 
 const SearchArticle = ({ userData, onAddToCart, navigateTo, initialArticle }) => {
   const [article, setArticle] = useState(initialArticle || '');
@@ -15,6 +52,15 @@ const SearchArticle = ({ userData, onAddToCart, navigateTo, initialArticle }) =>
   // Фильтры и сортировка
   const [availabilityFilter, setAvailabilityFilter] = useState(''); // '', 'in_stock_tyumen', 'on_order'
   const [sortBy, setSortBy] = useState(''); // '', 'price_asc', 'price_desc'
+  
+  // Сессия последнего поиска: смена фильтров пересчитывается на сервере без запросов к поставщикам
+  const [sessionId, setSessionId] = useState(null);
+  const [total, setTotal] = useState(0);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  // Ответили еще не все поставщики: результаты дополняются по мере ответов
+  const [streaming, setStreaming] = useState(false);
+  const searchIdRef = React.useRef(0);
 
   // Автоматический поиск при initialArticle
   React.useEffect(() => {
@@ -23,35 +69,157 @@ const SearchArticle = ({ userData, onAddToCart, navigateTo, initialArticle }) =>
     }
   }, [initialArticle]);
 
+  // Смена фильтра или сортировки после поиска
+  React.useEffect(() => {
+    if (sessionId) {
+      applyFilters();
+    } else if (streaming) {
+      // Поиск еще идет и сессии пока нет - перезапускаем его с новыми фильтрами
+      handleSearch();
+    }
+  }, [availabilityFilter, sortBy]);
+
   const handleSearch = async () => {
     if (!article.trim()) {
       showAlert('Введите артикул запчасти');
       return;
     }
 
+    // Кадры предыдущего, еще не завершенного поиска игнорируются
+    const searchId = ++searchIdRef.current;
+    const isCurrent = () => searchIdRef.current === searchId;
+
     setLoading(true);
+    setStreaming(true);
     setSearchPerformed(true);
+    setResults([]);
+    setSessionId(null);
+    setTotal(0);
+    setNextCursor(null);
 
     try {
-      const response = await axios.post(`${API}/search/article`, {
-        article: article.trim(),
-        telegram_id: userData.telegram_id,
-        availability_filter: availabilityFilter || null,
-        sort_by: sortBy || null
+      // Потоковый поиск: предложения каждого поставщика показываются, как только он ответил
+      const response = await fetch(`${API}/search/article/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          article: article.trim(),
+          telegram_id: userData.telegram_id,
+          availability_filter: availabilityFilter || null,
+          sort_by: sortBy || null,
+          limit: PAGE_SIZE
+        })
       });
+      if (!response.ok) {
+        throw new Error(`Search failed with status ${response.status}`);
+      }
 
-      setResults(response.data.results || []);
-      
-      if (response.data.results.length === 0) {
+      let finalFrame = null;
+      await readFrames(response, (frame) => {
+        if (!isCurrent()) return;
+
+        if (frame.type === 'supplier') {
+          if (frame.results && frame.results.length > 0) {
+            setResults((prev) => [...prev, ...frame.results]);
+            setLoading(false);
+          }
+        } else if (frame.type === 'final') {
+          // Итоговая выдача заменяет промежуточные результаты
+          finalFrame = frame;
+          setResults(frame.results || []);
+          setSessionId(frame.session_id || null);
+          setTotal(frame.total || 0);
+          setNextCursor(frame.next_cursor || null);
+        } else if (frame.type === 'error') {
+          throw new Error(frame.detail || 'Search failed');
+        }
+      });
+
+      if (!isCurrent()) return;
+      if (!finalFrame) {
+        throw new Error('Search stream ended without results');
+      }
+      if ((finalFrame.results || []).length === 0) {
         showAlert('Запчасти не найдены');
       }
     } catch (error) {
+      if (!isCurrent()) return;
       console.error('Error searching:', error);
       showAlert('Ошибка при поиске');
       setResults([]);
+      setSessionId(null);
+      setNextCursor(null);
+    } finally {
+      if (isCurrent()) {
+        setLoading(false);
+        setStreaming(false);
+      }
+    }
+  };
+
+  const applyFilters = async () => {
+    setLoading(true);
+    let expired = false;
+
+    try {
+      const response = await axios.post(`${API}/search/article/session`, {
+        session_id: sessionId,
+        availability_filter: availabilityFilter || null,
+        sort_by: sortBy || null,
+        limit: PAGE_SIZE
+      });
+
+      setResults(response.data.results || []);
+      setTotal(response.data.total || 0);
+      setNextCursor(response.data.next_cursor || null);
+    } catch (error) {
+      if (error.response && error.response.status === 404) {
+        expired = true;
+      } else {
+        console.error('Error filtering:', error);
+        showAlert('Ошибка при поиске');
+      }
     } finally {
       setLoading(false);
     }
+
+    if (expired) {
+      // Сессия истекла - повторяем полный поиск
+      setSessionId(null);
+      handleSearch();
+    }
+  };
+
+  const loadMore = async () => {
+    setLoadingMore(true);
+    let expired = false;
+
+    try {
+      const response = await axios.post(`${API}/search/article/session`, {
+        cursor: nextCursor,
+        availability_filter: availabilityFilter || null,
+        sort_by: sortBy || null,
+        limit: PAGE_SIZE
+      });
+
+      setResults((prev) => [...prev, ...(response.data.results || [])]);
+      setNextCursor(response.data.next_cursor || null);
+    } catch (error) {
+      if (error.response && error.response.status === 404) {
+        expired = true;
+      } else {
+        console.error('Error loading more:', error);
+        showAlert('Ошибка при поиске');
+      }
+    } finally {
+      setLoadingMore(false);
+    }
+
+    if (expired) {
+      // Сессия истекла - повторяем полный поиск
+      setSessionId(null);
+      handleSearch();
+    }
   };
 
   const handleAddToCart = (part) => {
@@ -138,8 +306,14 @@ const SearchArticle = ({ userData, onAddToCart, navigateTo, initialArticle }) =>
         ) : results.length > 0 ? (
           <div className="space-y-3">
             <h2 className="text-lg font-semibold text-gray-800 mb-3">
-              Найдено: {results.length} запчастей
+              Найдено: {total || results.length} запчастей
             </h2>
+            {streaming && (
+              <div className="flex items-center text-sm text-gray-500 mb-2" data-testid="search-streaming">
+                <Loader2 className="animate-spin mr-2 text-blue-600" size={16} />
+                Ожидаем ответа остальных поставщиков...
+              </div>
+            )}
             {results.map((part, index) => (
               <div
                 key={index}
@@ -200,6 +374,16 @@ const SearchArticle = ({ userData, onAddToCart, navigateTo, initialArticle }) =>
                 </div>
               </div>
             ))}
+            {nextCursor && (
+              <button
+                onClick={loadMore}
+                disabled={loadingMore}
+                className="w-full bg-white text-blue-600 border border-blue-600 px-4 py-3 rounded-lg font-semibold hover:bg-blue-50 transition disabled:opacity-50"
+                data-testid="load-more-button"
+              >
+                {loadingMore ? <Loader2 className="animate-spin mx-auto" size={20} /> : 'Показать еще'}
+              </button>
+            )}
           </div>
         ) : searchPerformed ? (
           <div className="text-center py-12">
@@ -0,0 +1,9 @@
+"""
+Общие настройки тестов
+Модули backend импортируются напрямую, как в server.py
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
@@ -0,0 +1,150 @@
+"""Тесты CircuitBreaker: размыкание после сбоев, half-open и восстановление"""
+
+import asyncio
+
+import pytest
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from supplier_errors import SupplierError
+
+
+async def ok():
+    return 'ok'
+
+
+async def fail():
+    raise SupplierError('rossko', 'HTTP 503', status_code=503)
+
+
+def call(breaker: CircuitBreaker, fn):
+    return asyncio.run(breaker.call(fn))
+
+
+def trip(breaker: CircuitBreaker):
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(SupplierError):
+            call(breaker, fail)
+
+
+def expire_reset_timeout(breaker: CircuitBreaker):
+    """Сдвигает момент размыкания так, будто reset_timeout уже прошел"""
+    breaker._opened_at -= breaker.reset_timeout
+
+
+def test_trips_after_consecutive_failures():
+    breaker = CircuitBreaker('rossko', failure_threshold=3, reset_timeout=30)
+
+    for _ in range(2):
+        with pytest.raises(SupplierError):
+            call(breaker, fail)
+    assert breaker.state == CLOSED
+
+    with pytest.raises(SupplierError):
+        call(breaker, fail)
+    assert breaker.state == OPEN
+    assert breaker.trips == 1
+
+
+def test_success_resets_failure_count():
+    breaker = CircuitBreaker('rossko', failure_threshold=3)
+
+    for fn in (fail, fail, ok, fail, fail):
+        try:
+            call(breaker, fn)
+        except SupplierError:
+            pass
+
+    assert breaker.state == CLOSED
+
+
+def test_open_circuit_rejects_without_calling_supplier():
+    breaker = CircuitBreaker('rossko', failure_threshold=1, reset_timeout=30)
+    trip(breaker)
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        return 'ok'
+
+    with pytest.raises(CircuitOpenError) as error:
+        call(breaker, fetch)
+
+    assert calls == 0
+    assert breaker.rejected == 1
+    assert 0 < error.value.retry_in <= 30
+
+
+def test_half_open_success_closes_circuit():
+    breaker = CircuitBreaker('rossko', failure_threshold=1, reset_timeout=30)
+    trip(breaker)
+    expire_reset_timeout(breaker)
+
+    assert breaker.state == HALF_OPEN
+    assert call(breaker, ok) == 'ok'
+    assert breaker.state == CLOSED
+    assert breaker.stats()['consecutive_failures'] == 0
+
+
+def test_half_open_failure_reopens_circuit():
+    breaker = CircuitBreaker('rossko', failure_threshold=5, reset_timeout=30)
+    trip(breaker)
+    expire_reset_timeout(breaker)
+
+    with pytest.raises(SupplierError):
+        call(breaker, fail)
+
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        call(breaker, ok)
+
+
+def test_half_open_allows_limited_trial_calls():
+    breaker = CircuitBreaker('rossko', failure_threshold=1, reset_timeout=30, half_open_max_calls=1)
+    trip(breaker)
+    expire_reset_timeout(breaker)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            return 'ok'
+
+        trial = asyncio.ensure_future(breaker.call(slow))
+        await asyncio.sleep(0)
+        with pytest.raises(CircuitOpenError):
+            await breaker.call(ok)
+        release.set()
+        return await trial
+
+    assert asyncio.run(scenario()) == 'ok'
+    assert breaker.state == CLOSED
+
+
+def test_cancelled_trial_call_is_returned():
+    breaker = CircuitBreaker('rossko', failure_threshold=1, reset_timeout=30)
+    trip(breaker)
+    expire_reset_timeout(breaker)
+
+    async def scenario():
+        trial = asyncio.ensure_future(breaker.call(lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0)
+        trial.cancel()
+        await asyncio.gather(trial, return_exceptions=True)
+        return await breaker.call(ok)
+
+    assert asyncio.run(scenario()) == 'ok'
+    assert breaker.state == CLOSED
+
+
+def test_non_supplier_errors_do_not_trip():
+    breaker = CircuitBreaker('rossko', failure_threshold=1)
+
+    async def broken_parser():
+        raise ValueError('unexpected field')
+
+    with pytest.raises(ValueError):
+        call(breaker, broken_parser)
+
+    assert breaker.state == CLOSED
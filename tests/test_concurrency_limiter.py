@@ -0,0 +1,130 @@
+"""Тесты AdaptiveLimiter: очередь сверх лимита, снижение при перегрузке и рост лимита"""
+
+import asyncio
+
+import pytest
+
+from circuit_breaker import CircuitOpenError
+from concurrency_limiter import AdaptiveLimiter, LimiterRejectedError
+from supplier_errors import SupplierError, SupplierTimeoutError
+
+
+def test_requests_over_limit_wait_for_a_slot():
+    limiter = AdaptiveLimiter('rossko', initial_limit=2, max_queue=10)
+
+    async def scenario():
+        release = asyncio.Event()
+        peak = 0
+
+        async def fetch():
+            nonlocal peak
+            peak = max(peak, limiter.in_flight)
+            await release.wait()
+            return 'ok'
+
+        tasks = [asyncio.ensure_future(limiter.call(fetch)) for _ in range(5)]
+        await asyncio.sleep(0)
+        queued = limiter.stats()['queued']
+        release.set()
+        return await asyncio.gather(*tasks), peak, queued
+
+    results, peak, queued = asyncio.run(scenario())
+
+    assert results == ['ok'] * 5
+    assert peak == 2 and queued == 3
+    assert limiter.in_flight == 0
+
+
+def test_full_queue_is_rejected():
+    limiter = AdaptiveLimiter('rossko', initial_limit=1, max_queue=1)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def fetch():
+            await release.wait()
+
+        running = asyncio.ensure_future(limiter.call(fetch))
+        queued = asyncio.ensure_future(limiter.call(fetch))
+        await asyncio.sleep(0)
+        with pytest.raises(LimiterRejectedError):
+            await limiter.call(fetch)
+        release.set()
+        await asyncio.gather(running, queued)
+
+    asyncio.run(scenario())
+
+    assert limiter.rejected == 1
+
+
+def test_queue_timeout_is_rejected():
+    limiter = AdaptiveLimiter('rossko', initial_limit=1, queue_timeout=0.01)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def fetch():
+            await release.wait()
+
+        running = asyncio.ensure_future(limiter.call(fetch))
+        await asyncio.sleep(0)
+        with pytest.raises(LimiterRejectedError):
+            await limiter.call(fetch)
+        release.set()
+        await running
+
+    asyncio.run(scenario())
+
+    assert limiter.rejected == 1 and limiter.stats()['queued'] == 0
+
+
+def test_wave_of_overload_errors_decreases_limit_once():
+    limiter = AdaptiveLimiter('rossko', initial_limit=8, backoff=0.5)
+
+    async def overloaded():
+        await asyncio.sleep(0.01)
+        raise SupplierTimeoutError('rossko', 'timeout')
+
+    async def scenario():
+        return await asyncio.gather(*(limiter.call(overloaded) for _ in range(4)), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+
+    assert all(isinstance(result, SupplierTimeoutError) for result in results)
+    assert limiter.stats()['limit'] == 4
+    assert limiter.decreases == 1
+
+    asyncio.run(scenario())
+    assert limiter.stats()['limit'] == 2
+
+
+def test_non_overload_errors_keep_limit():
+    limiter = AdaptiveLimiter('rossko', initial_limit=8)
+
+    async def not_found():
+        raise SupplierError('rossko', 'HTTP 404', status_code=404)
+
+    async def circuit_open():
+        raise CircuitOpenError('rossko', 10)
+
+    for fn in (not_found, circuit_open):
+        with pytest.raises(SupplierError):
+            asyncio.run(limiter.call(fn))
+
+    assert limiter.stats()['limit'] == 8 and limiter.decreases == 0
+
+
+def test_limit_grows_while_saturated_and_fast():
+    limiter = AdaptiveLimiter('rossko', initial_limit=2, max_limit=4)
+
+    async def fetch():
+        await asyncio.sleep(0.001)
+
+    async def scenario():
+        for _ in range(20):
+            await asyncio.gather(*(limiter.call(fetch) for _ in range(int(limiter.limit) + 1)))
+
+    asyncio.run(scenario())
+
+    assert limiter.stats()['limit'] > 2
+    assert limiter.limit <= 4
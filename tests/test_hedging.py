@@ -0,0 +1,99 @@
+"""Тесты RequestHedger: когда отправляется дубликат и как его ограничивает бюджет"""
+
+import asyncio
+
+from hedging import RequestHedger
+
+
+def make_hedger(**kwargs) -> RequestHedger:
+    """Хеджер с заполненным окном быстрых ответов: дубликат уходит через min_delay"""
+    options = dict(percentile=0.5, min_samples=20, min_delay=0.005, window=200)
+    options.update(kwargs)
+    hedger = RequestHedger('test.search', **options)
+    for _ in range(200):
+        hedger.latency.record(0.001)
+    return hedger
+
+
+def test_no_hedge_until_enough_samples():
+    hedger = RequestHedger('test.search', min_samples=20)
+    for _ in range(19):
+        hedger.latency.record(0.01)
+
+    assert hedger.hedge_delay() is None
+    hedger.latency.record(0.01)
+    assert hedger.hedge_delay() is not None
+
+
+def test_slow_primary_is_hedged_and_hedge_wins():
+    hedger = make_hedger(max_ratio=1.0)
+    attempts = 0
+
+    async def fetch():
+        nonlocal attempts
+        attempts += 1
+        await asyncio.sleep(1 if attempts == 1 else 0)
+        return attempts
+
+    result = asyncio.run(hedger.call(fetch))
+
+    assert result == 2
+    assert hedger.hedges == 1 and hedger.hedge_wins == 1
+
+
+def test_hedges_are_limited_by_budget():
+    hedger = make_hedger(max_ratio=0.25)
+    attempts = 0
+
+    async def fetch():
+        nonlocal attempts
+        attempts += 1
+        await asyncio.sleep(0.02)
+        return 'ok'
+
+    async def scenario():
+        for _ in range(20):
+            assert await hedger.call(fetch) == 'ok'
+
+    asyncio.run(scenario())
+
+    assert hedger.calls == 20
+    assert hedger.hedges == 5
+    assert attempts == 25
+
+
+def test_disabled_hedger_only_measures():
+    hedger = make_hedger(enabled=False, max_ratio=1.0)
+    attempts = 0
+
+    async def fetch():
+        nonlocal attempts
+        attempts += 1
+        await asyncio.sleep(0.02)
+        return 'ok'
+
+    asyncio.run(hedger.call(fetch))
+
+    assert attempts == 1 and hedger.hedges == 0
+    assert len(hedger.latency) == 200
+
+
+def test_primary_error_is_raised_when_both_fail():
+    hedger = make_hedger(max_ratio=1.0)
+    attempts = 0
+
+    async def fetch():
+        nonlocal attempts
+        attempts += 1
+        attempt = attempts
+        await asyncio.sleep(0.02)
+        raise RuntimeError(f'attempt {attempt}')
+
+    async def scenario():
+        try:
+            await hedger.call(fetch)
+        except RuntimeError as e:
+            return str(e)
+
+    assert asyncio.run(scenario()) == 'attempt 1'
+    assert hedger.hedges == 1 and hedger.hedge_wins == 0
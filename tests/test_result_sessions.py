@@ -0,0 +1,102 @@
+"""Тесты ResultSessionStore и курсоров страниц: время жизни снимков, вытеснение, проверка курсора"""
+
+import pytest
+
+from result_sessions import ResultSessionStore, make_cursor, parse_cursor
+
+
+def create_session(store: ResultSessionStore, article: str = 'ABC123') -> str:
+    return store.create(article, {'rossko': [{'article': article}]}, ['autostels'], 15.0)
+
+
+def expire(store: ResultSessionStore, session_id: str):
+    """Сдвигает время создания так, будто ttl сессии уже прошел"""
+    store._sessions[session_id].created_at -= store.ttl + 1
+
+
+def test_session_keeps_snapshot():
+    store = ResultSessionStore(ttl=600, max_sessions=10)
+    session_id = create_session(store)
+
+    session = store.get(session_id)
+
+    assert session.article == 'ABC123'
+    assert session.offers == {'rossko': [{'article': 'ABC123'}]}
+    assert session.pending_suppliers == ['autostels']
+    assert session.markup_percent == 15.0
+    assert store.stats()['hits'] == 1
+
+
+def test_expired_session_is_dropped():
+    store = ResultSessionStore(ttl=600, max_sessions=10)
+    session_id = create_session(store)
+    expire(store, session_id)
+
+    assert store.get(session_id) is None
+    assert store.stats()['sessions'] == 0 and store.stats()['misses'] == 1
+
+
+def test_expired_sessions_are_evicted_on_create():
+    store = ResultSessionStore(ttl=600, max_sessions=10)
+    old_id = create_session(store)
+    expire(store, old_id)
+
+    new_id = create_session(store)
+
+    assert store.stats()['sessions'] == 1
+    assert store.get(new_id) is not None
+
+
+def test_oldest_session_is_evicted_over_limit():
+    store = ResultSessionStore(ttl=600, max_sessions=2)
+    first, second, third = (create_session(store, article) for article in ('A', 'B', 'C'))
+
+    assert store.get(first) is None
+    assert store.get(second) is not None and store.get(third) is not None
+
+
+def test_session_keeps_only_latest_view():
+    store = ResultSessionStore(ttl=600, max_sessions=10)
+    session = store.get(create_session(store))
+
+    session.set_view((None, 'price_asc'), [3, 1, 2], lambda value: value)
+    assert session.ordered_view((None, 'price_asc')) == [1, 2, 3]
+
+    session.set_view(('in_stock', None), [5], None)
+    assert session.ordered_view((None, 'price_asc')) is None
+    assert session.ordered_view(('in_stock', None)) == [5]
+
+
+def test_cursor_round_trip():
+    cursor = make_cursor('abc:def', 20, 'in_stock', 'price_asc')
+
+    assert parse_cursor(cursor, 'in_stock', 'price_asc') == ('abc:def', 20)
+
+
+@pytest.mark.parametrize('availability_filter, sort_by', [
+    (None, 'price_asc'),
+    ('in_stock', None),
+    ('in_stock', 'price_desc'),
+])
+def test_cursor_of_other_view_is_rejected(availability_filter, sort_by):
+    cursor = make_cursor('session', 20, 'in_stock', 'price_asc')
+
+    with pytest.raises(ValueError, match='different availability_filter or sort_by'):
+        parse_cursor(cursor, availability_filter, sort_by)
+
+
+@pytest.mark.parametrize('cursor', ['', 'session', 'session:20', ':20:tag', 'session:-1:tag', 'session:x:tag', 'session:20:'])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        parse_cursor(cursor, None, None)
+
+
+def test_cursor_of_expired_session_finds_nothing():
+    store = ResultSessionStore(ttl=600, max_sessions=10)
+    session_id = create_session(store)
+    cursor = make_cursor(session_id, 20, None, None)
+    expire(store, session_id)
+
+    parsed_id, _ = parse_cursor(cursor, None, None)
+
+    assert store.get(parsed_id) is None
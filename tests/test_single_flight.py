@@ -0,0 +1,142 @@
+"""Тесты SingleFlight: объединение вызовов, закрепленные и спекулятивные вызовы"""
+
+import asyncio
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_flight():
+    async def scenario():
+        flights = SingleFlight()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return ['offer']
+
+        results = await asyncio.gather(*(flights.do('ABC', fetch) for _ in range(5)))
+        return flights, calls, results
+
+    flights, calls, results = asyncio.run(scenario())
+
+    assert calls == 1
+    assert flights.started == 1 and flights.joined == 4
+    assert all(result is results[0] for result in results)
+    assert flights.in_flight() == 0
+
+
+def test_key_is_released_after_flight():
+    async def scenario():
+        flights = SingleFlight()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            return calls
+
+        first = await flights.do('ABC', fetch)
+        second = await flights.do('ABC', fetch)
+        return first, second
+
+    assert asyncio.run(scenario()) == (1, 2)
+
+
+def test_cancelled_caller_does_not_cancel_pinned_flight():
+    async def scenario():
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def fetch():
+            await release.wait()
+            return 'done'
+
+        caller = asyncio.ensure_future(flights.do('ABC', fetch))
+        await asyncio.sleep(0)
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+
+        assert flights.is_running('ABC')
+        release.set()
+        return await flights.do('ABC', fetch), flights
+
+    result, flights = asyncio.run(scenario())
+
+    assert result == 'done'
+    assert flights.started == 1 and flights.abandoned == 0
+
+
+def test_flight_from_start_survives_abandoned_callers():
+    async def scenario():
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def fetch():
+            await release.wait()
+            return 'done'
+
+        task = flights.start('ABC', fetch)
+        caller = asyncio.ensure_future(flights.do('ABC', fetch, cancel_abandoned=True))
+        await asyncio.sleep(0)
+        caller.cancel()
+        await asyncio.gather(caller, return_exceptions=True)
+
+        release.set()
+        return await task, task, flights
+
+    result, task, flights = asyncio.run(scenario())
+
+    assert result == 'done' and not task.cancelled()
+    assert flights.abandoned == 0
+
+
+def test_abandoned_speculative_flight_is_cancelled():
+    async def scenario():
+        flights = SingleFlight()
+        cancelled = asyncio.Event()
+
+        async def fetch():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        callers = [asyncio.ensure_future(flights.do('ABC', fetch, cancel_abandoned=True)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.wait_for(cancelled.wait(), 1)
+        await asyncio.sleep(0)
+        return flights
+
+    flights = asyncio.run(scenario())
+
+    assert flights.abandoned == 1
+    assert not flights.is_running('ABC')
+
+
+def test_error_is_shared_and_key_released():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise RuntimeError('supplier down')
+
+        results = await asyncio.gather(
+            flights.do('ABC', fetch), flights.do('ABC', fetch), return_exceptions=True
+        )
+        return results, flights
+
+    results, flights = asyncio.run(scenario())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert results[0] is results[1]
+    assert flights.in_flight() == 0